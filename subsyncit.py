@@ -29,34 +29,73 @@
 #   `--passwd` to supply the password on the command line (plain text) instead of prompting for secure entry
 #   `--no-verify-ssl-cert` to ignore certificate errors if you have a self-signed (say for testing)
 #   `--sleep-secs-between-polling` to supply a number of seconds to wait between poll of the server for changes
+#   `--put-workers` to supply a number of files to upload at the same time (default 1)
+#   `--get-workers` to supply a number of files to download at the same time (default 1)
+#   `--download-buffer-kb` to supply the KB of a download to write (and hash) at a time (default 1024)
+#   `--http-pool-size` to supply a number of servers to keep pooled connections for (default 1)
+#   `--http-max-connections-per-host` to supply a number of connections to keep open to the server
+#       (default 10, or the larger number of PUT or GET workers if more)
+#   `--http-keep-alive-secs` to supply the seconds of idleness before TCP keep-alive probes start (0 for none)
+#   `--delta-uploads` to send just what changed in a file, against a copy of how it was last synced (kept
+#       in ~/.subsyncit/), rather than the whole file. Needs Subversion 1.7 or later on the server
+#   `--delta-downloads` to get just what changed in a file, against a copy of how it was last synced,
+#       rather than the whole file
+#   `--pristines-max-mb` to supply the MB of those copies to keep, least recently used going first (default 1024)
+#   `--batch-commits` to commit many PUTs, MKCOLs or DELETEs as one revision, rather than one each.
+#       Needs Subversion 1.7 or later on the server
+#   `--commit-batch-files` to supply the number of files in one of those revisions, at most (default 1000)
+#   `--commit-batch-mb` to supply the MB of files in one of those revisions, at most (default 100)
+#   `--change-detection` to supply how changes on the server are found: "directories" to walk down the
+#       directories whose revision changed (the default), "log-report" to ask for the paths changed in
+#       the revisions since the last poll, or "update-report" to ask what's different since then (as svn
+#       update does), in one request either way
+#   `--full-scan-mins` to supply the minutes between file system scans that look at every file (default 60).
+#       Scans in between only list the directories changed since, so miss files changed in place, which
+#       the listening for file system events is for
+#   `--scan-budget-ms` to supply the milliseconds a poll's file system scan can take, before carrying on
+#       from there in the next poll (default 1000)
+#   `--hash-workers` to supply a number of files the file system scan can hash at the same time (default
+#       the number of CPU cores)
 #
-# Note: There's a database created in the Local Sync Directory called ".subsyncit.db".
-# It contains one row per file that's synced back and forth. There's a field in there RV
-# which is not currently used, but set to 0
+# Note: There's a SQLite database created for the Local Sync Directory called "subsyncit.db"
+# (in ~/.subsyncit/). It contains one row per file that's synced back and forth, and one per directory
+# the file system scan has listed. A TinyDB database of the same name, from earlier versions of
+# Subsyncit, is migrated on first start.
 
 import argparse
+import base64
+import concurrent.futures
+import contextlib
 import ctypes
 import datetime
+import errno
+import functools
 import getpass
-# import sqlite3
 import hashlib
 import json
 import os
 import re
+import shutil
+import socket
+import sqlite3
+import struct
 import sys
+import tempfile
+import threading
 import time
 import traceback
+import xml.parsers.expat
+import zlib
 from os.path import dirname, splitext
 from time import strftime
-from urllib.parse import urlparse
+from urllib.parse import quote, urlparse
+from xml.sax.saxutils import escape
 
 import requests
 import requests.packages.urllib3
 from boltons.setutils import IndexedSet
 from requests.adapters import HTTPAdapter
-from tinydb.storages import JSONStorage
-from tinydb.middlewares import CachingMiddleware
-from tinydb import Query, TinyDB
+from tinydb import TinyDB
 from watchdog.events import PatternMatchingEventHandler
 
 PUT_ON_SERVER = "PT"
@@ -65,6 +104,12 @@ DELETE_ON_SERVER = "DS"
 DELETE_LOCALLY = "DL"
 MAKE_DIR_ON_SERVER = "MK"
 
+# Element names in WebDAV responses, as expat has them
+DAV_RESPONSE = "DAV: response"
+DAV_VERSION_NAME = "DAV: version-name"
+SVN_BASELINE_RELATIVE_PATH = "http://subversion.tigris.org/xmlns/dav/ baseline-relative-path"
+SVN_SHA1_CHECKSUM = "http://subversion.tigris.org/xmlns/dav/ sha1-checksum"
+
 def debug(message):
     print(strftime('%Y-%m-%d %H:%M:%S') + ": " + message)
 
@@ -84,13 +129,17 @@ def my_trace(lvl, message):
 
 
 def calculate_sha1_from_local_file(file):
+    # A MB at a time, read into the same buffer. hashlib lets go of the GIL while it hashes that
+    # much, so hash workers each get a core.
     hasher = hashlib.sha1()
+    buf = bytearray(1048576)
+    view = memoryview(buf)
     try:
-        with open(file, 'rb') as a_file:
-            buf = a_file.read(65536)
-            while len(buf) > 0:
-                hasher.update(buf)
-                buf = a_file.read(65536)
+        with open(file, 'rb', buffering=0) as a_file:
+            read = a_file.readinto(buf)
+            while read > 0:
+                hasher.update(view[:read])
+                read = a_file.readinto(buf)
     except IOError:
         return "FILE_MISSING"
 
@@ -98,11 +147,464 @@ def calculate_sha1_from_local_file(file):
     return hexdigest
 
 
+def stat_signature(osstat):
+    # What a row's ST is, for a file: its device, inode, size, and mtime and ctime to the ns, as 40
+    # bytes. While those stay the same, so does what's in the file, and the sha1 it had then (LS) is
+    # used rather than the file being read again. Rows from before have size + mtime (a float) instead.
+    return struct.pack("<QQQqq", osstat.st_dev, osstat.st_ino, osstat.st_size, osstat.st_mtime_ns, osstat.st_ctime_ns)
+
+
+def same_stat(st, osstat):
+    if isinstance(st, bytes):
+        return st == stat_signature(osstat)
+    return st == osstat.st_size + osstat.st_mtime
+
+
+def same_size(st, osstat):
+    # Of a stat signature, for a file whose device, inode, mtime or ctime may be different: restored
+    # from a backup, on a file system mounted again, or touched
+    return isinstance(st, bytes) and st[16:24] == struct.pack("<Q", osstat.st_size)
+
+
+def local_sha1_of(row, abs_local_file_path):
+    # Without reading the file, if it's as it was when it was last synced
+    try:
+        if isinstance(row['ST'], bytes) and row['ST'] == stat_signature(os.stat(abs_local_file_path)):
+            return row['LS']
+    except OSError:
+        return "FILE_MISSING"
+    return calculate_sha1_from_local_file(abs_local_file_path)
+
+
+class HashingFileReader():
+
+    # Hands the file to requests a block at a time, hashing each block as it goes, so a PUT reads the
+    # file once. Any block read after the file's size or timestamp changed stops the PUT part way.
+
+    def __init__(self, a_file, abs_local_file_path, copy_to=None):
+        self.a_file = a_file
+        self.abs_local_file_path = abs_local_file_path
+        # Where each block is also written, if anywhere (the copy a later delta is made against)
+        self.copy_to = copy_to
+        self.hasher = hashlib.sha1()
+        self.osstat = os.fstat(a_file.fileno())
+        self.name = a_file.name
+        self.mode = a_file.mode
+
+
+    def read(self, size=-1):
+        osstat = os.fstat(self.a_file.fileno())
+        if osstat.st_size != self.osstat.st_size or osstat.st_mtime_ns != self.osstat.st_mtime_ns:
+            raise NotPUTtingAsFileStillBeingWrittenTo(self.abs_local_file_path)
+        buf = self.a_file.read(size)
+        self.hasher.update(buf)
+        if self.copy_to is not None:
+            self.copy_to.write(buf)
+        return buf
+
+
+    def fileno(self):
+        return self.a_file.fileno()
+
+
+    def tell(self):
+        return self.a_file.tell()
+
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # requests rewinds to the start to send the file again (after an auth challenge, say)
+        if offset == 0 and whence == os.SEEK_SET:
+            self.hasher = hashlib.sha1()
+            if self.copy_to is not None:
+                self.copy_to.seek(0)
+                self.copy_to.truncate()
+        return self.a_file.seek(offset, whence)
+
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+
+class PristineStore():
+
+    # Copies of files as they were last PUT to or GOT from Subversion, named by their sha1, for
+    # --delta-uploads and --delta-downloads to make and apply deltas against. In the db dir, away
+    # from the files being synced. Kept to a size by throwing away the least recently used (the
+    # timestamp of each is bumped when it's used).
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # PUT and GET workers keep and use copies from more than one thread
+        self.lock = threading.Lock()
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.size = 0
+        for entry in os.scandir(directory):
+            if entry.name.startswith("."):
+                # A copy being made when Subsyncit stopped
+                os.remove(entry.path)
+            else:
+                self.size += entry.stat().st_size
+
+
+    def path_for(self, sha1):
+        return self.directory + sha1
+
+
+    def open_base(self, sha1):
+        # The copy with that sha1 opened for reading, or None if there isn't one
+        if sha1 is None:
+            return None
+        try:
+            base_file = open(self.path_for(sha1), "rb")
+        except FileNotFoundError:
+            return None
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(self.path_for(sha1))
+        return base_file
+
+
+    def new_copy(self):
+        # Written to while a file is read for its PUT, and kept (or not) once that's done
+        return tempfile.NamedTemporaryFile(dir=self.directory, prefix=".", delete=False)
+
+
+    def keep(self, copy, sha1):
+        copy.close()
+        size = os.path.getsize(copy.name)
+        if size > self.max_bytes:
+            os.remove(copy.name)
+            return
+        with self.lock:
+            with contextlib.suppress(FileNotFoundError):
+                self.size -= os.path.getsize(self.path_for(sha1))
+            os.replace(copy.name, self.path_for(sha1))
+            self.size += size
+            if self.size > self.max_bytes:
+                self.evict()
+
+
+    def evict(self):
+        # Least recently used first, until there's room
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in os.scandir(self.directory)
+                         if not entry.name.startswith("."))
+        for mtime, size, path in entries:
+            if self.size <= self.max_bytes:
+                break
+            # Not if it's open (as a base, on Windows)
+            with contextlib.suppress(OSError):
+                os.remove(path)
+                self.size -= size
+
+
+    def discard(self, copy):
+        copy.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(copy.name)
+
+
+    def add_copy_of(self, abs_local_file_path, sha1):
+        if os.path.getsize(abs_local_file_path) > self.max_bytes:
+            return
+        copy = self.new_copy()
+        try:
+            with open(abs_local_file_path, "rb") as a_file:
+                shutil.copyfileobj(a_file, copy)
+        except BaseException:
+            self.discard(copy)
+            raise
+        self.keep(copy, sha1)
+
+
+    def replace(self, copy, sha1, old_sha1):
+        # Kept in place of the copy of the version before it, which isn't a base for anything any more
+        self.keep(copy, sha1)
+        if old_sha1 != sha1:
+            self.remove(old_sha1)
+
+
+    def remove(self, sha1):
+        # Another file with the same contents would need a whole PUT or GET next time, but nothing worse
+        if sha1 is not None:
+            with self.lock:
+                with contextlib.suppress(OSError):
+                    size = os.path.getsize(self.path_for(sha1))
+                    os.remove(self.path_for(sha1))
+                    self.size -= size
+
+
+SVNDIFF_WINDOW_SIZE = 102400
+SVNDIFF_BLOCK_SIZE = 4096
+SVNDIFF_MAX_SOURCE_VIEW = 16 * SVNDIFF_WINDOW_SIZE
+
+
+def svndiff_int(n):
+    # Seven bits a byte, most significant first, with the top bit set on all but the last
+    encoded = bytearray([n & 0x7f])
+    n >>= 7
+    while n > 0:
+        encoded.insert(0, 0x80 | (n & 0x7f))
+        n >>= 7
+    return bytes(encoded)
+
+
+def svndiff_instruction(action, length, offset=None):
+    # Action 0 copies from the window's source view, 2 from the window's new data
+    if length < 64:
+        instruction = bytes([(action << 6) | length])
+    else:
+        instruction = bytes([action << 6]) + svndiff_int(length)
+    if offset is not None:
+        instruction += svndiff_int(offset)
+    return instruction
+
+
+def svndiff0(base_file, target):
+    # Yields the svndiff (version 0, uncompressed) that makes what's read from target out of the base
+    # file, a window of up to 100 KB of the target at a time. As rsync does it: the base's 4 KB blocks
+    # are indexed by a weak checksum first (Adler-32, the sum of the bytes and the sum of those sums),
+    # then that checksum is rolled along the target a byte at a time, so a block is found wherever it
+    # is in the target - after an insert that isn't a multiple of 4 KB, say. A weak match is copied
+    # from the base if the bytes there are the same, and the target's bytes that aren't in a copied
+    # block are sent as new data. Rolling is slow in Python, so once a window's worth of it has found
+    # nothing, the target's taken to be new for now, and is skipped through a block at a time, looking
+    # only for where the base carries on from the last block copied. Subversion reads the base as a
+    # stream while applying it, so a window's source view can't start before the last one's did, or
+    # after the last one's end, and mustn't get too big. Blocks that would break that are sent too.
+    index = {}  # weak checksum -> offsets of base blocks with it
+    block_checksums = []
+    base_size = 0
+    block = base_file.read(SVNDIFF_BLOCK_SIZE)
+    while len(block) == SVNDIFF_BLOCK_SIZE:
+        checksum = zlib.adler32(block)
+        index.setdefault(checksum, []).append(base_size)
+        block_checksums.append(checksum)
+        base_size += len(block)
+        block = base_file.read(SVNDIFF_BLOCK_SIZE)
+    # A short last block can't be found as the others are, but is copied if it follows one that was
+    base_tail = block
+    blocks_size = base_size
+    base_size += len(base_tail)
+
+    def base_bytes(source_offset, length):
+        base_file.seek(source_offset)
+        return base_file.read(length)
+
+    yield b"SVN\0"
+    view_start = view_end = 0
+    # The base block after the last one copied: the likeliest next one
+    following = 0
+    not_found_for = 0
+    resume_at = None
+    window = target.read(SVNDIFF_WINDOW_SIZE)
+    while len(window) > 0:
+        copies = []  # (offset in window, offset in base, length)
+        lowest = highest = None
+        pos = 0
+        checksum = None
+        while pos + SVNDIFF_BLOCK_SIZE <= len(window):
+            if checksum is None:
+                checksum = zlib.adler32(window[pos:pos + SVNDIFF_BLOCK_SIZE])
+                a = checksum & 0xffff
+                b = checksum >> 16
+            found = None
+            if checksum in index:
+                block = window[pos:pos + SVNDIFF_BLOCK_SIZE]
+                candidates = index[checksum][:8]
+                if following < blocks_size and block_checksums[following // SVNDIFF_BLOCK_SIZE] == checksum:
+                    candidates.insert(0, following)
+                for source_offset in candidates:
+                    if source_offset < view_start:
+                        continue
+                    start = min(source_offset, view_end if lowest is None else lowest, view_end)
+                    end = max(source_offset + SVNDIFF_BLOCK_SIZE, view_end if highest is None else highest)
+                    if end - start <= SVNDIFF_MAX_SOURCE_VIEW and base_bytes(source_offset, len(block)) == block:
+                        found = source_offset
+                        lowest = source_offset if lowest is None else min(lowest, source_offset)
+                        highest = end
+                        break
+            if found is not None:
+                copies.append((pos, found, SVNDIFF_BLOCK_SIZE))
+                pos += SVNDIFF_BLOCK_SIZE
+                following = found + SVNDIFF_BLOCK_SIZE
+                if following == blocks_size and len(base_tail) > 0 and window[pos:pos + len(base_tail)] == base_tail \
+                        and base_size - min(lowest, view_end) <= SVNDIFF_MAX_SOURCE_VIEW:
+                    copies.append((pos, following, len(base_tail)))
+                    pos += len(base_tail)
+                    following = highest = base_size
+                not_found_for = 0
+                resume_at = None
+                checksum = None
+            elif not_found_for < SVNDIFF_WINDOW_SIZE:
+                if pos + SVNDIFF_BLOCK_SIZE == len(window):
+                    break
+                # Rolled along a byte: the byte leaving takes itself from the first sum, and
+                # SVNDIFF_BLOCK_SIZE of itself from the second, and the byte arriving adds itself to both
+                # (less the 1 Adler-32 starts the first sum at)
+                leaving = window[pos]
+                a = (a - leaving + window[pos + SVNDIFF_BLOCK_SIZE]) % 65521
+                b = (b - SVNDIFF_BLOCK_SIZE * leaving + a - 1) % 65521
+                checksum = a | (b << 16)
+                pos += 1
+                not_found_for += 1
+            else:
+                if resume_at is None:
+                    # The starts of that block, and of the one after it (in case the change began in it)
+                    resume_at = [base_bytes(offset, 32) for offset in (following, following + SVNDIFF_BLOCK_SIZE)
+                                 if offset < blocks_size]
+                resumes = [window.find(start, pos + 1, pos + SVNDIFF_BLOCK_SIZE + len(start)) for start in resume_at]
+                resumes = [resumed for resumed in resumes if resumed >= 0]
+                pos = min(resumes) if len(resumes) > 0 else pos + SVNDIFF_BLOCK_SIZE
+                checksum = None
+        # The bytes that no block was looked for from, for want of the rest of the block, go into the
+        # next window, so a block across the boundary can still be found. Unless there's no more
+        unlooked = pos + 1 if pos + SVNDIFF_BLOCK_SIZE <= len(window) else pos
+        more = target.read(SVNDIFF_WINDOW_SIZE - (len(window) - unlooked))
+        carried = b""
+        if len(more) > 0:
+            carried = window[unlooked:]
+            window = window[:unlooked]
+
+        view_len = 0
+        if len(copies) > 0:
+            view_start = min(lowest, view_end)
+            view_end = max(highest, view_end)
+            view_len = view_end - view_start
+
+        ops = []  # [action, length, offset in the source view]
+        new_data = bytearray()
+        pos = 0
+        for (copy_pos, source_offset, length) in copies + [(len(window), None, 0)]:
+            if copy_pos > pos:
+                new_data += window[pos:copy_pos]
+                ops.append([2, copy_pos - pos, None])
+            if source_offset is None:
+                break
+            if len(ops) > 0 and ops[-1][0] == 0 and ops[-1][2] + ops[-1][1] == source_offset - view_start:
+                ops[-1][1] += length
+            else:
+                ops.append([0, length, source_offset - view_start])
+            pos = copy_pos + length
+        instructions = b"".join(svndiff_instruction(*op) for op in ops)
+
+        yield svndiff_int(view_start) + svndiff_int(view_len) + svndiff_int(len(window)) \
+              + svndiff_int(len(instructions)) + svndiff_int(len(new_data)) + instructions + bytes(new_data)
+        window = carried + more
+
+
+def read_svndiff_int(data, pos):
+    # The int at pos and the position after it, or None for both if data stops part way through it
+    n = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        n = (n << 7) | (byte & 0x7f)
+        if byte & 0x80 == 0:
+            return n, pos
+    return None, None
+
+
+class SvndiffApplier():
+
+    # Applies an svndiff (version 0, or 1 which is zlib compressed) to a base file as it arrives, a
+    # window at a time, handing what that makes to write(). Only a window is held in memory.
+
+    def __init__(self, base_file, write):
+        self.base_file = base_file
+        self.write = write
+        self.version = None
+        self.buf = bytearray()
+
+
+    def feed(self, data):
+        self.buf += data
+        if self.version is None:
+            if len(self.buf) < 4:
+                return
+            if self.buf[:3] != b"SVN" or self.buf[3] > 1:
+                raise ValueError("Not svndiff0 or svndiff1")
+            self.version = self.buf[3]
+            del self.buf[:4]
+        while self.apply_window():
+            pass
+
+
+    def finish(self):
+        if self.version is None or len(self.buf) > 0:
+            raise ValueError("svndiff cut short")
+
+
+    def apply_window(self):
+        pos = 0
+        header = []
+        for field in range(5):
+            n, pos = read_svndiff_int(self.buf, pos)
+            if n is None:
+                return False
+            header.append(n)
+        (sview_offset, sview_len, tview_len, ins_len, new_len) = header
+        if len(self.buf) < pos + ins_len + new_len:
+            return False
+        instructions = self.section(self.buf[pos:pos + ins_len])
+        new_data = self.section(self.buf[pos + ins_len:pos + ins_len + new_len])
+        del self.buf[:pos + ins_len + new_len]
+
+        self.base_file.seek(sview_offset)
+        view = self.base_file.read(sview_len)
+        if len(view) != sview_len:
+            raise ValueError("Delta source ended unexpectedly")
+        window = bytearray()
+        new_pos = i = 0
+        while i < len(instructions):
+            action = instructions[i] >> 6
+            length = instructions[i] & 0x3f
+            i += 1
+            if length == 0:
+                length, i = read_svndiff_int(instructions, i)
+            if action == 2:
+                window += new_data[new_pos:new_pos + length]
+                new_pos += length
+                continue
+            offset, i = read_svndiff_int(instructions, i)
+            if length is None or offset is None:
+                raise ValueError("svndiff instruction cut short")
+            if action == 0:
+                window += view[offset:offset + length]
+            elif offset + length <= len(window):
+                window += window[offset:offset + length]
+            else:
+                # Copies from the window being made can overlap what they're making
+                for n in range(length):
+                    window.append(window[offset + n])
+        if len(window) != tview_len:
+            raise ValueError("svndiff window makes " + str(len(window)) + " bytes, not " + str(tview_len))
+        self.write(bytes(window))
+        return True
+
+
+    def section(self, data):
+        if self.version == 0:
+            return data
+        # An svndiff1 section is its length, then either itself (if compressing didn't help) or zlib'd
+        length, pos = read_svndiff_int(data, 0)
+        if length is None:
+            raise ValueError("svndiff1 section cut short")
+        if len(data) - pos == length:
+            return data[pos:]
+        section = zlib.decompress(bytes(data[pos:]))
+        if len(section) != length:
+            raise ValueError("svndiff1 section is " + str(len(section)) + " bytes, not " + str(length))
+        return section
+
+
 class MyRequestsTracer():
 
     def __init__(self, delegate):
         self.delegate = delegate
         self.always_print = False
+        # PUT workers make requests from more than one thread
+        self.counts_lock = threading.Lock()
         self.counts = {
             "mkcol": 0,
             "put": 0,
@@ -111,15 +613,26 @@ class MyRequestsTracer():
         }
 
 
+    def close(self):
+        self.delegate.close()
+
+
     def anything_substantial_happened(self):
         return self.counts["mkcol"] > 0 or self.counts["put"] > 0 or self.counts["get"] > 0 or self.counts["delete"] > 0
 
 
     def clear_counts(self):
-        self.counts["mkcol"] = 0
-        self.counts["put"] = 0
-        self.counts["get"] = 0
-        self.counts["delete"] = 0
+        with self.counts_lock:
+            self.counts["mkcol"] = 0
+            self.counts["put"] = 0
+            self.counts["get"] = 0
+            self.counts["delete"] = 0
+
+
+    def count(self, what):
+        with self.counts_lock:
+            self.counts[what] += 1
+
 
     def rq_debug(self, msg):
         try:
@@ -135,7 +648,7 @@ class MyRequestsTracer():
             status = request.status_code
             return request
         finally:
-            self.counts["mkcol"] += 1
+            self.count("mkcol")
             durn = time.time() - start
             if durn > 1 or self.always_print:
                self.rq_debug("R.MKCOL   : [" + str(status) + "] " + urlparse(url).path + " " + english_duration(durn))
@@ -149,7 +662,7 @@ class MyRequestsTracer():
             status = request.status_code
             return request
         finally:
-            self.counts["delete"] += 1
+            self.count("delete")
             durn = time.time() - start
             if durn > 1 or self.always_print:
                 self.rq_debug("R.DELETE  : [" + str(status) + "] " +  urlparse(url).path + " " + english_duration(durn))
@@ -179,7 +692,7 @@ class MyRequestsTracer():
              '<D:version-name/>\n' \
              '<S:baseline-relative-path/>\n' \
              '</D:prop>\n' \
-             '</D:propfind>\n', headers={'Depth': str(depth)})
+             '</D:propfind>\n', headers={'Depth': str(depth)}, stream=True)
             status = request.status_code
 
             return request
@@ -189,43 +702,76 @@ class MyRequestsTracer():
                 self.rq_debug("R.PROPFIND: [" + str(status) + "] " +  urlparse(url).path + " depth=" + str(depth) + " " + english_duration(durn))
 
 
-    def put(self, url, data=None):
+    def put(self, url, data=None, headers=None):
         start = time.time()
         status = 0
         try:
-            request = self.delegate.put(url, data=data)
+            request = self.delegate.put(url, data=data, headers=headers)
             status = request.status_code
             return request
         finally:
-            self.counts["put"] += 1
+            self.count("put")
             durn = time.time() - start
             if durn > 1 or self.always_print:
                 self.rq_debug("R.PUT     : [" + str(status) + "] " +  urlparse(url).path + " " + self.data_print(data) + " " + english_duration(durn))
 
 
+    def post(self, url, data=None, headers=None):
+        start = time.time()
+        status = 0
+        try:
+            request = self.delegate.post(url, data=data, headers=headers)
+            status = request.status_code
+            return request
+        finally:
+            durn = time.time() - start
+            if durn > 1 or self.always_print:
+                self.rq_debug("R.POST    : [" + str(status) + "] " +  urlparse(url).path + " " + self.data_print(data) + " " + english_duration(durn))
+
+
+    def merge(self, url, data=None, headers=None):
+        start = time.time()
+        status = 0
+        try:
+            request = self.delegate.request("MERGE", url, data=data, headers=headers)
+            status = request.status_code
+            return request
+        finally:
+            durn = time.time() - start
+            if durn > 1 or self.always_print:
+                self.rq_debug("R.MERGE   : [" + str(status) + "] " +  urlparse(url).path + " " + english_duration(durn))
+
+
     def data_print(self, data):
+        if hasattr(data, "read"):
+            return "data.file=" + str(getattr(data, "name", "?"))
+        if data is None:
+            return "data=None"
+        if not isinstance(data, (str, bytes)):
+            # A generator, say, for a body sent in chunks
+            return "data." + type(data).__name__
         return str("data.len=" + str(len(data)) if len(data) > 15 else "data=" + str(data))
 
 
-    def get(self, url, stream=None):
+    def get(self, url, stream=None, headers=None):
         start = time.time()
         status = 0
         try:
-            request = self.delegate.get(url, stream=stream)
+            request = self.delegate.get(url, stream=stream, headers=headers)
             status = request.status_code
             return request
         finally:
-            self.counts["get"] += 1
+            self.count("get")
             durn = time.time() - start
             if durn > 1 or self.always_print:
-                self.rq_debug("R.GET     : [" + str(status) + "] " +  urlparse(url).path + " " + str(stream) + " " + english_duration(durn))
+                self.rq_debug("R.GET     : [" + str(status) + "] " +  urlparse(url).path + " " + str(stream) + ("" if headers is None else " " + str(headers)) + " " + english_duration(durn))
 
 
-    def options(self, url, data=None):
+    def options(self, url, data=None, stream=None):
         start = time.time()
         status = 0
         try:
-            request = self.delegate.request('OPTIONS', url, data=data)
+            request = self.delegate.request('OPTIONS', url, data=data, stream=stream)
             status = request.status_code
             return request
         finally:
@@ -247,14 +793,14 @@ class MyRequestsTracer():
 
             youngest_rev = options.headers["SVN-Youngest-Rev"].strip()
 
-            url = config.args.svn_url.replace(config.svn_repo_parent_path + config.svn_baseline_rel_path, config.svn_repo_parent_path
-                                              + "!svn/rvr/" + youngest_rev + "/" + config.svn_baseline_rel_path + file_name, 1)
+            url = svn_url_at_revision(config, youngest_rev, file_name)
 
             # print("url=" + url)
             # print("config.svn_repo_parent_path=" + config.svn_repo_parent_path)
             # print("config.svn_baseline_rel_path" + config.svn_baseline_rel_path)
             # print("file_name" + file_name)
 
+            # Depth 0, as only the revision of the directory itself is wanted, not its children's
             propfind = self.delegate.request("PROPFIND", url,
                                              data='<?xml version="1.0" encoding="utf-8"?>'
                                                       '<propfind xmlns="DAV:">'
@@ -262,14 +808,13 @@ class MyRequestsTracer():
                                                       '<version-name/>'
                                                       '</prop>'
                                                       '</propfind>',
-                                             headers={'Depth': '1'})
-
-            content = propfind.text
+                                             headers={'Depth': '0'}, stream=True)
 
             if propfind.status_code != 207:
+                propfind.close()
                 raise UnexpectedStatusCode(propfind.status_code)
 
-            rev = int(str([line for line in content.splitlines() if ':version-name>' in line]).split(">")[1].split("<")[0])
+            rev = int(list(streamed_xml_elements(propfind, DAV_RESPONSE, {DAV_VERSION_NAME}))[0][DAV_VERSION_NAME])
             status = propfind.status_code
             return rev
         finally:
@@ -278,22 +823,39 @@ class MyRequestsTracer():
                 self.rq_debug("R.OPTSPROP: [" + str(status) + "] " +  urlparse(url).path + " " + english_duration(durn))
 
 
-    def report(self, url, youngest_rev):
+    def report(self, url, start_rev, end_rev):
+        # A log-report of the paths changed in each revision from start_rev to end_rev, without revprops
         start = time.time()
         status = 0
         try:
-            request = self.delegate.request('REPORT', url, data='<S:log-report xmlns:S="svn:"><S:start-revision>' + youngest_rev +
-                                   '</S:start-revision><S:end-revision>0</S:end-revision><S:limit>1</S:limit><S:revprop>svn:author</S:revprop><S'
-                                   ':revprop>svn:date</S:revprop><S:revprop>svn:log</S:revprop><S:path></S:path><S:encode-binary-props/></S:log-report>')
+            request = self.delegate.request('REPORT', url, data='<S:log-report xmlns:S="svn:"><S:start-revision>' + str(start_rev) +
+                                   '</S:start-revision><S:end-revision>' + str(end_rev) + '</S:end-revision><S:discover-changed-paths/>'
+                                   '<S:no-revprops/><S:path></S:path><S:encode-binary-props/></S:log-report>', stream=True)
             status = request.status_code
             return request
         finally:
             durn = time.time() - start
             if durn > .5 or self.always_print:
-                self.rq_debug("R.REPORT  : [" + str(status) + "] " +  urlparse(url).path + " youngest_rev=" + str(youngest_rev) + " " + english_duration(durn))
+                self.rq_debug("R.REPORT  : [" + str(status) + "] " +  urlparse(url).path + " log-report " + str(start_rev) + ":" + str(end_rev) + " " + english_duration(durn))
+
+
+    def update_report(self, url, data, headers=None):
+        start = time.time()
+        status = 0
+        try:
+            request = self.delegate.request('REPORT', url, data=data, headers=headers, stream=True)
+            status = request.status_code
+            return request
+        finally:
+            if 'send-all="true"' in data:
+                # Only one with the files' contents in is a download
+                self.count("get")
+            durn = time.time() - start
+            if durn > 1 or self.always_print:
+                self.rq_debug("R.REPORT  : [" + str(status) + "] " +  urlparse(url).path + " update-report " + english_duration(durn))
 
 
-class MyTinyDBTrace():
+class MyFilesTableTrace():
 
     def __init__(self, delegate):
         self.delegate = delegate
@@ -306,96 +868,148 @@ class MyTinyDBTrace():
             debug(msg)
 
 
-    def search(self, arg0):
+    def search_by_instruction(self, instruction):
         start = time.time()
         result = ""
         try:
-            search = self.delegate.search(arg0)
+            search = self.delegate.search_by_instruction(instruction)
             result = "✘" if not search else "rows=" + str(len(search))
             return search
         finally:
             durn = time.time() - start
             if durn > .1 or self.always_print:
-                self.db_debug("TinyDB.search: [" + result + "] " + str(arg0) + " " + english_duration(durn))
+                self.db_debug("files.search_by_instruction: [" + result + "] " + str(instruction) + " " + english_duration(durn))
 
 
-    def get(self, arg0):
+    def search_possible_children(self, directory):
+        start = time.time()
+        result = ""
+        try:
+            search = self.delegate.search_possible_children(directory)
+            result = "✘" if not search else "rows=" + str(len(search))
+            return search
+        finally:
+            durn = time.time() - start
+            if durn > .1 or self.always_print:
+                self.db_debug("files.search_possible_children: [" + result + "] " + directory + " " + english_duration(durn))
+
+
+    def get(self, file_name):
         start = time.time()
         result = ""
         get = None
         try:
-            get = self.delegate.get(arg0)
+            get = self.delegate.get(file_name)
             result = "✘" if not get else "✔"
             return get
         finally:
             durn = time.time() - start
             if durn > .1 or self.always_print:
-                self.db_debug("TinyDB.get: [" + result + "] " + str(arg0) + " " + english_duration(durn) + " " + str(get))
+                self.db_debug("files.get: [" + result + "] " + file_name + " " + english_duration(durn) + " " + str(get))
 
 
-    def remove(self, arg0):
+    def remove(self, file_name):
         start = time.time()
         result = ""
         try:
-            remove = self.delegate.remove(arg0)
+            remove = self.delegate.remove(file_name)
             result = "✘" if not remove else "✔"
             return remove
         finally:
             durn = time.time() - start
             if durn > .1 or self.always_print:
-                self.db_debug("TinyDB.remove: [" + result + "] " + str(arg0) + " " + english_duration(durn))
+                self.db_debug("files.remove: [" + result + "] " + file_name + " " + english_duration(durn))
 
 
-    def update(self, fields, cond=None, doc_ids=None):
+    def descendants_of(self, directory):
         start = time.time()
         result = ""
         try:
-            update = self.delegate.update(fields, cond=cond, doc_ids=doc_ids)
+            descendants = self.delegate.descendants_of(directory)
+            result = str(len(descendants)) + " rows"
+            return descendants
+        finally:
+            durn = time.time() - start
+            if durn > .1 or self.always_print:
+                self.db_debug("files.descendants_of: [" + result + "] " + directory + " " + english_duration(durn))
+
+
+    def children_of(self, directory):
+        start = time.time()
+        result = ""
+        try:
+            children = self.delegate.children_of(directory)
+            result = str(len(children)) + " rows"
+            return children
+        finally:
+            durn = time.time() - start
+            if durn > .1 or self.always_print:
+                self.db_debug("files.children_of: [" + result + "] " + directory + " " + english_duration(durn))
+
+
+    def remove_subtree(self, directory):
+        start = time.time()
+        result = ""
+        try:
+            removed = self.delegate.remove_subtree(directory)
+            result = str(removed) + " rows"
+            return removed
+        finally:
+            durn = time.time() - start
+            if durn > .1 or self.always_print:
+                self.db_debug("files.remove_subtree: [" + result + "] " + directory + " " + english_duration(durn))
+
+
+    def update(self, fields, file_name):
+        start = time.time()
+        result = ""
+        try:
+            update = self.delegate.update(fields, file_name)
             result = "✘" if not update else "✔"
             return update
         finally:
             durn = time.time() - start
             if durn > .1 or self.always_print:
-                self.db_debug("TinyDB.update: [" + result + "] " + str(fields) + " " + str(cond) + " " + str(doc_ids) + " " + english_duration(durn))
+                self.db_debug("files.update: [" + result + "] " + str(fields) + " " + file_name + " " + english_duration(durn))
 
 
-    def insert(self, arg0):
+    def insert(self, row):
         start = time.time()
         result = ""
         try:
-            insert = self.delegate.insert(arg0)
+            insert = self.delegate.insert(row)
             result = "✘" if not insert else "✔"
             return insert
         finally:
             durn = time.time() - start
             if durn > .1 or self.always_print:
-                self.db_debug("TinyDB.insert: [" + result + "] " + str(arg0) + " " + english_duration(durn))
+                self.db_debug("files.insert: [" + result + "] " + str(row) + " " + english_duration(durn))
 
 
-    def contains(self, arg0):
+    def contains(self, file_name):
         start = time.time()
         result = ""
         try:
-            contains = self.delegate.contains(arg0)
+            contains = self.delegate.contains(file_name)
             result = "✘" if not contains else "✔"
             return contains
         finally:
             durn = time.time() - start
             if durn > .1 or self.always_print:
-                self.db_debug("TinyDB.contains: [" + result + "] " + str(arg0) + " " + english_duration(durn))
+                self.db_debug("files.contains: [" + result + "] " + file_name + " " + english_duration(durn))
 
 
-    def count(self, arg0):
+    def count_with_instructions(self):
         start = time.time()
         result = ""
         try:
-            count = self.delegate.count(arg0)
+            count = self.delegate.count_with_instructions()
             result = str(count) + " rows"
             return count
         finally:
             durn = time.time() - start
             if durn > .1 or self.always_print:
-                self.db_debug("TinyDB.count: [" + result + "] " + str(arg0) + " " + english_duration(durn))
+                self.db_debug("files.count_with_instructions: [" + result + "] " + english_duration(durn))
 
 
     def all(self):
@@ -408,7 +1022,513 @@ class MyTinyDBTrace():
         finally:
             durn = time.time() - start
             if durn > .1 or self.always_print:
-                self.db_debug("TinyDB.all: [" + result + "] " + english_duration(durn))
+                self.db_debug("files.all: [" + result + "] " + english_duration(durn))
+
+
+    def transaction(self):
+        return self.delegate.transaction()
+
+
+    def commit(self):
+        start = time.time()
+        try:
+            self.delegate.commit()
+        finally:
+            durn = time.time() - start
+            if durn > .1 or self.always_print:
+                self.db_debug("files.commit: " + english_duration(durn))
+
+
+    def checkpoint(self):
+        start = time.time()
+        try:
+            self.delegate.checkpoint()
+        finally:
+            durn = time.time() - start
+            if durn > .1 or self.always_print:
+                self.db_debug("files.checkpoint: " + english_duration(durn))
+
+
+    def close(self):
+        self.delegate.close()
+
+
+class SqliteFilesTable():
+
+    # One row per file or directory synced back and forth. FN is the file name relative to the root of
+    # the Local Sync Directory (directories end in '/'), L the count of separators in FN, RS/LS the remote
+    # and local sha1s, ST the stat_signature() of the file when LS was its sha1, I the pending instruction
+    # (if any), and RV the Subversion revision.
+    COLUMNS = ('FN', 'L', 'RS', 'LS', 'ST', 'I', 'RV')
+
+    # Changes are appended to SQLite's write-ahead log. Writes open a transaction implicitly, and
+    # each phase of the sync loop commit()s its writes together, for one fsync of the log per phase.
+    # A kill -9 loses at most the phase in progress. checkpoint() folds the log back into the
+    # database file, and opening the database after a crash replays whatever log is left.
+
+    def __init__(self, db_file):
+        self.connection = sqlite3.connect(db_file)
+        self.connection.row_factory = files_row_as_dict
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = FULL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS files (FN TEXT NOT NULL PRIMARY KEY, L INTEGER, RS TEXT, LS TEXT, ST BLOB, I TEXT, RV INTEGER)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS files_I ON files (I)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS files_L ON files (L)")
+        self.connection.commit()
+
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # A savepoint, so that it nests inside the transaction of the current phase (if there is one)
+        self.connection.execute("SAVEPOINT files_transaction")
+        try:
+            yield
+            self.connection.execute("RELEASE files_transaction")
+        except BaseException:
+            self.connection.execute("ROLLBACK TO files_transaction")
+            self.connection.execute("RELEASE files_transaction")
+            raise
+
+
+    def commit(self):
+        self.connection.commit()
+
+
+    def checkpoint(self):
+        self.connection.commit()
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+    def get(self, file_name):
+        return self.connection.execute("SELECT FN, L, RS, LS, ST, I, RV FROM files WHERE FN = ?", (file_name,)).fetchone()
+
+
+    def contains(self, file_name):
+        return self.connection.execute("SELECT 1 FROM files WHERE FN = ?", (file_name,)).fetchone() is not None
+
+
+    def insert(self, row):
+        self.connection.execute("INSERT INTO files (FN, L, RS, LS, ST, I, RV) VALUES (:FN, :L, :RS, :LS, :ST, :I, :RV)", row)
+        return True
+
+
+    def update(self, fields, file_name):
+        for column in fields:
+            if column not in self.COLUMNS:
+                raise ValueError("Unknown column " + column + " for the files table")
+        sets = ", ".join(column + " = ?" for column in fields)
+        cursor = self.connection.execute("UPDATE files SET " + sets + " WHERE FN = ?", tuple(fields.values()) + (file_name,))
+        return cursor.rowcount > 0
+
+
+    def remove(self, file_name):
+        cursor = self.connection.execute("DELETE FROM files WHERE FN = ?", (file_name,))
+        return cursor.rowcount > 0
+
+
+    def search_by_instruction(self, instruction):
+        return self.connection.execute("SELECT FN, L, RS, LS, ST, I, RV FROM files WHERE I = ?", (instruction,)).fetchall()
+
+
+    def count_with_instructions(self):
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        return cursor.execute("SELECT COUNT(*) FROM files WHERE I IS NOT NULL").fetchone()[0]
+
+
+    def remove_subtree(self, directory):
+        # Everything starting with the directory name is a key range on the primary key
+        cursor = self.connection.execute("DELETE FROM files WHERE FN >= ? AND FN < ?", (directory, prefix_upper_bound(directory)))
+        return cursor.rowcount
+
+
+    def search_possible_children(self, directory):
+        # The unary + keeps the I and L indexes from being chosen over the key range
+        return self.connection.execute("SELECT FN, L, RS, LS, ST, I, RV FROM files WHERE FN >= ? AND FN < ? AND +I IS NULL AND +L <= ?",
+                                       (directory, prefix_upper_bound(directory), directory.count(os.sep))).fetchall()
+
+
+    def all(self):
+        return self.connection.execute("SELECT FN, L, RS, LS, ST, I, RV FROM files").fetchall()
+
+
+    def close(self):
+        self.checkpoint()
+        self.connection.close()
+
+
+class FileRow():
+
+    # A compact, read-only, stand-in for a files table row (a dict) for the rows held in memory. Sha1s
+    # are kept as 20 bytes rather than 40 hex chars, the instruction as a small int, and FN as the
+    # name within a directory, with the directory's name shared by all of its children. row['FN'] and
+    # the like work as they would for the dict.
+
+    __slots__ = ('directory', 'name', 'rs', 'ls', 'st', 'i', 'rv')
+
+    INSTRUCTIONS = (PUT_ON_SERVER, GET_FROM_SERVER, DELETE_ON_SERVER, DELETE_LOCALLY, MAKE_DIR_ON_SERVER)
+
+    def __init__(self, directory, name, rs, ls, st, i, rv):
+        self.directory = directory
+        self.name = name
+        self.rs = rs
+        self.ls = ls
+        self.st = st
+        self.i = i
+        self.rv = rv
+
+
+    @classmethod
+    def from_dict(cls, directory, name, row):
+        instruction = row.get('I')
+        rs = sha1_to_bytes(row.get('RS'))
+        # Remote and local sha1s are mostly the same, in which case one bytes object does for both
+        ls = rs if row.get('LS') == row.get('RS') else sha1_to_bytes(row.get('LS'))
+        return cls(directory, name, rs, ls, row.get('ST'), None if instruction is None else cls.INSTRUCTIONS.index(instruction), row.get('RV'))
+
+
+    def updated(self, fields):
+        row = FileRow(self.directory, self.name, self.rs, self.ls, self.st, self.i, self.rv)
+        for column, value in fields.items():
+            if column == 'RS':
+                row.rs = sha1_to_bytes(value)
+            elif column == 'LS':
+                row.ls = sha1_to_bytes(value)
+            elif column == 'ST':
+                row.st = value
+            elif column == 'I':
+                row.i = None if value is None else self.INSTRUCTIONS.index(value)
+            elif column == 'RV':
+                row.rv = value
+            else:
+                raise ValueError("Column " + column + " can't be updated")
+        if row.ls == row.rs:
+            row.ls = row.rs
+        return row
+
+
+    def __getitem__(self, column):
+        if column == 'FN':
+            return self.directory + self.name
+        if column == 'I':
+            return None if self.i is None else self.INSTRUCTIONS[self.i]
+        if column == 'RS':
+            return sha1_from_bytes(self.rs)
+        if column == 'LS':
+            return sha1_from_bytes(self.ls)
+        if column == 'ST':
+            return self.st
+        if column == 'RV':
+            return self.rv
+        if column == 'L':
+            return (self.directory + self.name).count(os.sep)
+        raise KeyError(column)
+
+
+    def __repr__(self):
+        return str({column: self[column] for column in SqliteFilesTable.COLUMNS})
+
+
+def sha1_to_bytes(sha1):
+    if sha1 is not None and len(sha1) == 40:
+        try:
+            return bytes.fromhex(sha1)
+        except ValueError:
+            pass
+    return sha1  # None, or something like "FILE_MISSING"
+
+
+def sha1_from_bytes(sha1):
+    return sha1.hex() if isinstance(sha1, bytes) else sha1
+
+
+class IndexedFilesTable():
+
+    # Keeps every row in memory, in front of the SQLite table, so that the exact-file-name gets and
+    # updates that the sync loop is full of don't go to the database. Rows are held by parent
+    # directory then name within it, so a directory's children are found without a scan. Rows
+    # with a pending instruction are also queued per instruction, so listing the work to do costs
+    # time proportional to that work, not to the size of the tree.
+
+    def __init__(self, delegate):
+        self.delegate = delegate
+        self.children = {}
+        self.instruction_queues = {}
+        self.load()
+
+
+    def load(self):
+        self.children = {}
+        # dicts rather than sets, to keep the order instructions were made in
+        self.instruction_queues = {instruction: {} for instruction in FileRow.INSTRUCTIONS}
+        for row in self.delegate.all():
+            self.put(row['FN'], row)
+
+
+    def put(self, file_name, row):
+        directory, name = split_file_name(file_name)
+        siblings = self.children.get(directory)
+        if siblings is None:
+            directory = sys.intern(directory)
+            siblings = self.children[directory] = {}
+        siblings[name] = FileRow.from_dict(directory, name, row)
+        self.enqueue(row.get('I'), file_name)
+
+
+    def row_for(self, file_name):
+        directory, name = split_file_name(file_name)
+        siblings = self.children.get(directory)
+        return None if siblings is None else siblings.get(name)
+
+
+    def enqueue(self, instruction, file_name):
+        if instruction is not None:
+            self.instruction_queues.setdefault(instruction, {})[file_name] = None
+
+
+    def dequeue(self, instruction, file_name):
+        if instruction is not None:
+            self.instruction_queues[instruction].pop(file_name, None)
+
+
+    @contextlib.contextmanager
+    def transaction(self):
+        try:
+            with self.delegate.transaction():
+                yield
+        except BaseException:
+            # Rolled back in the database, so the rows in memory are reloaded to match.
+            self.load()
+            raise
+
+
+    def get(self, file_name):
+        return self.row_for(file_name)
+
+
+    def contains(self, file_name):
+        return self.row_for(file_name) is not None
+
+
+    def insert(self, row):
+        inserted = self.delegate.insert(row)
+        self.put(row['FN'], row)
+        return inserted
+
+
+    def update(self, fields, file_name):
+        row = self.row_for(file_name)
+        if row is None:
+            return False
+        updated = self.delegate.update(fields, file_name)
+        if 'I' in fields and fields['I'] != row['I']:
+            self.dequeue(row['I'], file_name)
+            self.enqueue(fields['I'], file_name)
+        # Rows are replaced rather than changed, as callers may be holding on to the old one.
+        self.children[row.directory][row.name] = row.updated(fields)
+        return updated
+
+
+    def remove(self, file_name):
+        if self.row_for(file_name) is None:
+            return False
+        removed = self.delegate.remove(file_name)
+        self.forget(file_name)
+        return removed
+
+
+    def remove_subtree(self, directory):
+        file_names = self.descendants_of(directory)
+        if self.row_for(directory) is not None:
+            file_names.append(directory)
+        if len(file_names) == 0:
+            return 0
+        removed = self.delegate.remove_subtree(directory)
+        for file_name in file_names:
+            self.forget(file_name)
+        return removed
+
+
+    def forget(self, file_name):
+        directory, name = split_file_name(file_name)
+        siblings = self.children[directory]
+        self.dequeue(siblings.pop(name)['I'], file_name)
+        if len(siblings) == 0:
+            del self.children[directory]
+
+
+    def descendants_of(self, directory):
+        # By the name of the directory they're in, as the database has them (a key range), rather than
+        # by walking down through rows: a directory in the tree needn't have a row of its own. Parents
+        # come before what's in them.
+        descendants = []
+        for parent in sorted(parent for parent in self.children if parent.startswith(directory)):
+            descendants += [parent + name for name in self.children[parent]]
+        return descendants
+
+
+    def children_of(self, directory):
+        return [directory + name for name in self.children.get(directory, {})]
+
+
+    def search_by_instruction(self, instruction):
+        return [self.row_for(file_name) for file_name in self.instruction_queues.get(instruction, {})]
+
+
+    def count_with_instructions(self):
+        return sum(len(queue) for queue in self.instruction_queues.values())
+
+
+    def search_possible_children(self, directory):
+        # The directory itself and its immediate children that are files, if they've no pending instructions
+        level = directory.count(os.sep)
+        rows = []
+        directory_row = self.row_for(directory)
+        for row in ([directory_row] if directory_row else []) + list(self.children.get(directory, {}).values()):
+            if row.i is None and row['L'] <= level:
+                rows.append(row)
+        return rows
+
+
+    def all(self):
+        return [row for siblings in self.children.values() for row in siblings.values()]
+
+
+    def commit(self):
+        self.delegate.commit()
+
+
+    def checkpoint(self):
+        self.delegate.checkpoint()
+
+
+    def close(self):
+        self.delegate.close()
+
+
+def split_file_name(file_name):
+    # Into the parent directory's name (ending in a separator) and the name within that directory,
+    # which ends in '/' for a directory.
+    end = len(file_name) - 1 if file_name.endswith("/") else len(file_name)
+    cut = file_name.rfind("/", 0, end)
+    if os.sep != "/":
+        cut = max(cut, file_name.rfind(os.sep, 0, end))
+    return file_name[:cut + 1], file_name[cut + 1:]
+
+
+def prefix_upper_bound(prefix):
+    # The first string after all of those that start with prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def files_row_as_dict(cursor, row):
+    return dict(zip(SqliteFilesTable.COLUMNS, row))
+
+
+def open_files_table(db_dir):
+    db_file = db_dir + "subsyncit.db"
+    tinydb_file = db_dir + "subsyncit.tinydb"
+    if os.path.exists(db_file) and os.path.getsize(db_file) > 0:
+        with open(db_file, "rb") as f:
+            if f.read(16) != b"SQLite format 3\x00":
+                # A TinyDB (JSON) database from an earlier Subsyncit. Moved aside and migrated once.
+                os.rename(db_file, tinydb_file)
+
+    if os.path.exists(tinydb_file):
+        # Moved aside now, or by a start that stopped before the migration was done. Imported into a
+        # file of its own that only becomes the SQLite database once it's all there, and the TinyDB
+        # one is only renamed after that, so stopping at any point means it's done again next time.
+        start = time.time()
+        migrating_file = db_file + ".migrating"
+        for leftover in (migrating_file, migrating_file + "-wal", migrating_file + "-shm"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(leftover)
+        db = TinyDB(tinydb_file)
+        rows = db.table('files').all()
+        migrated = SqliteFilesTable(migrating_file)
+        with migrated.transaction():
+            for row in rows:
+                migrated.insert({column: row.get(column) for column in SqliteFilesTable.COLUMNS})
+        migrated.close()
+        db.close()
+        for leftover in (db_file + "-wal", db_file + "-shm"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(leftover)
+        os.replace(migrating_file, db_file)
+        os.rename(tinydb_file, tinydb_file + ".migrated")
+        section_end(True, "Migration of " + str(len(rows)) + " rows from TinyDB to SQLite took %s.", start)
+
+    return SqliteFilesTable(db_file)
+
+
+class ScannedDirectories():
+
+    # Each directory of the Local Sync Directory that the file system scan has come across, with its
+    # modification time (st_mtime_ns) when the scan last listed it, or None if it hasn't yet. Named as
+    # in the files table, and "/" for the root. In a table of its own in the files table's database,
+    # and in memory, with the subdirectories of each so that the scan can walk down unlisted ones.
+    # Changes are written by commit(), which is after the files table's, so that a directory is never
+    # saved as listed without the instructions that the listing made.
+
+    def __init__(self, db_file):
+        self.connection = sqlite3.connect(db_file)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS directories (FN TEXT NOT NULL PRIMARY KEY, MT INTEGER)")
+        self.connection.commit()
+        self.mtimes = {}
+        self.subdirectories = {}
+        self.unsaved = set()
+        for directory, mtime in self.connection.execute("SELECT FN, MT FROM directories"):
+            self.remember(directory, mtime)
+
+
+    def remember(self, directory, mtime):
+        self.mtimes[directory] = mtime
+        if directory != "/":
+            self.subdirectories.setdefault(split_file_name(directory)[0], set()).add(directory)
+
+
+    def mtime(self, directory):
+        return self.mtimes.get(directory)
+
+
+    def subdirectories_of(self, directory):
+        return self.subdirectories.get(directory, set())
+
+
+    def listed(self, directory, mtime, subdirectories):
+        # As a listing of the directory had it. Subdirectories no longer there are forgotten, with
+        # everything under them, and new ones remembered as not listed yet.
+        for gone in self.subdirectories_of(directory) - set(subdirectories):
+            self.forget(gone)
+        for subdirectory in subdirectories:
+            if subdirectory not in self.mtimes:
+                self.remember(subdirectory, None)
+                self.unsaved.add(subdirectory)
+        self.remember(directory, mtime)
+        self.unsaved.add(directory)
+
+
+    def forget(self, directory):
+        for subdirectory in self.subdirectories.pop(directory, set()):
+            self.forget(subdirectory)
+        del self.mtimes[directory]
+        self.subdirectories_of(split_file_name(directory)[0]).discard(directory)
+        self.unsaved.add(directory)
+
+
+    def commit(self):
+        self.connection.executemany("INSERT OR REPLACE INTO directories (FN, MT) VALUES (?, ?)",
+                                    ((directory, self.mtimes[directory]) for directory in self.unsaved if directory in self.mtimes))
+        self.connection.executemany("DELETE FROM directories WHERE FN = ?",
+                                    ((directory,) for directory in self.unsaved if directory not in self.mtimes))
+        self.connection.commit()
+        self.unsaved = set()
+
+
+    def close(self):
+        self.commit()
+        self.connection.close()
 
 
 class UnexpectedStatusCode(Exception):
@@ -423,6 +1543,12 @@ class NoConnection(Exception):
         self.message = msg
 
 
+class GETNotMatchingServerSha1(Exception):
+
+    def __init__(self, file_name, server_sha1, downloaded_sha1):
+        self.message = "file name: " + file_name + " server sha1: " + server_sha1 + " downloaded sha1: " + downloaded_sha1
+
+
 class NotPUTting(Exception):
     pass
 
@@ -451,6 +1577,10 @@ class Config(object):
         self.files_table = None
         self.svn_baseline_rel_path = None
         self.svn_repo_parent_path = None
+        # For --delta-uploads and --delta-downloads: the PristineStore. For --delta-uploads: where
+        # the server says to make commits
+        self.pristines = None
+        self.svn_commit_stubs = None
 
 
 class State(object):
@@ -462,9 +1592,27 @@ class State(object):
         self.db_dir = db_dir
         self.iteration = 0
         self.last_scanned = 0
+        # Not saved, so the first scan after a start is a full one
+        self.last_full_scan = 0
+        self.scanned_directories = None
+        # Where the scan for missed adds and changes stopped, if it ran out of time, with whether it's a
+        # full scan and when it started. Not saved either.
+        self.scan_cursor = None
+        self.scan_full = False
+        self.scan_started = 0
+        # Listed by the scan for missed adds and changes, and not yet looked at by the scan for missed deletes
+        self.directories_listed = []
         self.last_root_revision = 0
         self.previous_root_revision = -1
+        # The files PUT or GOT since the last poll that looked for changes on the server, which may be at
+        # a later revision than last_root_revision, for the update-report to say so. None until then, as
+        # which those are from before isn't known.
+        self.files_revised = None
+        # Remade for each poll
+        self.svn_dir_revisions = None
+        # Set from GET workers, and checked from the file system watcher's thread
         self.doing = {}
+        self.doing_lock = threading.Lock()
 
 
     def __str__(self):
@@ -478,21 +1626,28 @@ class State(object):
         return online_
 
 
+    def revised(self, file_name):
+        if self.files_revised is not None:
+            self.files_revised.add(file_name)
+
+
     def ignore_fs_events_for_this_for_2_secs(self, file_name):
-        now = time.time()
-        self.doing[file_name] = now
+        with self.doing_lock:
+            now = time.time()
+            self.doing[file_name] = now
 
 
     def should_ignore_fs_events_for_this_for_nowʔ(self, file_name):
-        now = time.time()
-        doing_this_one = False
-        for k in list(self.doing):
-            if now - self.doing[k] > 2:
-                self.doing.pop(k)
-            elif k == file_name:
-                doing_this_one = True
+        with self.doing_lock:
+            now = time.time()
+            doing_this_one = False
+            for k in list(self.doing):
+                if now - self.doing[k] > 2:
+                    self.doing.pop(k)
+                elif k == file_name:
+                    doing_this_one = True
 
-        return doing_this_one
+            return doing_this_one
 
 
     def save_if_changed(self):
@@ -565,10 +1720,49 @@ class MakeDirOnSvnAndGetRevision():
         raise BaseException("Unexpected return code " + str(rc) + " for MKCOL on " + svn_dir)
 
 
-class GetDirRevisionsFromSvn():
+class SvnDirRevisions():
+
+    # The revisions of directories on the Subversion server, for one poll. SVN-Youngest-Rev is asked for
+    # once, then a directory's revision comes from a depth-1 PROPFIND of its parent at that revision,
+    # which has the revisions of all of its subdirectories too. Those are kept, so that a walk down the
+    # tree costs a request per level, rather than an OPTIONS and a PROPFIND per directory. It's as of
+    # the start of the poll, so directories this client has just made are for svn_revision() instead.
+
+    def __init__(self, config, requests_session):
+        self.config = config
+        self.requests_session = requests_session
+        self.youngest_rev = None
+        self.revisions = {}
+
+
+    def youngest(self):
+        if self.youngest_rev is None:
+            options = self.requests_session.options(self.config.args.svn_url + "/",
+                                                    data='<?xml version="1.0" encoding="utf-8"?><D:options xmlns:D="DAV:"><D:activity-collection-set></D:activity-collection-set></D:options>')
+            if options.status_code != 200:
+                raise UnexpectedStatusCode(options.status_code)
+            self.youngest_rev = options.headers["SVN-Youngest-Rev"].strip()
+        return self.youngest_rev
+
 
     def revision_for_dir(self, requests_session, dir, config):
-        return requests_session.svn_revision(config, dir.replace(os.sep, "/"))
+        directory = dir.replace(os.sep, "/")
+        if not directory.endswith("/"):
+            directory += "/"
+        if directory not in self.revisions:
+            parent = directory[:-1].rpartition("/")[0] + "/"
+            propfind = self.requests_session.propfind(svn_url_at_revision(self.config, self.youngest(), parent), depth=1)
+            if propfind.status_code != 207:
+                propfind.close()
+                raise UnexpectedStatusCode(propfind.status_code)
+            for element in streamed_xml_elements(propfind, DAV_RESPONSE, {SVN_BASELINE_RELATIVE_PATH, DAV_VERSION_NAME, SVN_SHA1_CHECKSUM}):
+                if not element.get(SVN_SHA1_CHECKSUM):
+                    path = "/" + extract_path_from_baseline_rel_path(self.config, element.get(SVN_BASELINE_RELATIVE_PATH, "")).replace(os.sep, "/")
+                    self.revisions[path if path == "/" else path + "/"] = int(element.get(DAV_VERSION_NAME) or 0)
+            if directory not in self.revisions:
+                # Gone since, or never was
+                raise UnexpectedStatusCode(404)
+        return self.revisions[directory]
 
 
 class FileSystemNotificationHandler(PatternMatchingEventHandler):
@@ -694,12 +1888,38 @@ def esc(name):
     return name.replace("?", "%3F").replace("&", "%26")
 
 
+def svn_url_at_revision(config, rev, file_name):
+    # What's at a URL like this never changes
+    url = config.args.svn_url.replace(config.svn_repo_parent_path + config.svn_baseline_rel_path, config.svn_repo_parent_path
+                                      + "!svn/rvr/" + str(rev) + "/" + config.svn_baseline_rel_path + file_name, 1)
+    if url == config.args.svn_url:
+        # Syncing the root of the repo
+        url = config.args.svn_url + "/!svn/rvr/" + str(rev) + file_name
+    return url
+
+
+def partial_download_path(abs_local_file_path):
+    # Hidden, so that it's neither synced, nor noticed by the file system watcher
+    directory, name = os.path.split(abs_local_file_path)
+    return os.path.join(directory, "." + name + ".subsyncit-partial")
+
+
+def remove_partial_download(abs_local_file_path):
+    # What's left of a download that was cut short (if anything), as the file's row is going
+    partial_path = partial_download_path(abs_local_file_path)
+    for path in (partial_path, partial_path + ".json"):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
 def make_directories_if_missing_in_db(config, state, dname, requests_session, revision_getter):
 
     dirs_made = 0
     if dname == "/" or dname == "//":
         return 0
-    dir = state.files_table.get(Query().FN == dname)
+    dir = state.files_table.get(dname)
 
     the_dirname = dirname(dname[:-1]) + "/"
 
@@ -711,7 +1931,7 @@ def make_directories_if_missing_in_db(config, state, dname, requests_session, re
     if not dir or dir['RV'] == 0:
         parentname = the_dirname
         if dirname != "/":
-            parent = state.files_table.get(Query().FN == parentname)
+            parent = state.files_table.get(parentname)
             if not parent or parent['RV'] == 0:
                 dirs_made += make_directories_if_missing_in_db(config, state, parentname, requests_session, revision_getter)
 
@@ -735,7 +1955,75 @@ def make_directories_if_missing_in_db(config, state, dname, requests_session, re
                 'I': None,
                 'RV': revision_getter.revision_for_dir(requests_session, the_dirname, config)
             },
-            Query().FN == dname)
+            dname)
+    return dirs_made
+
+
+def make_directories_on_svn_if_missing(config, state, requests_session, file_names, put_workers):
+    # MKCOLs for the directories the files are in (and the directories those are in) that aren't
+    # in Subversion yet. A level of directories at a time, so that parents are made before their
+    # children, with the MKCOLs for each level shared between the PUT workers. None if, with
+    # --batch-commits, the commit of them didn't happen (another client made one at the same time,
+    # say), so the files aren't to be PUT until that's tried again.
+    directories = set()
+    for file_name in file_names:
+        directory = split_file_name(file_name)[0]
+        while directory not in ("", "/") and directory not in directories:
+            directories.add(directory)
+            directory = split_file_name(directory)[0]
+
+    levels = {}
+    for directory in sorted(directories):
+        row = state.files_table.get(directory)
+        if not row or row['RV'] == 0:
+            levels.setdefault(directory.replace(os.sep, "/").count("/"), []).append(directory)
+
+    dirs_made = 0
+    revs = []
+    if len(levels) > 0 and config.svn_commit_stubs and config.args.batch_commits:
+        # With --batch-commits, all of them in one revision (in the order they're MKCOLed, parents first)
+        made = []
+        txn = None
+        try:
+            txn = SvnTransaction(config, requests_session)
+            for level in sorted(levels):
+                for directory in levels[level]:
+                    if txn.mkcol(directory):
+                        made.append(directory)
+                    else:
+                        revs.append((directory, requests_session.svn_revision(config, directory.replace(os.sep, "/"))))
+            if len(made) > 0:
+                rev = txn.merge()
+                revs += [(directory, rev) for directory in made]
+            else:
+                txn.abort()
+        except NotPUTting as e:
+            if txn is not None:
+                txn.abort()
+            print("Commit of MKCOLs for " + str(len(directories)) + " directories didn't happen, and will be tried again: " + getattr(e, "message", type(e).__name__))
+            return None
+        except BaseException:
+            if txn is not None:
+                txn.abort()
+            raise
+    else:
+        for level in sorted(levels):
+            futures = [(directory, put_workers.submit(MakeDirOnSvnAndGetRevision().revision_for_dir, requests_session, directory, config))
+                       for directory in levels[level]]
+            revs += [(directory, future.result()) for directory, future in futures]
+
+    for directory, rev in revs:
+        if state.files_table.contains(directory):
+            state.files_table.update({'I': None, 'RV': rev}, directory)
+        else:
+            state.files_table.insert({'FN': directory,
+                                      'L': directory.count(os.sep),
+                                      'RS': None,
+                                      'LS': None,
+                                      'ST': 0,
+                                      'I': None,
+                                      'RV': rev})
+        dirs_made += 1
     return dirs_made
 
 
@@ -751,13 +2039,6 @@ def english_duration(duration):
     return str(round(duration/3600, 2)) + " hours"
 
 
-def un_encode_path(file_name):
-    return file_name.replace("&amp;", "&")\
-        .replace("&quot;", "\"")\
-        .replace("%3F", "?")\
-        .replace("%26", "&")
-
-
 def extract_name_type_rev(entry_xml_element):
     file_or_dir = entry_xml_element.attrib['kind']
     file_name = entry_xml_element.findtext("name")
@@ -769,7 +2050,8 @@ def local_deletes(config, state):
 
     start = time.time()
 
-    rows = state.files_table.search(Query().I == DELETE_LOCALLY)
+    # Deepest first, so that a directory is emptied of what's to be deleted in it before it is
+    rows = sorted(state.files_table.search_by_instruction(DELETE_LOCALLY), key=lambda row: row['FN'].rstrip("/").count("/"), reverse=True)
 
     deletes = 0
     try:
@@ -778,40 +2060,51 @@ def local_deletes(config, state):
             name = (config.args.absolute_local_root_path + file_name)
             try:
                 state.ignore_fs_events_for_this_for_2_secs(file_name)
-                os.remove(name)
+                if file_name.endswith("/"):
+                    os.rmdir(name)
+                else:
+                    remove_partial_download(name)
+                    os.remove(name)
                 deletes += 1
-                state.files_table.remove(Query().FN == file_name)
+                state.files_table.remove(file_name)
                 if file_name.endswith("/"):
                     file_name = file_name[:-1]
                 # parentGETʔ(state, dirname(file_name) + "/")
             except OSError as e:
-                if "No such file or directory" in e.strerror:
+                if e.errno == errno.ENOENT:
                     # Already deleted
-                    state.files_table.remove(Query().FN == file_name)
-                # has child dirs/files - shouldn't be deleted - can be on next pass.
+                    state.files_table.remove(file_name)
+                elif e.errno == errno.ENOTEMPTY and len(state.files_table.children_of(file_name)) == 0:
+                    # Holds only what isn't synced (excluded files, clash files, and the like), which is
+                    # left where it is, with the directory. The directory's row goes, rather than
+                    # failing on every pass.
+                    print("Not deleting " + name + " locally, as it has files that aren't synced in it: " + ", ".join(sorted(os.listdir(name)))[:200])
+                    state.files_table.remove(file_name)
+                # has child dirs/files still - shouldn't be deleted - can be on next pass.
                 continue
     finally:
+        state.files_table.commit()
         section_end(deletes > 0,  "Performing " + str(deletes) + " local deletes took %s." + stack_trace(), start)
 
 
-def update_row_shas_size_and_timestamp(files_table, file_name, sha1, size_ts):
+def update_row_after_GET(files_table, file_name, sha1, signature, rev):
     if sha1 == None:
         raise BaseException("No sha1 for " + file_name)
-    files_table.update({'RS': sha1, 'LS': sha1, 'ST': size_ts}, Query().FN == file_name)
+    files_table.update({'RS': sha1, 'LS': sha1, 'ST': signature, 'RV': rev, 'I': None}, file_name)
 
 
 def prt_files_table_for(files_table, file_name):
-    return str(files_table.search(Query().FN == file_name))
+    return str(files_table.get(file_name))
 
 
 def update_row_revision(files_table, file_name, rev=0):
-    files_table.update({'RV': rev}, Query().FN == file_name)
+    files_table.update({'RV': rev}, file_name)
 
 
 def upsert_row_in_table(files_table, file_name, instruction):
 
     # print "upsert1" + prt_files_table_for(files_table, file_name)
-    if not files_table.contains(Query().FN == file_name):
+    if not files_table.contains(file_name):
         files_table.insert({'FN': file_name,
                             'L': file_name.count(os.sep),
                             'RS': None,
@@ -822,7 +2115,7 @@ def upsert_row_in_table(files_table, file_name, instruction):
         return
 
     if instruction is not None:
-        files_table.update({'I': instruction}, Query().FN == file_name)
+        files_table.update({'I': instruction}, file_name)
 
 def get_file_name(config, full_path):
     if not full_path.startswith(config.args.absolute_local_root_path):
@@ -833,93 +2126,113 @@ def get_file_name(config, full_path):
         rel = rel[1:]
     return rel
 
+def streamed_xml_elements(response, container, names):
+    # For each container element in an XML response, a dict of the text in the elements with those
+    # names inside it (as expat has them: namespace, space, local name). Parsed as the response is
+    # streamed, and yielded as each container closes, so the whole body is never in memory at once.
+    parser = xml.parsers.expat.ParserCreate(namespace_separator=" ")
+    parser.buffer_text = True
+    elements = []
+    texts = {}
+    text = []
+
+    def start_element(name, attrs):
+        if name in names:
+            text.clear()
+            # Only while in an element that's wanted, rather than for all the whitespace between
+            parser.CharacterDataHandler = text.append
+
+    def end_element(name):
+        if name in names:
+            texts[name] = "".join(text)
+            parser.CharacterDataHandler = None
+        elif name == container:
+            elements.append(texts.copy())
+            texts.clear()
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    with contextlib.closing(response):
+        for chunk in response.iter_content(chunk_size=65536):
+            parser.Parse(chunk, False)
+            yield from elements
+            elements.clear()
+        parser.Parse(b"", True)
+        yield from elements
+
+
+def svn_entries(config, propfind, prefix=""):
+    # (path, rev, sha1) for each file or directory in a PROPFIND's multistatus, as it's streamed.
+    # Directories (no sha1) end in a slash. The directory that was PROPFINDed itself isn't one.
+    for element in streamed_xml_elements(propfind, DAV_RESPONSE, {SVN_BASELINE_RELATIVE_PATH, DAV_VERSION_NAME, SVN_SHA1_CHECKSUM}):
+        path = "/" + extract_path_from_baseline_rel_path(config, element.get(SVN_BASELINE_RELATIVE_PATH, ""))
+        rev = int(element.get(DAV_VERSION_NAME) or 0)
+        sha1 = element.get(SVN_SHA1_CHECKSUM) or None
+        if sha1 is None and path != "/":
+            path += "/"
+        if path == prefix and prefix.endswith("/"):
+            continue
+        if path != "/" and len(path) >= len(prefix):
+            yield (path, rev, sha1)
+
+
 def svn_dir_list(config, requests_session, prefix):
 
     propfind = requests_session.propfind(config.args.svn_url + esc(prefix), depth=1)
 
-    output = propfind.text
-
-    if "PROPFIND requests with a Depth of \"infinity\"" in output:
-        print("'DavDepthInfinity on' needs to be enabled for the Apache instance on " \
-              "the server (in httpd.conf probably). Refer to " \
-              "https://github.com/subsyncit/subsyncit/wiki/Subversion-Server-Setup. " \
-              "Subsyncit is refusing to run.")
-        exit(1)
-
-    entries = []; path = ""; rev = 0; sha1 = None
-
-    splitlines = output.splitlines()
-    for line in splitlines:
-        if ":baseline-relative-path>" in line:
-            rel_path = extract_path_from_baseline_rel_path(config, line)
-            path = "/" + un_encode_path(rel_path)
-        if ":version-name" in line:
-            rev = int(line[line.index(">") + 1:line.index("<", 3)])
-        if ":sha1-checksum>" in line:
-            sha1 = line[line.index(">") + 1:line.index("<", 3)]
-        if "</D:response>" in line:
-            if sha1 is None and path != "/":
-                path += "/"
-            if path == prefix and prefix.endswith("/"):
-                continue
-            if path != "" and path != "/" and len(path) >= len(prefix):
-                entries.append((path, rev, sha1))
-            path = ""; rev = 0; sha1 = None
-
-    return entries
-
-def extract_path_from_baseline_rel_path(config, line):
-    search = re.search(
-        "<lp[0-9]:baseline-relative-path>" + config.svn_baseline_rel_path.replace(
-            os.sep, "/") + "(.*)</lp[0-9]:baseline-relative-path>", line)
-    if search:
-        path = search.group(1)
-        if path.startswith("/"):
-            path = path[1:]
-    else:
-        path = ""
+    if propfind.status_code != 207:
+        output = propfind.text
+        if "PROPFIND requests with a Depth of \"infinity\"" in output:
+            print("'DavDepthInfinity on' needs to be enabled for the Apache instance on " \
+                  "the server (in httpd.conf probably). Refer to " \
+                  "https://github.com/subsyncit/subsyncit/wiki/Subversion-Server-Setup. " \
+                  "Subsyncit is refusing to run.")
+            exit(1)
+        return iter(())
+
+    return svn_entries(config, propfind, prefix)
+
+def extract_path_from_baseline_rel_path(config, rel_path):
+    prefix = config.svn_baseline_rel_path.replace(os.sep, "/")
+    if not rel_path.startswith(prefix):
+        return ""
+    path = rel_path[len(prefix):]
+    if path.startswith("/"):
+        path = path[1:]
     return path.replace("/", os.sep).replace("\\", os.sep).replace(os.sep+os.sep, os.sep)
 
 
-def update_sha_and_revision_for_row(config, state, requests_session, file_name, local_sha1, size_ts):
-    elements_for = svn_dir_list(config, requests_session, file_name)
+def sha_and_revision_fields_after_PUT(config, requests_session, file_name, local_sha1, signature):
+    elements_for = list(svn_dir_list(config, requests_session, file_name))
     i = len(elements_for)
     if i != 1:
         raise BaseException("too many or too few elements found: " + str(i) + " for " + config.args.svn_url + file_name)
     for not_used_this_time, remote_rev_num, remote_sha1 in elements_for:
         if local_sha1 != remote_sha1:
             raise NotPUTtingAsItWasChangedOnTheServerByAnotherUser()
-        state.files_table.update({
+        return {
             'RV': remote_rev_num,
             'RS': remote_sha1,
             'LS': remote_sha1,
-            'ST': size_ts
-        }, Query().FN == file_name)
+            'ST': signature,
+            'I': None
+        }
 
 
 def svn_details(config, requests_session, file_name):
     ver = 0
     sha1 = None
     svn_baseline_rel_path = ""
-    content = ""
     try:
         url = config.args.svn_url + esc(file_name).replace("\\", "/")
         if url.endswith("/"):
             url = url[:-1]
         propfind = requests_session.propfind(url, depth=0)
         if 200 <= propfind.status_code <= 299:
-            content = propfind.text
-
-            for line in content.splitlines():
-                if ":baseline-relative-path" in line and "baseline-relative-path/>" not in line:
-                    svn_baseline_rel_path = line[line.index(">")+1:line.index("<", 3)]
-                if ":version-name" in line:
-                    ver=int(line[line.index(">")+1:line.index("<", 3)])
-                if ":sha1-checksum" in line:
-                    if "sha1-checksum/" in line:
-                        sha1 = None
-                    else:
-                        sha1=line[line.index(">")+1:line.index("<", 3)]
+            for element in streamed_xml_elements(propfind, DAV_RESPONSE, {SVN_BASELINE_RELATIVE_PATH, DAV_VERSION_NAME, SVN_SHA1_CHECKSUM}):
+                svn_baseline_rel_path = element.get(SVN_BASELINE_RELATIVE_PATH, "")
+                ver = int(element.get(DAV_VERSION_NAME) or 0)
+                sha1 = element.get(SVN_SHA1_CHECKSUM) or None
         # debug(file_name + ": PROPFIND " + str(propfind.status_code) + " / " + str(sha1) + " / " + str(ver) + " " + url)
         elif propfind.status_code == 401:
             raise NoConnection(config.args.svn_url + " is saying that the user is not authorized")
@@ -942,10 +2255,114 @@ def get_svn_repo_parent_path(config, requests_session):
     if url.endswith("/"):
         url = url[:-1]
 
-    opts = requests_session.options(url, data='<?xml version="1.0" encoding="utf-8"?><D:options xmlns:D="DAV:"><D:activity-collection-set></D:activity-collection-set></D:options>')\
-        .content.decode("utf-8")
+    opts = requests_session.options(url, data='<?xml version="1.0" encoding="utf-8"?><D:options xmlns:D="DAV:"><D:activity-collection-set></D:activity-collection-set></D:options>',
+                                    stream=True)
 
-    return str([line for line in opts.splitlines() if ':activity-collection-set>' in line]).split(">")[2].split("!svn")[0]
+    return list(streamed_xml_elements(opts, "DAV: activity-collection-set", {"DAV: href"}))[0]["DAV: href"].split("!svn")[0]
+
+
+def get_svn_commit_stubs(config, requests_session):
+    # mod_dav_svn 1.7 and later says where to POST for a new transaction (SVN-Me-Resource), and where
+    # a transaction (SVN-Txn-Stub) and its files (SVN-Txn-Root-Stub) are then. An empty tuple if the
+    # server is older than that, as it can only take (whole file) PUTs then.
+    url = config.args.svn_url
+    if url.endswith("/"):
+        url = url[:-1]
+
+    options = requests_session.options(url, data='<?xml version="1.0" encoding="utf-8"?><D:options xmlns:D="DAV:"><D:activity-collection-set></D:activity-collection-set></D:options>')
+    if "SVN-Me-Resource" not in options.headers:
+        return ()
+    return (options.headers["SVN-Me-Resource"], options.headers["SVN-Txn-Stub"], options.headers["SVN-Txn-Root-Stub"])
+
+
+def update_report(config, requests_session, directory, update_target, from_rev, to_rev, send_all, entries=()):
+    # Subversion's report of what it takes to bring directory (or update_target in it) from one revision
+    # to another - as svn update asks for it. With send_all, that includes deltas of the files' contents
+    # against how they were in from_rev, as svndiff1 (or svndiff0), base64 encoded in the XML. Entries
+    # are (path within directory, rev) of those that are at a revision other than from_rev.
+    parsed_url = urlparse(config.args.svn_url)
+    vcc_url = parsed_url.scheme + "://" + parsed_url.netloc + config.svn_repo_parent_path + "!svn/vcc/default"
+    src_path = config.args.svn_url + quote(directory.replace(os.sep, "/").rstrip("/"))
+    body = '<S:update-report xmlns:S="svn:" send-all="' + ("true" if send_all else "false") + '">' \
+           + '<S:src-path>' + escape(src_path) + '</S:src-path>' \
+           + '<S:target-revision>' + str(to_rev) + '</S:target-revision>' \
+           + ('<S:update-target>' + escape(update_target) + '</S:update-target>' if update_target else '') \
+           + '<S:depth>infinity</S:depth>' \
+           + '<S:entry rev="' + str(from_rev) + '" depth="infinity"></S:entry>' \
+           + "".join('<S:entry rev="' + str(rev) + '" depth="infinity">' + escape(path) + '</S:entry>' for (path, rev) in entries) \
+           + '</S:update-report>'
+    report = requests_session.update_report(vcc_url, data=body, headers={"Accept-Encoding": "svndiff1;q=0.9,svndiff;q=0.8"})
+    if report.status_code != 200:
+        report.close()
+        raise UnexpectedStatusCode(report.status_code)
+    return report
+
+
+def GET_delta(config, requests_session, file_name, base_rev, rev, base_file, write):
+    # The file at rev made from the base copy (as it was in base_rev) and the delta for it from an
+    # update-report, written a window at a time. The delta is decoded and applied as the report
+    # arrives. False if the server didn't send something that could be applied, to GET it whole.
+    directory, name = split_file_name(file_name)
+    try:
+        report = update_report(config, requests_session, directory, name, base_rev, rev, True)
+    except UnexpectedStatusCode as e:
+        print("Delta for " + file_name + " could not be had (" + e.message.strip() + "), so GETting it whole")
+        return False
+    applier = SvndiffApplier(base_file, write)
+    parser = xml.parsers.expat.ParserCreate(namespace_separator=" ")
+    in_txdelta = []
+    # base64 is decoded (and applied) 64 KB at a time, as it comes in lines of 76 characters
+    encoded = []
+    encoded_len = [0]
+    deltas = []
+
+    def decode_and_apply(all_of_it):
+        text = "".join("".join(encoded).split())
+        usable = len(text) if all_of_it else len(text) - len(text) % 4
+        encoded[:] = [text[usable:]]
+        encoded_len[0] = len(text) - usable
+        applier.feed(base64.b64decode(text[:usable]))
+
+    def start_element(name, attrs):
+        if name == "svn: txdelta":
+            in_txdelta.append(True)
+            deltas.append(name)
+
+    def end_element(name):
+        if name == "svn: txdelta":
+            in_txdelta.pop()
+            decode_and_apply(True)
+
+    def character_data(data):
+        if in_txdelta:
+            encoded.append(data)
+            encoded_len[0] += len(data)
+            if encoded_len[0] >= 65536:
+                decode_and_apply(False)
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.CharacterDataHandler = character_data
+    try:
+        with contextlib.closing(report):
+            for chunk in report.iter_content(chunk_size=config.args.download_buffer_kb * 1024):
+                parser.Parse(chunk, False)
+            parser.Parse(b"", True)
+        if len(deltas) > 1:
+            return False
+        if len(deltas) == 0:
+            # Only its properties changed
+            base_file.seek(0)
+            buf = base_file.read(config.args.download_buffer_kb * 1024)
+            while len(buf) > 0:
+                write(buf)
+                buf = base_file.read(config.args.download_buffer_kb * 1024)
+            return True
+        applier.finish()
+    except (ValueError, zlib.error, xml.parsers.expat.ExpatError) as e:
+        print("Delta for " + file_name + " could not be applied (" + str(e) + "), so GETting it whole")
+        return False
+    return True
 
 
 def write_error(db_dir, msg):
@@ -966,7 +2383,7 @@ def transform_enqueued_actions_into_instructions(config, state, local_adds_chgs_
             upsert_row_in_table(state.files_table, file_name, instruction=MAKE_DIR_ON_SERVER)
             continue
 
-        row = state.files_table.get(Query().FN == file_name)
+        row = state.files_table.get(file_name)
         if action == "add":
             # 'svn up' can add a file, causing watchdog to trigger an add notification .. to be ignored
             if row is None or row['RS'] is None:
@@ -976,21 +2393,22 @@ def transform_enqueued_actions_into_instructions(config, state, local_adds_chgs_
                 print("row == None for file_name " + file_name + " action: " + action + "files==\n")
                 print_rows(state.files_table)
         elif action == "change":
-            state.files_table.update({'I': PUT_ON_SERVER}, doc_ids=[row.doc_id])
+            state.files_table.update({'I': PUT_ON_SERVER}, file_name)
             if debug_mode:
-                print("PUT_ON_SERVER" + str([row.doc_id]))
+                print("PUT_ON_SERVER " + file_name)
         elif action == "delete":
-            state.files_table.update({'I': DELETE_ON_SERVER}, doc_ids=[row.doc_id])
+            state.files_table.update({'I': DELETE_ON_SERVER}, file_name)
             if debug_mode:
-                print("DELETE_ON_SERVER" + str([row.doc_id]))
+                print("DELETE_ON_SERVER " + file_name)
         else:
             raise Exception("Unknown action " + action)
 
+    state.files_table.commit()
     section_end(len(local_adds_chgs_deletes_queue) > 0,  "Creation of instructions from " + str(initial_queue_length) + " enqueued actions took %s.", start)
 
 
 def file_is_in_subversion(files_table, file_name):
-    row = files_table.get(Query().FN == file_name)
+    row = files_table.get(file_name)
     return False if not row else row['RS'] != None
 
 
@@ -998,78 +2416,199 @@ def print_rows(files_table):
     files_table_all = sorted(files_table.all(), key=lambda k: k['FN'])
     if len(files_table_all) > 0:
         print("All Items, as per 'files' table:")
-        print("  RFN, 0=dir or 1=file, rev, remote sha1, local sha1, size + timestamp, instruction")
+        print("  RFN, 0=dir or 1=file, rev, remote sha1, local sha1, stat signature, instruction")
         for row in files_table_all:
             print(("  " + row['FN'] + ", " + str(row['RV']) + ", " +
-                  str(row['RS']) + ", " + str(row['LS']) + ", " + str(row['ST']) + ", " + str(row['I'])))
-
-
-def scantree(path):
-    for entry in os.scandir(path):
-        if entry.is_dir(follow_symlinks=False):
-            yield from scantree(entry.path)
-        else:
-            yield entry
+                  str(row['RS']) + ", " + str(row['LS']) + ", " + str(row['ST'].hex() if isinstance(row['ST'], bytes) else row['ST']) + ", " +
+                  str(row['I'])))
+
+
+def directory_sort_key(directory):
+    # So that a directory sorts before what's in it, and siblings by name
+    return directory.split("/")
+
+
+def directories_to_list(config, state, full, cursor):
+    # For each directory of the Local Sync Directory that could have had files added, changed or removed
+    # since the scan last listed it, (name, st_mtime_ns, files as os.DirEntry, subdirectory names), in
+    # sorted order. For a full scan that's all of them. Otherwise it's those with a different mtime, as
+    # adding, removing or renaming something in a directory changes its mtime. Changing a file in place
+    # doesn't, though. Directories that aren't listed are walked through to the subdirectories they had
+    # when they were. With a cursor (directory, its mtime, file name) of where a scan stopped, this
+    # carries on after it: files is None for the directories above it, whose files were done then.
+    root = config.args.absolute_local_root_path
+    to_visit = ["/"]
+    while len(to_visit) > 0:
+        directory = to_visit.pop()
+        above_cursor = cursor is not None and directory_sort_key(directory) < directory_sort_key(cursor[0])
+        if above_cursor and not cursor[0].startswith(directory):
+            continue
+        try:
+            mtime = os.stat(root + directory.replace("/", os.sep)).st_mtime_ns
+        except OSError:
+            # Gone since its parent was listed
+            continue
+        if not full and mtime == state.scanned_directories.mtime(directory):
+            to_visit.extend(sorted(state.scanned_directories.subdirectories_of(directory), key=directory_sort_key, reverse=True))
+            continue
+        files = []
+        subdirectories = []
+        for entry in sorted(os.scandir(root + directory.replace("/", os.sep)), key=lambda entry: entry.name):
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(directory + entry.name + "/")
+            else:
+                files.append(entry)
+        to_visit.extend(reversed(subdirectories))
+        if above_cursor:
+            files = None
+        elif cursor is not None and directory == cursor[0] and mtime == cursor[1]:
+            files = [entry for entry in files if entry.name > cursor[2]]
+        yield directory, mtime, files, subdirectories
+
+
+def hashing_blurb(hashed, hashed_bytes, duration):
+    # As in a section's timing, "hashing 3 files (2.15 GB) at 1.32 GB/s"
+    return ("hashing " + str(hashed) + " files (" + str(round(hashed_bytes / 1000000000, 2)) + " GB) at "
+            + str(round(hashed_bytes / 1000000000 / max(duration, 0.000001), 2)) + " GB/s")
+
+
+def after_hashing(state, file_name, osstat, sha1):
+    # Whether the file is to be PUT, now its sha1 is known. Not if that's what it was when last synced,
+    # in which case its stat signature is brought up to date.
+    if sha1 == state.files_table.get(file_name)['LS']:
+        state.files_table.update({'ST': stat_signature(osstat)}, file_name)
+        return False
+    state.files_table.update({'I': PUT_ON_SERVER}, file_name)
+    return True
 
 
 def scan_for_any_missed_adds_and_changes(config, state, excluded_filename_patterns):
 
+    # For up to --scan-budget-ms, then carrying on from there next time
     start = time.time()
-    to_add = to_change = 0
-    for entry in scantree(config.args.absolute_local_root_path):
-        file_name = get_file_name(config, entry.path)
-        if file_name == "subsyncit.stop":
-            state.is_shutting_down = True
-
-        if state.is_shutting_down:
-            break
-
-        if to_add + to_change > 100:
-            break
+    if state.scanned_directories is None:
+        # With a connection of its own, which can't make its table while the files table's is writing
+        state.files_table.commit()
+        state.scanned_directories = ScannedDirectories(state.db_dir + "subsyncit.db")
+    if state.scan_cursor is None:
+        state.scan_full = not config.args.do_fs_event_listener or start - state.last_full_scan > config.args.full_scan_mins * 60
+        state.scan_started = start
+    cursor = state.scan_cursor
+    state.scan_cursor = None
+    # Directories changed within the mtime granularity of some file systems, that could change again
+    # without their mtime doing so, are listed again next time
+    settled_mtime = (start - 2) * 1000000000
+    budget = config.args.scan_budget_ms / 1000
+    to_add = to_change = listed = 0
+
+    # Files that may be as they were when last synced, despite their stat signature, are hashed by a pool
+    # of hash workers while the scan carries on. Queued in order, and no more than two a worker, so the
+    # scan doesn't go much over its budget waiting for them. The files table is only changed here, on
+    # the main thread, as each sha1 is taken off the queue.
+    hashing = []
+    hashed = hashed_bytes = 0
+    hashing_finished = []
+    hashing_started = None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=config.args.hash_workers) as hash_workers:
+        for directory, mtime, files, subdirectories in directories_to_list(config, state, state.scan_full, cursor):
+            if files is None:
+                continue
+            # At least one file each time, so that it gets to the end however small the budget
+            if listed > 0 and time.time() - start > budget:
+                state.scan_cursor = (directory, mtime, "")
+                break
+            listed += 1
+            last_name = ""
+            for entry in files:
+                file_name = get_file_name(config, entry.path)
+                if file_name == "subsyncit.stop":
+                    state.is_shutting_down = True
+
+                if state.is_shutting_down or ((listed > 1 or last_name != "") and time.time() - start > budget):
+                    state.scan_cursor = (directory, mtime, last_name)
+                    break
+                last_name = entry.name
+
+                if excluded_filename_patterns.should_be_excluded(file_name):
+                    continue
+
+                file_name = "/" + file_name
+
+                row = state.files_table.get(file_name)
+                in_subversion = row and row['RS'] != None
+                if row and row['I'] != None:
+                    continue
+                if not in_subversion:
+                    upsert_row_in_table(state.files_table, file_name, PUT_ON_SERVER)
+                    to_add += 1
+                else:
+                    # On Windows, only os.stat() has the device and inode
+                    osstat = entry.stat() if os.name != 'nt' else os.stat(entry.path)
+                    if same_stat(row['ST'], osstat):
+                        if not isinstance(row['ST'], bytes):
+                            # From before there were stat signatures
+                            state.files_table.update({'ST': stat_signature(osstat)}, file_name)
+                    elif row['RS'] == row['LS'] and same_size(row['ST'], osstat):
+                        # Hashed before it's PUT, in case it's not changed
+                        if hashing_started is None:
+                            hashing_started = time.time()
+                        sha1_future = hash_workers.submit(calculate_sha1_from_local_file, entry.path)
+                        sha1_future.add_done_callback(lambda done: hashing_finished.append(time.time()))
+                        hashing.append((file_name, osstat, sha1_future))
+                        hashed += 1
+                        hashed_bytes += osstat.st_size
+                        while len(hashing) > 2 * config.args.hash_workers:
+                            hashed_file_name, hashed_osstat, sha1_future = hashing.pop(0)
+                            to_change += after_hashing(state, hashed_file_name, hashed_osstat, sha1_future.result())
+                    else:
+                        state.files_table.update({'I': PUT_ON_SERVER}, file_name)
+                        to_change += 1
 
-        # if entry.stat().st_mtime < state.last_scanned:
-        #     continue
+            state.directories_listed.append(directory)
+            if state.scan_cursor is not None:
+                break
+            state.scanned_directories.listed(directory, mtime if mtime < settled_mtime else None, subdirectories)
 
-        if excluded_filename_patterns.should_be_excluded(file_name):
-            continue
+        for hashed_file_name, hashed_osstat, sha1_future in hashing:
+            to_change += after_hashing(state, hashed_file_name, hashed_osstat, sha1_future.result())
 
-        file_name = "/" + file_name
-
-        row = state.files_table.get(Query().FN == file_name)
-        in_subversion = row and row['RS'] != None
-        if row and row['I'] != None:
-            continue
-        if not in_subversion:
-            upsert_row_in_table(state.files_table, file_name, PUT_ON_SERVER)
-            to_add += 1
-        else:
-            size_ts = entry.stat().st_size + entry.stat().st_mtime
-            if size_ts != row["ST"]:
-                state.files_table.update({'I': PUT_ON_SERVER}, Query().FN == file_name)
-                to_change += 1
+    if state.scan_cursor is None and state.scan_full:
+        state.last_full_scan = state.scan_started
 
+    state.files_table.commit()
+    state.scanned_directories.commit()
+    carry_on = ", carrying on from " + state.scan_cursor[0] + state.scan_cursor[2] + " next time" if state.scan_cursor else ""
+    hashing_done = ", " + hashing_blurb(hashed, hashed_bytes, max(hashing_finished) - hashing_started) if hashed > 0 else ""
     section_end(to_change > 0 or to_add > 0,  "File system scan for extra PUTs: " + str(to_add) + " missed adds and " + str(to_change)
-          + " missed changes (added/changed while Subsyncit was not running) took %s.", start)
+          + " missed changes (added/changed while Subsyncit was not running) took %s, listing " + str(listed)
+          + (" directories (a full scan)" if state.scan_full else " changed directories") + hashing_done + carry_on + ".", start)
 
     return to_add + to_change
 
 def scan_for_any_missed_deletes(config, state):
 
+    # Only in the directories that the scan for missed adds and changes listed, as something being
+    # removed from any other would have changed its mtime. For up to --scan-budget-ms, with those not
+    # got to left for next time.
     start = time.time()
+    budget = config.args.scan_budget_ms / 1000
     to_delete = 0
 
-    file = Query()
-    for row in state.files_table.search((file.I == None) & (file.RS != None)):
-        if state.is_shutting_down:
-            break
-        if to_delete > 100:
+    while len(state.directories_listed) > 0 and not state.is_shutting_down:
+        directory = state.directories_listed.pop()
+        for file_name in state.files_table.children_of(directory):
+            if os.path.exists(config.args.absolute_local_root_path + file_name):
+                continue
+            # A directory that's gone is everything in it gone
+            for gone in [file_name] + (state.files_table.descendants_of(file_name) if file_name.endswith("/") else []):
+                row = state.files_table.get(gone)
+                if row['RS'] != None and row['I'] == None:
+                    state.files_table.update({'I': DELETE_ON_SERVER}, gone)
+                    to_delete += 1
+        if time.time() - start > budget:
             break
 
-        file_name = row['FN']
-        if not os.path.exists(config.args.absolute_local_root_path + file_name) and row['I'] == None:
-            state.files_table.update({'I': DELETE_ON_SERVER}, Query().FN == file_name)
-            to_delete += 1
-
+    state.files_table.commit()
     section_end(to_delete > 0,  ": " + str(to_delete)
              + " extra DELETEs (deleted locally while Subsyncit was not running) took %s.", start)
 
@@ -1095,37 +2634,124 @@ def should_subsynct_keep_going(file_system_watcher, absolute_local_root_path, st
     return True
 
 
-def make_requests_session(auth, verifySetting):
-    # New session per major loop
+class KeepAliveHTTPAdapter(HTTPAdapter):
+
+    def __init__(self, keep_alive_secs, **kwargs):
+        self.keep_alive_secs = keep_alive_secs
+        super(KeepAliveHTTPAdapter, self).__init__(**kwargs)
+
+
+    def init_poolmanager(self, *args, **kwargs):
+        # TCP keep-alive probes notice a connection that went with a network change, rather than a
+        # pooled connection hanging until it times out.
+        socket_options = list(requests.packages.urllib3.connection.HTTPConnection.default_socket_options)
+        if self.keep_alive_secs > 0:
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            if hasattr(socket, "TCP_KEEPIDLE"):
+                socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keep_alive_secs))
+            if hasattr(socket, "TCP_KEEPINTVL"):
+                socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, self.keep_alive_secs // 6)))
+        kwargs["socket_options"] = socket_options
+        super(KeepAliveHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+def make_requests_session(config, verifySetting):
+    # Kept from one loop to the next, so that polls reuse connections (and TLS sessions) to the
+    # server. Shared by the PUT and GET workers, so there's a pooled connection for each.
     requests_session = requests.Session()
-    requests_session.auth = auth
+    requests_session.auth = config.auth
     requests_session.verify = verifySetting
-    http_adapter = HTTPAdapter(pool_connections=1, max_retries=0)
+    http_adapter = KeepAliveHTTPAdapter(config.args.http_keep_alive_secs,
+                                        pool_connections=config.args.http_pool_size,
+                                        pool_maxsize=config.args.http_max_connections_per_host,
+                                        max_retries=0)
     requests_session.mount('http://', http_adapter)
     requests_session.mount('https://', http_adapter)
     return MyRequestsTracer(requests_session)
 
 
+def network_route_to(svn_url):
+    # The local address that the OS would use to reach the server. That changes as the user moves
+    # around (office, home, wifi, 3G). A UDP socket's connect() sends nothing.
+    url = urlparse(svn_url)
+    try:
+        family, socket_type, proto, canonname, address = socket.getaddrinfo(url.hostname, url.port or (443 if url.scheme == "https" else 80),
+                                                                            type=socket.SOCK_DGRAM)[0]
+        with socket.socket(family, socket_type, proto) as udp_socket:
+            udp_socket.connect(address)
+            return udp_socket.getsockname()[0]
+    except OSError:
+        return None
+
+
 def make_hidden_on_windows_too(path):
     if os.name == 'nt':
         FILE_ATTRIBUTE_HIDDEN = 0x02
         ctypes.windll.kernel32.SetFileAttributesW(path, FILE_ATTRIBUTE_HIDDEN)
 
 
+def DELETEs_in_commits(config, state, requests_session, rows):
+    # With --batch-commits, the DELETEs in transactions of --commit-batch-files at most, each one
+    # revision. Rows are removed once that's committed, and left to be tried again if it isn't.
+    files_deleted = directories_deleted = 0
+    for group_start in range(0, len(rows), config.args.commit_batch_files):
+        deleted = []
+        txn = None
+        try:
+            txn = SvnTransaction(config, requests_session)
+            for row in rows[group_start:group_start + config.args.commit_batch_files]:
+                fn = row['FN']
+                if not state.files_table.contains(fn) or any(fn.startswith(directory) for directory in deleted if directory.endswith('/')):
+                    continue  # went with a directory deleted before it
+                if txn.delete(fn):
+                    deleted.append(fn)
+                else:
+                    remove_partial_download(config.args.absolute_local_root_path + fn)
+                    state.files_table.remove(fn)
+            if len(deleted) > 0:
+                txn.merge()
+            else:
+                txn.abort()
+        except NotPUTting as e:
+            if txn is not None:
+                txn.abort()
+            print("Commit of " + str(len(deleted)) + " DELETEs didn't happen, and will be tried again: " + getattr(e, "message", type(e).__name__))
+            continue
+        except BaseException:
+            if txn is not None:
+                txn.abort()
+            raise
+        for fn in deleted:
+            if fn.endswith('/'):
+                directories_deleted += 1
+                state.files_table.remove_subtree(fn)
+            else:
+                files_deleted += 1
+                remove_partial_download(config.args.absolute_local_root_path + fn)
+                state.files_table.remove(fn)
+    return files_deleted, directories_deleted
+
+
 def DELETEs(config, state, requests_session):
 
     start = time.time()
 
-    rows = state.files_table.search(Query().I == DELETE_ON_SERVER)
+    rows = state.files_table.search_by_instruction(DELETE_ON_SERVER)
 
     files_deleted = directories_deleted = 0
+    if config.svn_commit_stubs and config.args.batch_commits:
+        (files_deleted, directories_deleted) = DELETEs_in_commits(config, state, requests_session, rows)
+        rows = []
     for row in rows:
         fn = row['FN']
+        if not state.files_table.contains(fn):
+            continue  # went with a directory deleted before it
         to_delete = config.args.svn_url + esc(fn).replace(os.sep, "/")
         requests_delete = requests_session.delete(to_delete)
         if requests_delete.status_code != 204:
             if requests_delete.status_code == 404:
-                state.files_table.remove(Query().FN == fn)
+                remove_partial_download(config.args.absolute_local_root_path + fn)
+                state.files_table.remove(fn)
                 continue
             if debug_mode:
                 print("del: " + str(requests_delete.status_code) + " " + to_delete)
@@ -1135,14 +2761,15 @@ def DELETEs(config, state, requests_session):
             exit(10)
         if fn.endswith('/'):
             directories_deleted += 1
-            state.files_table.remove(Query().FN == fn)
-            # TODO LIKE
+            state.files_table.remove_subtree(fn)
         else:
             files_deleted += 1
-            state.files_table.remove(Query().FN == fn)
+            remove_partial_download(config.args.absolute_local_root_path + fn)
+            state.files_table.remove(fn)
 
     speed = ", " + str(round((time.time() - start) / len(rows), 2)) + " secs per DELETE." if len(rows) > 0 else "."
 
+    state.files_table.commit()
     section_end(files_deleted > 0 or directories_deleted > 0,  "DELETEs on Subversion server took %s, "
           + str(directories_deleted) + " directories and " + str(files_deleted) + " files"
           + speed, start)
@@ -1160,15 +2787,14 @@ def svn_changesʔ(config, state, dir_list, excluded_filename_patterns, requests_
     try:
         for (directory, curr_local_rev) in dir_list:
             actioned = False
-            curr_rmt_rev = requests_session.svn_revision(config, directory)
+            curr_rmt_rev = state.svn_dir_revisions.revision_for_dir(requests_session, directory, config)
             if curr_local_rev != curr_rmt_rev:
                 update_row_revision(state.files_table, directory, curr_rmt_rev)
                 # parentGETʔ(state, directory)
 
                 children = svn_dir_list(config, requests_session, esc(directory))
                 unprocessed_files = {}
-                Row = Query()
-                rows = state.files_table.search((Row.I == None) & (Row.L <= directory.count(os.sep)) & (Row.FN.test(lambda s: s.startswith(directory))))
+                rows = state.files_table.search_possible_children(directory)
                 for row in rows:
                     fn = row['FN']
                     if fn == directory:
@@ -1192,7 +2818,7 @@ def svn_changesʔ(config, state, dir_list, excluded_filename_patterns, requests_
                         if match['I'] != None:
                             continue
                         if not match['RS'] == sha1:
-                            state.files_table.update({'I': GET_FROM_SERVER}, Query().FN == fn)
+                            state.files_table.update({'I': GET_FROM_SERVER}, fn)
                             actioned = True
                             if fn.endswith('/'):
                                 get_dir_count += 1
@@ -1210,7 +2836,7 @@ def svn_changesʔ(config, state, dir_list, excluded_filename_patterns, requests_
                 for fn, val in unprocessed_files.items():
                     actioned = True
                     local_deletes += 1
-                    state.files_table.update({'I': DELETE_LOCALLY}, Query().FN == fn)
+                    state.files_table.update({'I': DELETE_LOCALLY}, fn)
             if actioned:
                 directories.append(directory)
     finally:
@@ -1224,158 +2850,685 @@ def svn_changesʔ(config, state, dir_list, excluded_filename_patterns, requests_
 
         # if "GETs 1 local deletes (children of '') took" in msg:
         #     raise "ddsddasdasd"
+        state.files_table.commit()
         section_end(make_dir_count > 0 or get_file_count > 0 or get_dir_count > 0 or local_deletes > 0, msg, start)
 
 
-def PUT(config, state, requests_session, abs_local_file_path, alleged_remote_sha1, file_name):
-    dirs_made = 0
-    s1 = os.path.getsize(abs_local_file_path)
-    time.sleep(0.1)
-    s2 = os.path.getsize(abs_local_file_path)
-    if s1 != s2:
-        raise NotPUTtingAsFileStillBeingWrittenTo(abs_local_file_path)
+def changed_paths_in_log(config, requests_session, start_rev, end_rev):
+    # [(rev, action, file_name)] for each path under the synced directory changed in the revisions from
+    # start_rev to end_rev, oldest first, as a log-report (with discover-changed-paths) has them. The
+    # action is "added", "modified", "replaced" or "deleted". Directories end in a slash. Parsed as it's
+    # streamed. None if the server won't say, or doesn't say what kind of thing each path is (before 1.6).
+    report = requests_session.report(config.args.svn_url, start_rev, end_rev)
+    if report.status_code != 200:
+        report.close()
+        return None
+    prefix = "/" + config.svn_baseline_rel_path if config.svn_baseline_rel_path else ""
+    parser = xml.parsers.expat.ParserCreate(namespace_separator=" ")
+    changes = []
+    rev = [0]
+    text = []
+    path_attrs = []
+    kinds_missing = []
+
+    def start_element(name, attrs):
+        if name == "DAV: version-name" or name.endswith("-path") and name.startswith("svn: "):
+            text[:] = []
+            path_attrs[:] = [attrs]
+
+    def end_element(name):
+        if name == "DAV: version-name":
+            rev[0] = int("".join(text))
+        elif name.endswith("-path") and name.startswith("svn: "):
+            path = "".join(text)
+            kind = path_attrs[0].get("node-kind")
+            if kind is None:
+                kinds_missing.append(path)
+            elif path.startswith(prefix + "/"):
+                changes.append((rev[0], name[len("svn: "):-len("-path")], path[len(prefix):] + ("/" if kind == "dir" else "")))
+        path_attrs[:] = []
+
+    def character_data(data):
+        if path_attrs:
+            text.append(data)
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.CharacterDataHandler = character_data
+    with contextlib.closing(report):
+        for chunk in report.iter_content(chunk_size=65536):
+            parser.Parse(chunk, False)
+        parser.Parse(b"", True)
+    if len(kinds_missing) > 0:
+        return None
+    return changes
+
+
+def files_revised_after(state, rev):
+    # The names of the files PUT or GOT at a later revision than rev, from those revised since the last
+    # poll that looked for changes, rather than from every row (but for the first).
+    if state.files_revised is None:
+        rows = state.files_table.all()
+    else:
+        rows = [state.files_table.get(file_name) for file_name in state.files_revised if state.files_table.contains(file_name)]
+    return set(row['FN'] for row in rows if not row['FN'].endswith("/") and row['RV'] is not None and row['RV'] > rev)
+
+
+def changed_paths_in_update_report(config, state, requests_session, from_rev, to_rev):
+    # [(to_rev, action, file_name)] for each path under the synced directory that's different in to_rev
+    # from how it is here, from an update-report without send-all - what changed, not the changes. The
+    # action is "added", "modified" or "deleted". Files PUT (or GOT) since from_rev are reported at the
+    # revision they're at, as svn update does for a mixed-revision working copy, so that they're only in
+    # it if they changed after that. Parsed as it's streamed. None if the server won't say.
+    entries = [(file_name[1:], state.files_table.get(file_name)['RV']) for file_name in sorted(files_revised_after(state, from_rev))]
+    try:
+        report = update_report(config, requests_session, "/", None, from_rev, to_rev, False, entries)
+    except UnexpectedStatusCode:
+        return None
+    parser = xml.parsers.expat.ParserCreate(namespace_separator=" ")
+    changes = []
+    directories = []
+    open_file = []
+
+    def start_element(name, attrs):
+        if name == "svn: open-directory" or name == "svn: add-directory":
+            directory = directories[-1] + attrs["name"] + "/" if "name" in attrs else "/"
+            directories.append(directory)
+            if name == "svn: add-directory":
+                changes.append((to_rev, "added", directory))
+        elif name == "svn: add-file":
+            changes.append((to_rev, "added", directories[-1] + attrs["name"]))
+        elif name == "svn: open-file":
+            open_file[:] = [directories[-1] + attrs["name"]]
+        elif name == "svn: fetch-file" and open_file:
+            # Its text changed, not just its properties
+            changes.append((to_rev, "modified", open_file.pop()))
+        elif name == "svn: delete-entry":
+            path = directories[-1] + attrs["name"]
+            changes.append((to_rev, "deleted", path + "/" if state.files_table.contains(path + "/") else path))
+
+    def end_element(name):
+        if name == "svn: open-directory" or name == "svn: add-directory":
+            directories.pop()
+        elif name == "svn: open-file":
+            open_file[:] = []
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    with contextlib.closing(report):
+        for chunk in report.iter_content(chunk_size=65536):
+            parser.Parse(chunk, False)
+        parser.Parse(b"", True)
+    return changes
+
+
+def svn_changes_sinceʔ(config, state, from_rev, to_rev, excluded_filename_patterns, requests_session):
+    # With --change-detection log-report or update-report: instructions for just the paths changed since
+    # from_rev, from one report, rather than walking down the directories whose revision changed. Those
+    # that changed no later than the row's revision are this client's own PUTs. Added directories are
+    # walked (by GETs) as they would be anyway, as one copied from elsewhere doesn't have its children
+    # listed in the log. Returns False if the server wouldn't say, for the directories to be walked instead.
+
+    get_file_count = get_dir_count = local_deletes = 0
+    start = time.time()
+    if config.args.change_detection == "log-report":
+        changes = changed_paths_in_log(config, requests_session, from_rev + 1, to_rev)
+        source = "the log of revisions " + str(from_rev + 1) + " to " + str(to_rev)
+    else:
+        changes = changed_paths_in_update_report(config, state, requests_session, from_rev, to_rev)
+        source = "an update-report from revision " + str(from_rev) + " to " + str(to_rev)
+    if changes is None:
+        return False
+
+    try:
+        for (rev, action, fn) in changes:
+            if excluded_filename_patterns.should_be_excluded(fn.rstrip("/")):
+                continue
+            row = state.files_table.get(fn)
+            if row is not None and row['RV'] >= rev:
+                continue
+            if action == "deleted":
+                # What's in a directory before the directory, deepest first, as they're deleted in that order
+                for file_name in (list(reversed(state.files_table.descendants_of(fn))) if fn.endswith("/") else []) + [fn]:
+                    row = state.files_table.get(file_name)
+                    if row is not None and (row['I'] is None or row['I'] == GET_FROM_SERVER):
+                        state.files_table.update({'I': DELETE_LOCALLY}, file_name)
+                        local_deletes += 1
+                continue
+            if row is not None and row['I'] is not None and row['I'] != DELETE_LOCALLY:
+                continue
+            if fn.endswith('/') and (action == "modified" or action == "added" and row is not None and row['I'] is None):
+                continue  # only its properties changed, or it was made here
+            upsert_row_in_table(state.files_table, fn, instruction=GET_FROM_SERVER)
+            if fn.endswith('/'):
+                get_dir_count += 1
+            else:
+                get_file_count += 1
+    finally:
+
+        files_str = " " + str(get_file_count) + " file" if get_file_count > 0 else ""
+        dirs_str = " " + str(get_dir_count) + " dir" if get_dir_count > 0 else ""
+        deletes_str = " " + str(local_deletes) + " local deletes" if local_deletes > 0 else ""
+        instr = " Instructions created:" + files_str + dirs_str + " GETs" + deletes_str if len(files_str) + len(dirs_str) + len(deletes_str) > 0 else ""
+        msg = (instr + " (from " + source + ") took %s." + stack_trace()).lstrip()
+
+        state.files_table.commit()
+        section_end(get_file_count > 0 or get_dir_count > 0 or local_deletes > 0, msg, start)
+    return True
+
+
+class SvnTransaction():
+
+    # A commit of any number of changes, made the way the svn client makes one (HTTPv2, Subversion 1.7
+    # and later): a POST for a new transaction, MKCOLs, PUTs and DELETEs into that, then a MERGE that
+    # makes it a revision. Or abort() to throw it away.
+
+    def __init__(self, config, requests_session):
+        self.config = config
+        self.requests_session = requests_session
+        (self.me_resource, self.txn_stub, self.txn_root_stub) = config.svn_commit_stubs
+        parsed_url = urlparse(config.args.svn_url)
+        self.server_url = parsed_url.scheme + "://" + parsed_url.netloc
+        post = requests_session.post(self.server_url + self.me_resource, data="( create-txn )", headers={"Content-Type": "application/vnd.svn-skel"})
+        if post.status_code != 201:
+            raise NotPUTtingAsTheServerObjected(post.status_code, post.text)
+        self.txn_name = post.headers["SVN-Txn-Name"]
+
+
+    def url_for(self, file_name):
+        repo_path = ("/" + self.config.svn_baseline_rel_path if self.config.svn_baseline_rel_path else "") + file_name
+        return self.server_url + self.txn_root_stub + "/" + self.txn_name + esc(repo_path).replace(os.sep, "/")
+
+
+    def mkcol(self, directory):
+        # False if it's there already
+        mkcol = self.requests_session.mkcol(self.url_for(directory))
+        if mkcol.status_code == 405:
+            return False
+        if mkcol.status_code != 201:
+            raise NotPUTtingAsTheServerObjected(mkcol.status_code, mkcol.text)
+        return True
+
+
+    def put(self, file_name, reader, base_rev=None, base_file=None):
+        # The whole file, or an svndiff against the base copy if there is one. X-SVN-Version-Name is
+        # the revision of the file the change is to, so the server says 409 if that's out of date.
+        headers = {}
+        data = reader
+        if base_rev:
+            headers["X-SVN-Version-Name"] = str(base_rev)
+        if base_file is not None:
+            headers["Content-Type"] = "application/vnd.svn-svndiff"
+            data = svndiff0(base_file, reader)
+        put = self.requests_session.put(self.url_for(file_name), data=data, headers=headers)
+        if put.status_code == 409:
+            raise NotPUTtingAsItWasChangedOnTheServerByAnotherUser()
+        if put.status_code != 201 and put.status_code != 204:
+            raise NotPUTtingAsTheServerObjected(put.status_code, put.text)
+
+
+    def delete(self, file_name):
+        # False if it wasn't there anyway
+        delete = self.requests_session.delete(self.url_for(file_name))
+        if delete.status_code == 404:
+            return False
+        if delete.status_code != 204:
+            raise NotPUTtingAsTheServerObjected(delete.status_code, delete.text)
+        return True
+
+
+    def merge(self):
+        # The revision made. Without the list of everything changed in it, which could be long.
+        merge = self.requests_session.merge(self.config.args.svn_url,
+                                            data='<?xml version="1.0" encoding="utf-8"?><D:merge xmlns:D="DAV:">'
+                                                 '<D:source><D:href>' + self.txn_stub + "/" + self.txn_name + '</D:href></D:source>'
+                                                 '<D:no-auto-merge/><D:no-checkout/><D:prop><D:version-name/></D:prop></D:merge>',
+                                            headers={"X-SVN-Options": "no-merge-response"})
+        if merge.status_code == 409:
+            raise NotPUTtingAsItWasChangedOnTheServerByAnotherUser()
+        if merge.status_code != 200:
+            raise NotPUTtingAsTheServerObjected(merge.status_code, merge.text)
+        try:
+            revs = [int(element[DAV_VERSION_NAME]) for element in streamed_xml_elements(merge, DAV_RESPONSE, {DAV_VERSION_NAME})
+                    if element.get(DAV_VERSION_NAME, "").isdigit()]
+        except xml.parsers.expat.ExpatError as e:
+            raise NotPUTtingAsTheServerObjected(merge.status_code, "MERGE response that isn't XML: " + str(e))
+        if len(revs) == 0:
+            raise NotPUTtingAsTheServerObjected(merge.status_code, "no version-name in the MERGE response")
+        return max(revs)
+
+
+    def abort(self):
+        self.requests_session.delete(self.server_url + self.txn_stub + "/" + self.txn_name)
+
+
+def PUT(config, requests_session, abs_local_file_path, alleged_remote_sha1, file_name, base_rev=None, txn=None):
+    # Into txn if given, in which case the caller has checked that it's not being written to, and the
+    # server checks it's not out of date (as of base_rev).
+    if txn is None:
+        s1 = os.path.getsize(abs_local_file_path)
+        time.sleep(0.1)
+        s2 = os.path.getsize(abs_local_file_path)
+        if s1 != s2:
+            raise NotPUTtingAsFileStillBeingWrittenTo(abs_local_file_path)
     # file_name = get_file_name(config, abs_local_file_path)
     if file_name.endswith("/"):
         file_name = file_name[:-1]
-    dirs_made += make_directories_if_missing_in_db(config, state, dirname(file_name) + "/",
-                                                   requests_session, MakeDirOnSvnAndGetRevision())
 
-    if alleged_remote_sha1:
+    if alleged_remote_sha1 and txn is None:
         (ver, actual_remote_sha1, not_used_here) = svn_details(config, requests_session, file_name)
         if actual_remote_sha1 and actual_remote_sha1 != alleged_remote_sha1:
             raise NotPUTtingAsItWasChangedOnTheServerByAnotherUser() # force into clash scenario later
 
     # TODO has it changed on server
-    with open(abs_local_file_path, "rb") as f:
-        put = requests_session.put(config.args.svn_url + esc(file_name).replace(os.sep, "/"), data=f.read())
-        output = put.text
-        if put.status_code != 201 and put.status_code != 204:
-            raise NotPUTtingAsTheServerObjected(put.status_code, output)
-    return dirs_made
+    # Streamed from the open file a block at a time (with a Content-Length from its size), so the
+    # memory used doesn't grow with the size of the file. Returns the sha1 and stat signature of
+    # what was sent, and the copy of it (see below).
+    #
+    # With --delta-uploads, a copy is written as the file is read, to be the base of the next delta,
+    # and a delta is sent instead of the whole file if there's a copy of what the server has now. The
+    # copy isn't kept (nor the base let go of) until the upload is known to have made a revision, on
+    # the main thread: see update_row_after_PUT().
+    pristines = config.pristines
+    copy = pristines.new_copy() if pristines else None
+    base_file = None
+    if pristines and config.args.delta_uploads and config.svn_commit_stubs and base_rev:
+        base_file = pristines.open_base(alleged_remote_sha1)
+    try:
+        with open(abs_local_file_path, "rb") as f:
+            reader = HashingFileReader(f, abs_local_file_path, copy)
+            if txn is not None:
+                txn.put(file_name, reader, base_rev if alleged_remote_sha1 else None, base_file)
+            elif base_file is not None:
+                # A commit of its own, of the difference from the base copy alone
+                txn = SvnTransaction(config, requests_session)
+                try:
+                    txn.put(file_name, reader, base_rev, base_file)
+                    txn.merge()
+                except BaseException:
+                    txn.abort()
+                    raise
+            else:
+                put = requests_session.put(config.args.svn_url + esc(file_name).replace(os.sep, "/"), data=reader)
+                output = put.text
+                if put.status_code != 201 and put.status_code != 204:
+                    raise NotPUTtingAsTheServerObjected(put.status_code, output)
+            # Changed after the last block was read
+            reader.read(0)
+    except BaseException:
+        if copy:
+            pristines.discard(copy)
+        raise
+    finally:
+        if base_file is not None:
+            base_file.close()
+    return reader.hexdigest(), stat_signature(reader.osstat), copy
 
 
-def PUTs(config, state, requests_session):
+def update_row_after_PUT(config, files_table, file_name, fields, copy):
+    # On the main thread, once the PUT has made a revision. The copy of what was PUT (with
+    # --delta-uploads) is the base for the next delta, rather than the copy of the version before.
+    if copy:
+        config.pristines.replace(copy, fields['RS'], files_table.get(file_name)['RS'])
+    files_table.update(fields, file_name)
 
-    possible_clash_encountered = False
-    more_to_do = True
-    batch = 0
 
-    # Batches of 100 so that here's intermediate reporting.
-    while more_to_do:
-        batch += 1
-        more_to_do = False
-        start = time.time()
-        num_rows = put_count = dirs_made = not_actually_changed = 0
+def PUT_file(config, requests_session, row):
+    # Run by the PUT workers, so it doesn't touch the files table. Returns the fields to update the
+    # row with once the PUT is done, or None if the file didn't need PUTting after all (or the fields
+    # without an 'RS', if its row needs updating still). And the copy of what was PUT, if there is
+    # one, for update_row_after_PUT().
+    file_name = row['FN']
+    abs_local_file_path = (config.args.absolute_local_root_path + file_name)
+    try:
+        osstat = os.stat(abs_local_file_path)
+    except FileNotFoundError:
+        return None, None
+    fields = fields_if_not_changed(row, abs_local_file_path, osstat)
+    if fields is not None:
+        return fields or None, None
+    try:
+        (new_local_sha1, signature, copy) = PUT(config, requests_session, abs_local_file_path, row['RS'], file_name, row['RV'])  # <h1>Created</h1>
+    except FileNotFoundError:
+        return None, None
+    try:
+        return sha_and_revision_fields_after_PUT(config, requests_session, file_name, new_local_sha1, signature), copy
+    except BaseException:
+        if copy:
+            config.pristines.discard(copy)
+        raise
+
+
+def fields_if_not_changed(row, abs_local_file_path, osstat):
+    # For a file that doesn't need PUTting after all, the fields to update its row with ({} for none),
+    # or None if it does. Files that come down as new/changed, get written to the FS trigger a file
+    # added/changed message, and superficially look like they should get pushed back to the server. If
+    # the stat signature is unchanged since, don't do it. That's told without reading the file. If only
+    # the device, inode or timestamps are different (it was touched, say), it's hashed, which is
+    # cheaper than PUTting it again as a new revision. Otherwise the PUT reads it the once.
+    if row['RS'] is None or row['RS'] != row['LS']:
+        return None
+    if same_stat(row['ST'], osstat):
+        return {}
+    if same_size(row['ST'], osstat) and calculate_sha1_from_local_file(abs_local_file_path) == row['LS']:
+        return {'ST': stat_signature(osstat), 'I': None}
+    return None
+
+
+def PUT_files_in_one_commit(config, requests_session, rows):
+    # Run by the PUT workers, with --batch-commits. The files are PUT into one transaction, so that
+    # they're one revision. Returns the fields and copy for each row (as PUT_file() does), or the
+    # NotPUTting raised for it. A file that changes while it's PUT spoils the transaction, so it's
+    # started again without that file.
+    results = {}
+    sizes = {}
+    for row in rows:
         try:
-            rows = state.files_table.search(Query().I == PUT_ON_SERVER)
-            num_rows = len(rows)
-            for row in rows:
+            osstat = os.stat(config.args.absolute_local_root_path + row['FN'])
+        except FileNotFoundError:
+            results[row['FN']] = (None, None)
+            continue
+        fields = fields_if_not_changed(row, config.args.absolute_local_root_path + row['FN'], osstat)
+        if fields is None:
+            sizes[row['FN']] = osstat.st_size
+        else:
+            results[row['FN']] = (fields or None, None)
+    # Still being written to? Checked for all the files at once, rather than one after the other
+    time.sleep(0.1)
+    for file_name in list(sizes):
+        try:
+            if os.path.getsize(config.args.absolute_local_root_path + file_name) != sizes[file_name]:
+                results[file_name] = NotPUTtingAsFileStillBeingWrittenTo(config.args.absolute_local_root_path + file_name)
+        except FileNotFoundError:
+            results[file_name] = (None, None)
+
+    def discard_copies():
+        # Of what was PUT into a transaction that didn't become a revision
+        for (sha1, signature, copy) in put.values():
+            if copy:
+                config.pristines.discard(copy)
+
+    while True:
+        to_put = [row for row in rows if row['FN'] not in results]
+        if len(to_put) == 0:
+            return results
+        put = {}
+        txn = SvnTransaction(config, requests_session)
+        try:
+            for row in to_put:
                 file_name = row['FN']
                 try:
-                    abs_local_file_path = (config.args.absolute_local_root_path + file_name)
-                    new_local_sha1 = calculate_sha1_from_local_file(abs_local_file_path)
-                    if new_local_sha1 == 'FILE_MISSING' or (row['RS'] == row['LS'] and row['LS'] == new_local_sha1):
-                        pass
-                        # files that come down as new/changed, get written to the FS trigger a file added/changed message,
-                        # and superficially look like they should get pushed back to the server. If the sha1 is unchanged
-                        # don't do it.
-
-                        num_rows = num_rows -1
-                        state.files_table.update({'I': None}, Query().FN == file_name)
-                    else:
-                        dirs_made += PUT(config, state, requests_session, abs_local_file_path, row['RS'], file_name)  # <h1>Created</h1>
-
-                        osstat = os.stat(abs_local_file_path)
-                        size_ts = osstat.st_size + osstat.st_mtime
-                        update_sha_and_revision_for_row(config, state, requests_session, file_name, new_local_sha1, size_ts)
-                        put_count += 1
-                        state.files_table.update({'I': None}, Query().FN == file_name)
-                except NotPUTtingAsItWasChangedOnTheServerByAnotherUser:
-                    # Let another cycle get back to the and the GET to win.
-                    not_actually_changed += 1
-                    possible_clash_encountered = True
-                    state.files_table.update({'I': None}, Query().FN == file_name)
-                except NotPUTtingAsFileStillBeingWrittenTo as e:
-                    not_actually_changed += 1
-                    state.files_table.update({'I': None}, Query().FN == file_name)
+                    put[file_name] = PUT(config, requests_session, config.args.absolute_local_root_path + file_name,
+                                         row['RS'], file_name, row['RV'], txn)
+                except NotPUTtingAsItWasChangedOnTheServerByAnotherUser as e:
+                    results[file_name] = e
                 except NotPUTtingAsTheServerObjected as e:
-                    not_actually_changed += 1
-                    if "txn-current-lock': Permission denied" in e.message:
-                        print("User lacks write permissions for " + file_name + ", and that may be (I am not sure) the same for the whole repo")
-                    else:
-                        print(("Unexpected on_created output for " + file_name + " = [" + e.message + "]"))
-                if put_count == 100:
-                    more_to_do = True
-                    batch += 1
+                    # To this file alone (a path the user can't write to, say), so the others still go
+                    results[file_name] = e
+                except FileNotFoundError:
+                    results[file_name] = (None, None)
+                except NotPUTtingAsFileStillBeingWrittenTo as e:
+                    results[file_name] = e
                     break
-        finally:
+            else:
+                rev = txn.merge() if len(put) > 0 else None
+                if rev is None:
+                    txn.abort()
+                for file_name, (sha1, signature, copy) in put.items():
+                    results[file_name] = ({'RV': rev, 'RS': sha1, 'LS': sha1, 'ST': signature, 'I': None}, copy)
+                return results
+        except NotPUTtingAsItWasChangedOnTheServerByAnotherUser:
+            # By another commit since the PUTs (any clash of a file is found when it's PUT). Tried again next time.
+            txn.abort()
+            discard_copies()
+            raise NotPUTtingAsTheServerObjected(409, "commit of " + str(len(put)) + " files was out of date")
+        except BaseException:
+            txn.abort()
+            discard_copies()
+            raise
+        txn.abort()
+        discard_copies()
+
+
+def commit_groups(config, rows):
+    # With --batch-commits, the rows in groups of --commit-batch-files, or --commit-batch-mb if less
+    groups = [[]]
+    group_bytes = 0
+    for row in rows:
+        try:
+            size = os.path.getsize(config.args.absolute_local_root_path + row['FN'])
+        except OSError:
+            size = 0
+        if len(groups[-1]) > 0 and (len(groups[-1]) >= config.args.commit_batch_files
+                                    or group_bytes + size > config.args.commit_batch_mb * 1048576):
+            groups.append([])
+            group_bytes = 0
+        groups[-1].append(row)
+        group_bytes += size
+    return groups
 
-            not_actually_changed_blurb = ""
-            if not_actually_changed > 0:
-                not_actually_changed_blurb = "(" + str(not_actually_changed) + " not actually changed; from " + str(num_rows) + " total), "
 
-            if put_count > 0:
-                speed = "taking " + english_duration(round((time.time() - start)/put_count, 2)) + " each"
-            else:
-                speed = ""
+def result_for(group_future, file_name):
+    # The fields and copy for one of the files of a PUT_files_in_one_commit(), or the NotPUTting for it raised
+    result = group_future.result()[file_name]
+    if isinstance(result, NotPUTting):
+        raise result
+    return result
 
-            dirs_made_blurb = ""
-            if dirs_made > 0:
-                dirs_made_blurb = "(including " + str(dirs_made) + " MKCOLs to facilitate those PUTs)"
 
-            section_end(num_rows > 0 or put_count > 0,  "Batch " + str(batch) + " of"
-                 + ": PUT(s) to Svn took %s, " + str(put_count)
-                 + " PUT files, " + not_actually_changed_blurb
-                 + speed + dirs_made_blurb + "." + stack_trace(), start)
+def PUTs(config, state, requests_session):
+
+    possible_clash_encountered = False
+    rows = state.files_table.search_by_instruction(PUT_ON_SERVER)
+    batch = 0
+    batch_commits = config.svn_commit_stubs and config.args.batch_commits
+    # With --batch-commits, a batch is as many files as the PUT workers can commit together
+    batch_size = config.args.commit_batch_files * config.args.put_workers if batch_commits else 100
+
+    # The uploads themselves are made by a pool of PUT workers. The files table is only ever changed
+    # here, on the main thread, and the MKCOLs for the directories of a batch are made before any of
+    # its files are handed to the workers.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=config.args.put_workers) as put_workers:
+
+        # Batches of 100 so that here's intermediate reporting.
+        while batch * batch_size < len(rows):
+            batch_rows = rows[batch * batch_size:(batch + 1) * batch_size]
+            batch += 1
+            start = time.time()
+            num_rows = put_count = dirs_made = not_actually_changed = 0
+            try:
+                num_rows = len(batch_rows)
+                made = make_directories_on_svn_if_missing(config, state, requests_session,
+                                                          [row['FN'] for row in batch_rows if os.path.exists(config.args.absolute_local_root_path + row['FN'])],
+                                                          put_workers)
+                if made is None:
+                    # Left queued, for the next poll
+                    num_rows = 0
+                    continue
+                dirs_made += made
+
+                # Rows are updated in the order they were queued, whichever worker finished first. With
+                # --batch-commits, each worker PUTs a group of files, committed together. Files that were
+                # PUT fine have their rows updated even if others failed, so they're not PUT again (or
+                # seen as changed) next time around.
+                if batch_commits:
+                    futures = []
+                    for group in commit_groups(config, batch_rows):
+                        group_future = put_workers.submit(PUT_files_in_one_commit, config, requests_session, group)
+                        futures += [(row['FN'], functools.partial(result_for, group_future, row['FN'])) for row in group]
+                else:
+                    futures = [(row['FN'], put_workers.submit(PUT_file, config, requests_session, row).result) for row in batch_rows]
+                failure = None
+                for file_name, result in futures:
+                    try:
+                        (fields, copy) = result()
+                        if fields is None:
+                            num_rows = num_rows -1
+                            state.files_table.update({'I': None}, file_name)
+                        elif 'RS' not in fields:
+                            # Not changed, but its stat signature was
+                            num_rows = num_rows -1
+                            state.files_table.update(fields, file_name)
+                        else:
+                            update_row_after_PUT(config, state.files_table, file_name, fields, copy)
+                            state.revised(file_name)
+                            put_count += 1
+                    except NotPUTtingAsItWasChangedOnTheServerByAnotherUser:
+                        # Let another cycle get back to the and the GET to win.
+                        not_actually_changed += 1
+                        possible_clash_encountered = True
+                        state.files_table.update({'I': None}, file_name)
+                    except NotPUTtingAsFileStillBeingWrittenTo as e:
+                        not_actually_changed += 1
+                        state.files_table.update({'I': None}, file_name)
+                    except NotPUTtingAsTheServerObjected as e:
+                        not_actually_changed += 1
+                        if "txn-current-lock': Permission denied" in e.message:
+                            print("User lacks write permissions for " + file_name + ", and that may be (I am not sure) the same for the whole repo")
+                        else:
+                            print(("Unexpected on_created output for " + file_name + " = [" + e.message + "]"))
+                    except BaseException as e:
+                        failure = failure or e
+                if failure:
+                    raise failure
+            finally:
+
+                not_actually_changed_blurb = ""
+                if not_actually_changed > 0:
+                    not_actually_changed_blurb = "(" + str(not_actually_changed) + " not actually changed; from " + str(num_rows) + " total), "
+
+                if put_count > 0:
+                    speed = "taking " + english_duration(round((time.time() - start)/put_count, 2)) + " each"
+                    if config.args.put_workers > 1:
+                        speed += " with " + str(config.args.put_workers) + " workers, at " + str(round(put_count / (time.time() - start), 1)) + " files/sec"
+                else:
+                    speed = ""
+
+                dirs_made_blurb = ""
+                if dirs_made > 0:
+                    dirs_made_blurb = "(including " + str(dirs_made) + " MKCOLs to facilitate those PUTs)"
+
+                state.files_table.commit()
+                section_end(num_rows > 0 or put_count > 0,  "Batch " + str(batch) + " of"
+                     + ": PUT(s) to Svn took %s, " + str(put_count)
+                     + " PUT files, " + not_actually_changed_blurb
+                     + speed + dirs_made_blurb + "." + stack_trace(), start)
 
     return possible_clash_encountered
 
 
-def GET_file(config, state, abs_local_file_path, old_sha1_should_be, file_name, requests_session):
+def GET_file(config, state, row, requests_session):
+    # Run by the GET workers, so it doesn't touch the files table. Returns the sha1, stat signature
+    # and revision to update the row with.
+    #
+    # Downloaded into a partial file next to the real one, with the revision and sha1 it's for kept
+    # alongside. A download that was cut short (connection lost, Subsyncit stopped) carries on from
+    # where it got to, with a Range request of the URL for that revision, if that's still what the
+    # server has. Only once the whole file is there and its sha1 checks out is it moved into place.
+    file_name = row['FN']
+    abs_local_file_path = config.args.absolute_local_root_path + file_name
+    old_sha1_should_be = row['LS']
     (rev, sha1, svn_baseline_rel_path_not_used) = svn_details(config, requests_session, file_name)
     state.ignore_fs_events_for_this_for_2_secs(file_name)
-    get = requests_session.get(config.args.svn_url + esc(file_name).replace(os.sep, "/"), stream=True)
-    # See https://github.com/requests/requests/issues/2155 - Streaming gzipped responses
-    # and https://stackoverflow.com/questions/16694907/how-to-download-large-file-in-python-with-requests-py
+
+    partial_path = partial_download_path(abs_local_file_path)
+    partial_info_path = partial_path + ".json"
+    partial_info = {"rev": rev, "sha1": sha1}
+    offset = 0
+    if rev > 0 and os.path.exists(partial_path) and os.path.exists(partial_info_path):
+        with open(partial_info_path, "r") as text_file:
+            if json.loads(text_file.read()) == partial_info:
+                offset = os.path.getsize(partial_path)
+    if offset == 0:
+        with open(partial_info_path, "w") as text_file:
+            text_file.write(json.dumps(partial_info))
+
+    # Hashed as it is written, a buffer at a time, rather than read back afterwards.
+    hasher = hashlib.sha1()
+    got_as_delta = False
+    if offset == 0 and sha1 is not None and config.pristines and config.args.delta_downloads and row['RV'] > 0:
+        # With --delta-downloads, just what changed since the copy of how it was last synced, if
+        # there's still a copy. Written to the partial file too, so a cut short one carries on as a GET.
+        base_file = config.pristines.open_base(row['RS'])
+        if base_file is not None:
+            with base_file, open(partial_path, 'wb') as f:
+                def write(buf):
+                    hasher.update(buf)
+                    f.write(buf)
+                got_as_delta = GET_delta(config, requests_session, file_name, row['RV'], rev, base_file, write)
+            if got_as_delta and hasher.hexdigest() != sha1:
+                print("Delta for " + file_name + " did not make a file with the server's sha1, so GETting it whole")
+                got_as_delta = False
+            if not got_as_delta:
+                hasher = hashlib.sha1()
+
+    if not got_as_delta:
+        if rev > 0:
+            url = svn_url_at_revision(config, rev, esc(file_name).replace(os.sep, "/"))
+        else:
+            url = config.args.svn_url + esc(file_name).replace(os.sep, "/")
+        get = requests_session.get(url, stream=True, headers={"Range": "bytes=" + str(offset) + "-"} if offset > 0 else None)
+        if offset > 0 and get.status_code != 206:
+            # Range not honoured, so from the start
+            get.close()
+            offset = 0
+            get = requests_session.get(url, stream=True)
+
+        # What's there from before is read (rather than downloaded) again, to hash it.
+        with open(partial_path, 'r+b' if offset > 0 else 'wb') as f:
+            if offset > 0:
+                buf = f.read(config.args.download_buffer_kb * 1024)
+                while len(buf) > 0:
+                    hasher.update(buf)
+                    buf = f.read(config.args.download_buffer_kb * 1024)
+            # See https://github.com/requests/requests/issues/2155 - Streaming gzipped responses
+            # and https://stackoverflow.com/questions/16694907/how-to-download-large-file-in-python-with-requests-py
+            for chunk in get.iter_content(chunk_size=config.args.download_buffer_kb * 1024):
+                if chunk:
+                    hasher.update(chunk)
+                    f.write(chunk)
+    downloaded_sha1 = hasher.hexdigest()
+    if sha1 is not None and downloaded_sha1 != sha1:
+        # Changed on the server since the PROPFIND, or cut short. Not kept, so the next GET starts over.
+        os.remove(partial_path)
+        os.remove(partial_info_path)
+        raise GETNotMatchingServerSha1(file_name, sha1, downloaded_sha1)
+    sha1 = downloaded_sha1
+
     if os.path.exists(abs_local_file_path):
-        local_sha1 = calculate_sha1_from_local_file(abs_local_file_path)
+        local_sha1 = local_sha1_of(row, abs_local_file_path)
         if local_sha1 != old_sha1_should_be:
             if debug:
-                print("Clash happening for " + abs_local_file_path + ", local_sha1=" + local_sha1 + ", old_sha1_should_be=" + old_sha1_should_be)
+                print("Clash happening for " + abs_local_file_path + ", local_sha1=" + local_sha1 + ", old_sha1_should_be=" + str(old_sha1_should_be))
             clash_file_name = abs_local_file_path + ".clash_" + datetime.datetime.today().strftime('%Y-%m-%d-%H-%M-%S')
             os.rename(abs_local_file_path, clash_file_name)
-    with open(abs_local_file_path, 'wb') as f:
-        for chunk in get.iter_content(chunk_size=500000000):
-            if chunk:
-                f.write(chunk)
-    sha1 = calculate_sha1_from_local_file(abs_local_file_path)
+    if config.pristines:
+        # The base for a delta, if it's changed here next
+        config.pristines.add_copy_of(partial_path, sha1)
+        if row['RS'] != sha1:
+            config.pristines.remove(row['RS'])
+    state.ignore_fs_events_for_this_for_2_secs(file_name)
+    os.replace(partial_path, abs_local_file_path)
+    os.remove(partial_info_path)
     try:
-        osstat = os.stat(abs_local_file_path)
-        size_ts = osstat.st_size + osstat.st_mtime
+        signature = stat_signature(os.stat(abs_local_file_path))
     except FileNotFoundError:
-        size_ts = 0 # test_a_deleted_file_syncs_back stimulates this
-    update_row_shas_size_and_timestamp(state.files_table, file_name, sha1, size_ts)
-    update_row_revision(state.files_table, file_name, rev)
+        signature = 0 # test_a_deleted_file_syncs_back stimulates this
+    return (sha1, signature, rev)
 
 
-def GET(config, state, row, get_children, gets_list, requests_session):
+def GET_dir(config, state, row, get_children, requests_session):
 
-    file_count = 0
     dir_count = 0
     file_name = row['FN']
     abs_local_file_path = config.args.absolute_local_root_path + file_name
-    if not file_name.endswith('/'):
-        GET_file(config, state, abs_local_file_path, row['LS'], file_name, requests_session)
-        file_count += 1
-        gets_list.append(file_name)
-    else:
-        state.ignore_fs_events_for_this_for_2_secs(file_name)
-        if not os.path.exists(abs_local_file_path):
-            os.makedirs(abs_local_file_path)
-            dir_count = make_directories_if_missing_in_db(config, state, file_name, requests_session, GetDirRevisionsFromSvn())
-        get_children.append((file_name, row['RV']))
-    state.files_table.update({'I': None}, Query().FN == file_name)
-    return (file_count, dir_count)
+    state.ignore_fs_events_for_this_for_2_secs(file_name)
+    if not os.path.exists(abs_local_file_path):
+        os.makedirs(abs_local_file_path)
+        dir_count = make_directories_if_missing_in_db(config, state, file_name, requests_session, state.svn_dir_revisions)
+    get_children.append((file_name, row['RV']))
+    state.files_table.update({'I': None}, file_name)
+    return dir_count
 
 
 def GETs(config, state, requests_session):
@@ -1386,31 +3539,61 @@ def GETs(config, state, requests_session):
     get_children = []
     gets_list = []
 
-    # Batches of 100 so that here's intermediate reporting.
-    while more_to_do:
-        batch += 1
-        more_to_do = False
-        start = time.time()
-        num_rows = dir_count = file_count = 0
-        try:
-            rows = state.files_table.search(Query().I == GET_FROM_SERVER)
-            num_rows = len(rows)
-            for row in rows:
-                if debug_mode:
-                    print ("more to do, row " + row['FN'] + "(get)")
-                (fc, dc) = GET(config, state, row, get_children, gets_list, requests_session)
-                file_count += fc
-                dir_count += dc
+    # Directories are made here on the main thread, in the order they were queued, and before any
+    # files are handed to the pool of GET workers to download. The files table is only changed here.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=config.args.get_workers) as get_workers:
 
-        finally:
+        # Batches of 100 so that here's intermediate reporting.
+        while more_to_do:
+            batch += 1
+            more_to_do = False
+            start = time.time()
+            num_rows = dir_count = file_count = 0
+            try:
+                rows = state.files_table.search_by_instruction(GET_FROM_SERVER)
+                num_rows = len(rows)
+                for row in rows:
+                    if row['FN'].endswith('/'):
+                        if debug_mode:
+                            print ("more to do, row " + row['FN'] + "(get)")
+                        dir_count += GET_dir(config, state, row, get_children, requests_session)
 
-            files_str = str(file_count) + " files (" + ", ".join(gets_list) + ")" if file_count > 0 else ""
-            dirs_str = str(dir_count) + " dirs" if (dir_count) > 0 else ""
-            if len(files_str) > 0 and len(dirs_str) > 0:
-                files_str += ", "
-            section_end(file_count > 0 or dir_count > 0,  "Batch " + str(batch) + " of"
-                     + ": GET(s) from Svn took %s: " + files_str + dirs_str
-                     + ", at " + str(round(file_count / (time.time() - start) , 2)) + " files/sec." + stack_trace(), start)
+                futures = []
+                for row in rows:
+                    if not row['FN'].endswith('/'):
+                        if debug_mode:
+                            print ("more to do, row " + row['FN'] + "(get)")
+                        futures.append((row['FN'], get_workers.submit(GET_file, config, state, row, requests_session)))
+
+                # Files that downloaded fine have their rows updated, even if others failed, so that
+                # they're not seen as clashes next time around.
+                failure = None
+                for file_name, future in futures:
+                    try:
+                        (sha1, signature, rev) = future.result()
+                        update_row_after_GET(state.files_table, file_name, sha1, signature, rev)
+                        state.revised(file_name)
+                        file_count += 1
+                        gets_list.append(file_name)
+                    except GETNotMatchingServerSha1 as e:
+                        # The instruction is left in place, for another GET next time around
+                        print("Download didn't match the sha1 on the server, " + e.message)
+                    except Exception as e:
+                        failure = failure or e
+                if failure:
+                    raise failure
+
+            finally:
+
+                files_str = str(file_count) + " files (" + ", ".join(gets_list) + ")" if file_count > 0 else ""
+                dirs_str = str(dir_count) + " dirs" if (dir_count) > 0 else ""
+                if len(files_str) > 0 and len(dirs_str) > 0:
+                    files_str += ", "
+                workers_str = " with " + str(config.args.get_workers) + " workers" if config.args.get_workers > 1 and file_count > 0 else ""
+                state.files_table.commit()
+                section_end(file_count > 0 or dir_count > 0,  "Batch " + str(batch) + " of"
+                         + ": GET(s) from Svn took %s: " + files_str + dirs_str
+                         + ", at " + str(round(file_count / (time.time() - start) , 2)) + " files/sec" + workers_str + "." + stack_trace(), start)
 
     return get_children
 
@@ -1420,12 +3603,17 @@ def loop(config, state, excluded_filename_patterns, local_adds_chgs_deletes_queu
     (root_revision_on_remote_svn_repo, sha1, svn_baseline_rel_path) = svn_details(config, requests_session, "/")  # root
 
     config.svn_baseline_rel_path = svn_baseline_rel_path
+    state.svn_dir_revisions = SvnDirRevisions(config, requests_session)
     if root_revision_on_remote_svn_repo > 0:
 
         try:
             state.online = True
             if not config.svn_repo_parent_path:
                 config.svn_repo_parent_path = get_svn_repo_parent_path(config, requests_session)
+            if (config.args.delta_uploads or config.args.batch_commits) and config.svn_commit_stubs is None:
+                config.svn_commit_stubs = get_svn_commit_stubs(config, requests_session)
+                if not config.svn_commit_stubs:
+                    print("Subversion server is older than 1.7, so --delta-uploads and --batch-commits are not possible, and each file will be PUT whole as a commit of its own")
 
             if root_revision_on_remote_svn_repo != None:
                 if state.iteration == 0:  # At boot time only for now
@@ -1451,12 +3639,19 @@ def loop(config, state, excluded_filename_patterns, local_adds_chgs_deletes_queu
                 transform_enqueued_actions_into_instructions(config, state, local_adds_chgs_deletes_queue)
                 # Actions indicated by Subversion server next, only if root revision is different
                 if root_revision_on_remote_svn_repo != state.last_root_revision or possible_clash_encountered:
-                    svn_changesʔ(config, state, [('/', state.last_root_revision)], excluded_filename_patterns, requests_session)
+                    # From the log, once there's been a first walk down the directories to start from
+                    if not (config.args.change_detection != "directories" and state.last_root_revision > 0 and not possible_clash_encountered
+                            and svn_changes_sinceʔ(config, state, state.last_root_revision, root_revision_on_remote_svn_repo, excluded_filename_patterns, requests_session)):
+                        svn_changesʔ(config, state, [('/', state.last_root_revision)], excluded_filename_patterns, requests_session)
                     state.last_root_revision = root_revision_on_remote_svn_repo
+                    # Those PUT since this poll started are at a later revision still
+                    state.files_revised = files_revised_after(state, state.last_root_revision)
                 transform_enqueued_actions_into_instructions(config, state, local_adds_chgs_deletes_queue)
         except requests.packages.urllib3.exceptions.NewConnectionError as e:
+            state.online = False
             write_error(config.db_dir, "NewConnectionError: " + repr(e))
         except requests.exceptions.ConnectionError as e:
+            state.online = False
             write_error(config.db_dir, "ConnectionError: " + repr(e))
     else:
         state.online = False
@@ -1486,10 +3681,76 @@ def main(argv):
     parser.add_argument("--sleep-secs-between-polling", dest="sleep_secs",
                         default=30, type=int,
                         help="Sleep seconds between polling server")
+    parser.add_argument("--put-workers", dest="put_workers",
+                        default=1, type=int,
+                        help="Number of files to upload to the server at the same time")
+    parser.add_argument("--get-workers", dest="get_workers",
+                        default=1, type=int,
+                        help="Number of files to download from the server at the same time")
+    parser.add_argument("--download-buffer-kb", dest="download_buffer_kb",
+                        default=1024, type=int,
+                        help="KB of a download to write (and hash) at a time")
+    parser.add_argument("--http-pool-size", dest="http_pool_size",
+                        default=1, type=int,
+                        help="Number of servers to keep pooled connections for")
+    parser.add_argument("--http-max-connections-per-host", dest="http_max_connections_per_host",
+                        default=None, type=int,
+                        help="Number of connections to keep open to the server (default 10, or the larger number of PUT or GET workers if more)")
+    parser.add_argument("--http-keep-alive-secs", dest="http_keep_alive_secs",
+                        default=60, type=int,
+                        help="Seconds a connection is idle for before TCP keep-alive probes start (0 for none)")
+    parser.add_argument('--delta-uploads', dest='delta_uploads', action='store_true', help="Send changes to files as deltas, rather than the whole file")
+    parser.set_defaults(delta_uploads=False)
+    parser.add_argument('--delta-downloads', dest='delta_downloads', action='store_true', help="Get changes to files as deltas, rather than the whole file")
+    parser.set_defaults(delta_downloads=False)
+    parser.add_argument('--batch-commits', dest='batch_commits', action='store_true', help="Commit many PUTs, MKCOLs or DELETEs as one Subversion revision")
+    parser.set_defaults(batch_commits=False)
+    parser.add_argument("--commit-batch-files", dest="commit_batch_files",
+                        default=1000, type=int,
+                        help="Number of files (or directories) to commit as one revision, with --batch-commits")
+    parser.add_argument("--commit-batch-mb", dest="commit_batch_mb",
+                        default=100, type=int,
+                        help="MB of files to commit as one revision, with --batch-commits")
+    parser.add_argument("--pristines-max-mb", dest="pristines_max_mb",
+                        default=1024, type=int,
+                        help="MB of copies of synced files to keep, for --delta-uploads and --delta-downloads")
+    parser.add_argument("--change-detection", dest="change_detection",
+                        default="directories", choices=["directories", "log-report", "update-report"],
+                        help="How changes on the server are found: walking down the directories whose revision changed, from the log of revisions since the last poll, or from an update-report since then")
+    parser.add_argument("--full-scan-mins", dest="full_scan_mins",
+                        default=60, type=int,
+                        help="Minutes between file system scans of every file, rather than of directories changed since the last scan")
+    parser.add_argument("--scan-budget-ms", dest="scan_budget_ms",
+                        default=1000, type=int,
+                        help="Milliseconds a poll's file system scan can take, before carrying on from there in the next poll")
+    parser.add_argument("--hash-workers", dest="hash_workers",
+                        default=os.cpu_count() or 1, type=int,
+                        help="Number of files the file system scan can hash at the same time")
 
     config = Config()
     config.args = parser.parse_args(argv[1:])
 
+    if config.args.put_workers < 1:
+        parser.error("--put-workers must be 1 or more")
+    if config.args.get_workers < 1:
+        parser.error("--get-workers must be 1 or more")
+    if config.args.download_buffer_kb < 1:
+        parser.error("--download-buffer-kb must be 1 or more")
+    if config.args.pristines_max_mb < 1:
+        parser.error("--pristines-max-mb must be 1 or more")
+    if config.args.commit_batch_files < 1 or config.args.commit_batch_mb < 1:
+        parser.error("--commit-batch-files and --commit-batch-mb must be 1 or more")
+    if config.args.full_scan_mins < 0:
+        parser.error("--full-scan-mins must be 0 or more")
+    if config.args.scan_budget_ms < 1:
+        parser.error("--scan-budget-ms must be 1 or more")
+    if config.args.hash_workers < 1:
+        parser.error("--hash-workers must be 1 or more")
+    if config.args.http_max_connections_per_host is None:
+        config.args.http_max_connections_per_host = max(10, config.args.put_workers, config.args.get_workers)
+    if config.args.http_pool_size < 1 or config.args.http_max_connections_per_host < 1:
+        parser.error("--http-pool-size and --http-max-connections-per-host must be 1 or more")
+
     if not config.args.passwd:
         config.auth = (config.args.user, getpass.getpass(prompt="Subverison password for " + config.args.user + ": "))
 
@@ -1530,9 +3791,11 @@ def main(argv):
     if not os.path.exists(config.db_dir):
         os.mkdir(config.db_dir)
 
+    if config.args.delta_uploads or config.args.delta_downloads:
+        config.pristines = PristineStore(config.db_dir + "pristines" + os.sep, config.args.pristines_max_mb * 1048576)
+
 
-    db = TinyDB(config.db_dir + os.sep + "subsyncit.db", storage=CachingMiddleware(JSONStorage))
-    state = State(config.db_dir, MyTinyDBTrace(db.table('files')))
+    state = State(config.db_dir, MyFilesTableTrace(IndexedFilesTable(open_files_table(config.db_dir))))
 
     with open(config.db_dir + os.sep + "INFO.TXT", "w") as text_file:
         text_file.write(config.args.absolute_local_root_path + "is the Subsyncit path that this pertains to")
@@ -1571,21 +3834,31 @@ def main(argv):
 
     state.load()
 
+    requests_session = None
+    network_route = None
+
     try:
         while should_subsynct_keep_going(file_system_watcher, config.args.absolute_local_root_path, state):
 
-            # Recreating a session per iteration is good given use could be changing
-            # connection to the internet as they move around (office, home, wifi, 3G)
-            requests_session = make_requests_session(config.auth, verifySetting)
+            # The session (and its pooled connections) is only recreated if the user could have
+            # changed connection to the internet as they move around (office, home, wifi, 3G), or the
+            # last loop couldn't reach the server.
+            route = network_route_to(config.args.svn_url)
+            if requests_session is None or route != network_route or not state.online:
+                if requests_session is not None:
+                    requests_session.close()
+                requests_session = make_requests_session(config, verifySetting)
+                network_route = route
 
             loop(config, state, excluded_filename_patterns, local_adds_chgs_deletes_queue, requests_session)
 
-            if state.files_table.count(Query().I != None) == 0:
+            if state.files_table.count_with_instructions() == 0:
                 state.save_if_changed()
 
             if not requests_session.anything_substantial_happened():
+                state.files_table.checkpoint()
                 time.sleep(config.args.sleep_secs)
-                requests_session.clear_counts()
+            requests_session.clear_counts()
 
     except NoConnection as e:
         write_error(config.db_dir, e.message)
@@ -1604,11 +3877,13 @@ def main(argv):
     except RuntimeError:
         pass
 
-    db.close()
-
     if debug_mode:
         print_rows(state.files_table)
 
+    state.files_table.close()
+    if state.scanned_directories:
+        state.scanned_directories.close()
+
 if __name__ == "__main__":
 
     main(sys.argv)
@@ -0,0 +1,106 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Times PUTs() importing 400 small files (in 20 directories), then DELETEs() deleting them, to a fake
+# Subversion server that takes 5 ms over each request (a 10 ms round trip) and 10 ms over each commit
+# (for the fsyncs of a real one, one commit at a time). A revision per file, as autoversioning does it,
+# against --batch-commits:
+#
+#   python3 tests/benchmark_batch_commits.py [numbers of PUT workers, like 1,8]
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from fake_svn_server import make_config, make_session, start_fake_svn_server
+
+FILES = 400
+LATENCY = 0.005
+COMMIT_LATENCY = 0.01
+
+
+def make_config_state_and_session(svn_url, local_root, db_dir, workers, batch_commits):
+    config = make_config(svn_url, local_root, db_dir, put_workers=workers, get_workers=workers, batch_commits=batch_commits)
+    state = subsyncit.State(db_dir, subsyncit.MyFilesTableTrace(subsyncit.IndexedFilesTable(subsyncit.SqliteFilesTable(db_dir + "subsyncit.db"))))
+    return config, state, make_session(config)
+
+
+def file_name_for(i):
+    return "/dir" + str(i % 20) + "/file" + str(i) + ".txt"
+
+
+def time_PUTs_and_DELETEs(put_workers, batch_commits):
+    server, svn_url = start_fake_svn_server(LATENCY)
+    server.repo.commit_latency = COMMIT_LATENCY
+    local_root = tempfile.mkdtemp()
+    db_dir = tempfile.mkdtemp() + os.sep
+    try:
+        config, state, requests_session = make_config_state_and_session(svn_url, local_root, db_dir, put_workers, batch_commits)
+        for i in range(FILES):
+            file_name = file_name_for(i)
+            os.makedirs(os.path.dirname(local_root + file_name), exist_ok=True)
+            with open(local_root + file_name, "w") as f:
+                f.write("contents of file " + str(i))
+            subsyncit.upsert_row_in_table(state.files_table, file_name, subsyncit.PUT_ON_SERVER)
+
+        revs_before = server.repo.youngest_rev
+        start = time.time()
+        with redirect_stdout(io.StringIO()):
+            subsyncit.PUTs(config, state, requests_session)
+        put_duration = time.time() - start
+        put_revs = server.repo.youngest_rev - revs_before
+        if state.files_table.count_with_instructions() != 0 or len(server.repo.nodes) != FILES + 22:
+            raise AssertionError("Not everything was PUT")
+        if state.files_table.get(file_name_for(0))['LS'] is None:
+            raise AssertionError("Files table not updated")
+
+        for i in range(FILES):
+            subsyncit.upsert_row_in_table(state.files_table, file_name_for(i), subsyncit.DELETE_ON_SERVER)
+        revs_before = server.repo.youngest_rev
+        start = time.time()
+        with redirect_stdout(io.StringIO()):
+            subsyncit.DELETEs(config, state, requests_session)
+        delete_duration = time.time() - start
+        delete_revs = server.repo.youngest_rev - revs_before
+        if len(server.repo.nodes) != 22:
+            raise AssertionError("Not everything was DELETEd")
+
+        state.files_table.close()
+        return "PUTs " + subsyncit.english_duration(put_duration) + " (" + str(round(FILES / put_duration)) + " files/sec, " + str(put_revs) + " revisions), " \
+               + "DELETEs " + subsyncit.english_duration(delete_duration) + " (" + str(round(FILES / delete_duration)) + " files/sec, " + str(delete_revs) + " revisions)"
+    finally:
+        server.shutdown()
+        shutil.rmtree(local_root)
+        shutil.rmtree(db_dir)
+
+
+def main(worker_counts):
+    print(str(FILES) + " small files, " + subsyncit.english_duration(LATENCY * 2) + " round trip, "
+          + subsyncit.english_duration(COMMIT_LATENCY) + " per commit:")
+    for workers in worker_counts:
+        print("  " + str(workers).rjust(2) + " workers, a revision each: " + time_PUTs_and_DELETEs(workers, False))
+        print("  " + str(workers).rjust(2) + " workers, --batch-commits: " + time_PUTs_and_DELETEs(workers, True))
+
+
+if __name__ == "__main__":
+    main([int(n) for n in (sys.argv[1] if len(sys.argv) > 1 else "1,8").split(",")])
@@ -0,0 +1,118 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Polls (loop()) and requests it takes for changes made on a fake Subversion server, 5 ms a request,
+# to be synced down: a file changed at the bottom of a tree of directories, one added there, and one
+# deleted half way down. Each level of the tree has 4 directories of 3 files, and the next level. For
+# each depth of tree, with --change-detection directories, log-report, then update-report:
+#
+#   python3 tests/benchmark_change_detection.py [depths, like 2,4,8]
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from fake_svn_server import make_config, start_fake_svn_server
+
+LATENCY = 0.005
+MAX_POLLS = 50
+
+
+def make_tree(server, depth):
+    # The path (within the repo) of the deepest directory
+    path = "bench"
+    for level in range(depth):
+        if level > 0:
+            path += "/deeper"
+            server.repo.commit(path, None)
+        for d in range(4):
+            server.repo.commit(path + "/dir" + str(d), None)
+            for f in range(3):
+                server.repo.commit(path + "/dir" + str(d) + "/file" + str(f) + ".txt", ("level " + str(level) + " file " + str(f)).encode("utf-8"))
+    return path
+
+
+def make_config_and_state(svn_url, local_root, db_dir, change_detection):
+    config = make_config(svn_url, local_root, db_dir, do_file_system_scan=False, change_detection=change_detection)
+    state = subsyncit.State(db_dir, subsyncit.MyFilesTableTrace(subsyncit.IndexedFilesTable(subsyncit.SqliteFilesTable(db_dir + "subsyncit.db"))))
+    return config, state
+
+
+def poll_until(config, state, requests_session, synced):
+    # Polls and requests until synced() says so
+    excluded_filename_patterns = subsyncit.ExcludedPatternNames()
+    for polls in range(1, MAX_POLLS + 1):
+        with redirect_stdout(io.StringIO()):
+            subsyncit.loop(config, state, excluded_filename_patterns, [], requests_session)
+        state.iteration += 1
+        if synced():
+            return polls
+    return None
+
+
+def time_change_detection(depth, change_detection):
+    server, svn_url = start_fake_svn_server(LATENCY)
+    deepest = make_tree(server, depth)
+    local_root = tempfile.mkdtemp()
+    db_dir = tempfile.mkdtemp() + os.sep
+    try:
+        config, state = make_config_and_state(svn_url, local_root, db_dir, change_detection)
+        requests_session = subsyncit.make_requests_session(config, True)
+        local_deepest = local_root + deepest[len("bench"):]
+        poll_until(config, state, requests_session, lambda: os.path.exists(local_deepest + "/dir3/file2.txt"))
+
+        half_way = "bench" + "/deeper" * (depth // 2)
+        server.repo.commit(deepest + "/dir0/file0.txt", b"changed")
+        server.repo.commit(deepest + "/dir0/added.txt", b"added")
+        server.repo.commit_txn({half_way + "/dir1/file1.txt": "DELETE"})
+
+        def synced():
+            with open(local_deepest + "/dir0/file0.txt", "rb") as f:
+                changed = f.read() == b"changed"
+            return changed and os.path.exists(local_deepest + "/dir0/added.txt") \
+                   and not os.path.exists(local_root + half_way[len("bench"):] + "/dir1/file1.txt")
+
+        responses_before = server.responses
+        start = time.time()
+        polls = poll_until(config, state, requests_session, synced)
+        duration = time.time() - start
+        state.files_table.close()
+        if polls is None:
+            return "not synced after " + str(MAX_POLLS) + " polls"
+        return str(polls) + " polls, " + str(server.responses - responses_before) + " requests, " + subsyncit.english_duration(duration)
+    finally:
+        server.shutdown()
+        shutil.rmtree(local_root)
+        shutil.rmtree(db_dir)
+
+
+def main(depths):
+    for depth in depths:
+        print(str(depth) + " levels of directories:")
+        print("  directories  : " + time_change_detection(depth, "directories"))
+        print("  log-report   : " + time_change_detection(depth, "log-report"))
+        print("  update-report: " + time_change_detection(depth, "update-report"))
+
+
+if __name__ == "__main__":
+    main([int(depth) for depth in (sys.argv[1] if len(sys.argv) > 1 else "2,4,8").split(",")])
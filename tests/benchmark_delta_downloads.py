@@ -0,0 +1,90 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Bytes received, and time taken, to download changes to a 16 MB file from a fake Subversion server on
+# the same host: GET_file() with --delta-downloads (an update-report's svndiff1, applied to the copy
+# kept from the last sync), and without (a GET of the whole file). The same changes as
+# benchmark_delta_uploads.py:
+#
+#   python3 tests/benchmark_delta_downloads.py [size in MB, like 16]
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+import fake_svn_server
+from benchmark_delta_uploads import changes
+from fake_svn_server import make_config, make_session, start_fake_svn_server
+
+MB = 1048576
+
+
+def time_GET(local_root, db_dir, original, changed, delta_downloads):
+    server, svn_url = start_fake_svn_server(0)
+    original_rev = server.repo.commit("bench/big.bin", original)
+    server.repo.commit("bench/big.bin", changed)
+    config = make_config(svn_url, local_root, db_dir, delta_downloads=delta_downloads)
+    state = subsyncit.State(local_root, None)
+    requests_session = make_session(config)
+
+    # As it was after the original was synced
+    with open(local_root + "/big.bin", "wb") as f:
+        f.write(original)
+    original_sha1 = hashlib.sha1(original).hexdigest()
+    if delta_downloads:
+        config.pristines.add_copy_of(local_root + "/big.bin", original_sha1)
+    row = {'FN': "/big.bin", 'RS': original_sha1, 'LS': original_sha1, 'ST': None, 'RV': original_rev}
+
+    sent_before = server.bytes_sent
+    start = time.time()
+    subsyncit.GET_file(config, state, row, requests_session)
+    duration = time.time() - start
+    with open(local_root + "/big.bin", "rb") as f:
+        if f.read() != changed:
+            raise AssertionError("downloaded file is not the changed one")
+    received = server.bytes_sent - sent_before
+    requests_session.close()
+    server.shutdown()
+    return str(round(received / 1024)).rjust(6) + " KB received in " + subsyncit.english_duration(duration)
+
+
+def main(size_mb):
+    fake_svn_server.KEEP_CONTENT_UP_TO = max(fake_svn_server.KEEP_CONTENT_UP_TO, 2 * size_mb * MB)
+    # Environment-supplied CA bundles are no business of a server on the same host
+    os.environ.pop("REQUESTS_CA_BUNDLE", None)
+    os.environ.pop("CURL_CA_BUNDLE", None)
+    local_root = tempfile.mkdtemp()
+    db_dir = tempfile.mkdtemp()
+    try:
+        original = os.urandom(size_mb * MB)
+        print(str(size_mb) + " MB file:")
+        for description, changed in changes(original):
+            delta = time_GET(local_root, db_dir, original, changed, True)
+            whole = time_GET(local_root, db_dir, original, changed, False)
+            print("  " + (description + ":").ljust(27) + "delta " + delta + ", whole file " + whole)
+    finally:
+        shutil.rmtree(local_root)
+        shutil.rmtree(db_dir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 16)
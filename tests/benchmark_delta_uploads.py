@@ -0,0 +1,106 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Bytes sent, and time taken, to upload changes to a 16 MB file to a fake Subversion server on the same
+# host: PUT_file() with --delta-uploads (an svndiff against the copy kept from the last upload), and
+# without (the whole file):
+#
+#   python3 tests/benchmark_delta_uploads.py [size in MB, like 16]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+import fake_svn_server
+from fake_svn_server import make_config, make_session, start_fake_svn_server
+
+MB = 1048576
+
+
+def overwrite(content, offset, replacement):
+    return content[:offset] + replacement + content[offset + len(replacement):]
+
+
+def changes(content):
+    # What a change to the file looks like, for a few kinds of file
+    yield "10 bytes changed in place", overwrite(content, len(content) // 2, b"x" * 10)
+    pages = content
+    for page in range(0, len(content) // 4096, len(content) // 4096 // 20):
+        pages = overwrite(pages, page * 4096, os.urandom(4096))
+    yield "20 4 KB pages rewritten", pages
+    yield "1 MB appended", content + os.urandom(MB)
+    yield "4 KB inserted at 1 MB", content[:MB] + os.urandom(4096) + content[MB:]
+    yield "10 bytes inserted at 1 MB", content[:MB] + b"x" * 10 + content[MB:]
+    yield "all new", os.urandom(len(content))
+
+
+def make_config_and_session(svn_url, local_root, db_dir, delta_uploads):
+    config = make_config(svn_url, local_root, db_dir, delta_uploads=delta_uploads)
+    return config, make_session(config)
+
+
+def time_PUT(server, config, requests_session, local_root, original, changed):
+    # The original is uploaded first (in full, and kept as the base for a delta, if deltas are on)
+    row = {'FN': "/big.bin", 'RS': None, 'LS': None, 'ST': None, 'RV': 0}
+    with open(local_root + "/big.bin", "wb") as f:
+        f.write(original)
+    (fields, copy) = subsyncit.PUT_file(config, requests_session, row)
+    if copy:
+        config.pristines.replace(copy, fields['RS'], row['RS'])
+    row.update(fields)
+    with open(local_root + "/big.bin", "wb") as f:
+        f.write(changed)
+    received_before = server.bytes_received
+    start = time.time()
+    subsyncit.PUT_file(config, requests_session, row)
+    duration = time.time() - start
+    if server.repo.nodes["bench/big.bin"][0] != changed:
+        raise AssertionError("server does not have the changed file")
+    return str(round((server.bytes_received - received_before) / 1024)).rjust(6) + " KB sent in " + subsyncit.english_duration(duration)
+
+
+def main(size_mb):
+    # Kept by the fake server, to apply deltas to
+    fake_svn_server.KEEP_CONTENT_UP_TO = max(fake_svn_server.KEEP_CONTENT_UP_TO, 2 * size_mb * MB)
+    # Environment-supplied CA bundles are no business of a server on the same host
+    os.environ.pop("REQUESTS_CA_BUNDLE", None)
+    os.environ.pop("CURL_CA_BUNDLE", None)
+    local_root = tempfile.mkdtemp()
+    db_dir = tempfile.mkdtemp()
+    try:
+        original = os.urandom(size_mb * MB)
+        print(str(size_mb) + " MB file:")
+        for description, changed in changes(original):
+            results = []
+            for delta_uploads in (True, False):
+                server, svn_url = start_fake_svn_server(0)
+                config, requests_session = make_config_and_session(svn_url, local_root, db_dir, delta_uploads)
+                results.append(time_PUT(server, config, requests_session, local_root, original, changed))
+                requests_session.close()
+                server.shutdown()
+            print("  " + (description + ":").ljust(27) + "delta " + results[0] + ", whole file " + results[1])
+    finally:
+        shutil.rmtree(local_root)
+        shutil.rmtree(db_dir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 16)
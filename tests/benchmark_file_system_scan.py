@@ -0,0 +1,209 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Time taken by the file system scans for missed adds, changes and deletes, over a tree of files that
+# are all synced already (100 files a directory), with nothing changed since. A full scan, then one of
+# the directories changed since (none). Compared with how it was: every file statted and looked up,
+# then every row's file checked for. Then, for files copied in to a tree of 10000 while Subsyncit
+# wasn't running, the polls and time taken for the scans to get to the end, with the files found
+# each poll counted as PUT before the next. Compared with how it was: 100 found each poll, starting
+# from the top each time. The trees are made in a temp directory, so need that much space:
+#
+#   python3 tests/benchmark_file_system_scan.py [numbers of files, like 50000,500000] [files copied in, like 20000]
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from fake_svn_server import make_config
+
+FILES_PER_DIRECTORY = 100
+
+
+def make_files(local_root, top, files):
+    # The file names
+    file_names = []
+    for f in range(files):
+        directory = top + "d" + str(f // (FILES_PER_DIRECTORY * FILES_PER_DIRECTORY)) + "/d" + str(f // FILES_PER_DIRECTORY) + "/"
+        if f % FILES_PER_DIRECTORY == 0:
+            os.makedirs(local_root + directory)
+        file_name = directory + "f" + str(f) + ".txt"
+        with open(local_root + file_name, "w") as text_file:
+            text_file.write(str(f))
+        file_names.append(file_name)
+    # As if made a while ago, so that the first scan can count them as listed
+    a_while_ago = time.time() - 60
+    for directory, subdirectories, names in os.walk(local_root):
+        os.utime(directory, (a_while_ago, a_while_ago))
+    return file_names
+
+
+def make_tree(local_root, db_dir, files):
+    # All synced
+    rows = []
+    for file_name in make_files(local_root, "/", files):
+        stat = os.stat(local_root + file_name)
+        rows.append({'FN': file_name, 'L': file_name.count(os.sep), 'RS': "a" * 40, 'LS': "a" * 40,
+                     'ST': subsyncit.stat_signature(stat), 'I': None, 'RV': 1})
+    files_table = subsyncit.SqliteFilesTable(db_dir + "subsyncit.db")
+    with files_table.transaction():
+        for row in rows:
+            files_table.insert(row)
+    files_table.close()
+
+
+def scantree(path):
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            yield from scantree(entry.path)
+        else:
+            yield entry
+
+
+def scans_as_they_were(config, state, excluded_filename_patterns):
+    to_add = to_change = to_delete = 0
+    for entry in scantree(config.args.absolute_local_root_path):
+        file_name = "/" + subsyncit.get_file_name(config, entry.path)
+        if excluded_filename_patterns.should_be_excluded(file_name):
+            continue
+        row = state.files_table.get(file_name)
+        if row is None or row['RS'] is None:
+            to_add += 1
+        elif not subsyncit.same_stat(row["ST"], entry.stat()):
+            to_change += 1
+    for row in state.files_table.all():
+        if row['I'] is None and row['RS'] is not None and not os.path.exists(config.args.absolute_local_root_path + row['FN']):
+            to_delete += 1
+    return to_add + to_change + to_delete, "every file statted"
+
+
+def scan_as_it_was(config, state, excluded_filename_patterns):
+    # Up to 100 found, from the top each time
+    to_add = to_change = 0
+    for entry in scantree(config.args.absolute_local_root_path):
+        if to_add + to_change > 100:
+            break
+        file_name = "/" + subsyncit.get_file_name(config, entry.path)
+        if excluded_filename_patterns.should_be_excluded(file_name):
+            continue
+        row = state.files_table.get(file_name)
+        if row and row['I'] is not None:
+            continue
+        if row is None or row['RS'] is None:
+            subsyncit.upsert_row_in_table(state.files_table, file_name, subsyncit.PUT_ON_SERVER)
+            to_add += 1
+        elif not subsyncit.same_stat(row["ST"], entry.stat()):
+            state.files_table.update({'I': subsyncit.PUT_ON_SERVER}, file_name)
+            to_change += 1
+    return to_add + to_change
+
+
+def scans(config, state, excluded_filename_patterns):
+    with redirect_stdout(io.StringIO()):
+        found = subsyncit.scan_for_any_missed_adds_and_changes(config, state, excluded_filename_patterns)
+        listed = len(state.directories_listed)
+        found += subsyncit.scan_for_any_missed_deletes(config, state)
+    return found, str(listed) + " directories listed"
+
+
+def time_scans(config, state, excluded_filename_patterns, scan):
+    start = time.time()
+    found, how = scan(config, state, excluded_filename_patterns)
+    duration = time.time() - start
+    if found != 0:
+        raise AssertionError(str(found) + " changes found, rather than none")
+    return how + ", " + subsyncit.english_duration(duration)
+
+
+def as_if_PUT(config, state):
+    for row in state.files_table.search_by_instruction(subsyncit.PUT_ON_SERVER):
+        stat = os.stat(config.args.absolute_local_root_path + row['FN'])
+        state.files_table.update({'RS': "b" * 40, 'LS': "b" * 40, 'ST': subsyncit.stat_signature(stat), 'I': None}, row['FN'])
+    state.files_table.commit()
+
+
+def time_copied_in(copied_in, scan_budget_ms):
+    # Polls and time for the scans to find the files copied in, and get to the end
+    local_root = tempfile.mkdtemp()
+    db_dir = tempfile.mkdtemp() + os.sep
+    try:
+        make_tree(local_root, db_dir, 10000)
+        config = make_config(local_root=local_root, scan_budget_ms=60000, hash_workers=4)
+        state = subsyncit.State(db_dir, subsyncit.MyFilesTableTrace(subsyncit.IndexedFilesTable(subsyncit.SqliteFilesTable(db_dir + "subsyncit.db"))))
+        excluded_filename_patterns = subsyncit.ExcludedPatternNames()
+        # The scans of a previous run, before the files were copied in
+        scans(config, state, excluded_filename_patterns)
+        make_files(local_root, "/copied/", copied_in)
+        state.last_full_scan = 0
+        config.args.scan_budget_ms = scan_budget_ms
+        polls = found = 0
+        duration = 0
+        while True:
+            start = time.time()
+            if scan_budget_ms is None:
+                found_this_time = scan_as_it_was(config, state, excluded_filename_patterns)
+            else:
+                found_this_time = scans(config, state, excluded_filename_patterns)[0]
+            duration += time.time() - start
+            polls += 1
+            found += found_this_time
+            with redirect_stdout(io.StringIO()):
+                as_if_PUT(config, state)
+            if found_this_time == 0 if scan_budget_ms is None else state.scan_cursor is None:
+                break
+        state.files_table.close()
+        if state.scanned_directories:
+            state.scanned_directories.close()
+        return str(found) + " found in " + str(polls) + " polls, " + subsyncit.english_duration(duration)
+    finally:
+        shutil.rmtree(local_root)
+        shutil.rmtree(db_dir)
+
+
+def main(sizes, copied_in):
+    for files in sizes:
+        local_root = tempfile.mkdtemp()
+        db_dir = tempfile.mkdtemp() + os.sep
+        try:
+            make_tree(local_root, db_dir, files)
+            config = make_config(local_root=local_root, scan_budget_ms=60000, hash_workers=4)
+            state = subsyncit.State(db_dir, subsyncit.MyFilesTableTrace(subsyncit.IndexedFilesTable(subsyncit.SqliteFilesTable(db_dir + "subsyncit.db"))))
+            excluded_filename_patterns = subsyncit.ExcludedPatternNames()
+            print(str(files) + " files:")
+            print("  as it was       : " + time_scans(config, state, excluded_filename_patterns, scans_as_they_were))
+            print("  full            : " + time_scans(config, state, excluded_filename_patterns, scans))
+            print("  changed, if any : " + time_scans(config, state, excluded_filename_patterns, scans))
+            state.files_table.close()
+            state.scanned_directories.close()
+        finally:
+            shutil.rmtree(local_root)
+            shutil.rmtree(db_dir)
+    print(str(copied_in) + " files copied in:")
+    print("  as it was                  : " + time_copied_in(copied_in, None))
+    print("  carrying on, 1000 ms a poll: " + time_copied_in(copied_in, 1000))
+    print("  carrying on, 10 ms a poll  : " + time_copied_in(copied_in, 10))
+
+
+if __name__ == "__main__":
+    main([int(files) for files in (sys.argv[1] if len(sys.argv) > 1 else "50000,500000").split(",")],
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
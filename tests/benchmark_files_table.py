@@ -0,0 +1,198 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Times exact-file-name gets and updates, the listing of pending work (10 rows with instructions), and
+# the listing of a directory's children (100 files), and the persisting of 100 changed rows, on the
+# files table, for tables of 10k, 100k and 1M rows. Then the database time for the writes that 1000
+# synced files make, committed one by one, by batch, and by batch with the sha1s, size + timestamp,
+# revision and clearing of the instruction as one update per file (as PUTs and GETs make them):
+#
+#   python3 tests/benchmark_files_table.py [sizes, like 10000,100000,1000000]
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from tinydb import Query, TinyDB
+from tinydb.storages import MemoryStorage
+
+LOOKUPS = 10000
+TINYDB_LOOKUPS = 10
+
+
+def file_name_for(i):
+    return "/dir" + str(i // 100) + "/file" + str(i) + ".txt"
+
+
+def make_sqlite_table(db_dir, size):
+    files_table = subsyncit.SqliteFilesTable(db_dir + "subsyncit.db")
+    with files_table.transaction():
+        for i in range(size):
+            file_name = file_name_for(i)
+            files_table.insert({'FN': file_name, 'L': file_name.count(os.sep), 'RS': None, 'LS': None, 'ST': 0, 'I': None, 'RV': i})
+    return files_table
+
+
+def time_tinydb_gets(size):
+    # How it was before: TinyDB, where each Query().FN == x walks every row
+    db = TinyDB(storage=MemoryStorage)
+    files_table = db.table('files')
+    files_table.insert_multiple({'FN': file_name_for(i), 'L': 2, 'RS': None, 'LS': None, 'ST': 0, 'I': None, 'RV': i} for i in range(size))
+    names = [file_name_for(random.randrange(size)) for i in range(TINYDB_LOOKUPS)]
+    start = time.time()
+    for name in names:
+        files_table.get(Query().FN == name)
+    return (time.time() - start) / TINYDB_LOOKUPS
+
+
+def time_gets_and_updates(files_table, size):
+    names = [file_name_for(random.randrange(size)) for i in range(LOOKUPS)]
+    start = time.time()
+    for name in names:
+        files_table.get(name)
+    gets = (time.time() - start) / LOOKUPS
+    start = time.time()
+    with files_table.transaction():
+        for ix, name in enumerate(names):
+            files_table.update({'RV': ix}, name)
+    updates = (time.time() - start) / LOOKUPS
+    return gets, updates
+
+
+def micros(secs):
+    return str(round(secs * 1000000, 2)) + " µs"
+
+
+def time_listing_pending_work(files_table, size):
+    for i in range(0, size, size // 10):
+        files_table.update({'I': subsyncit.PUT_ON_SERVER}, file_name_for(i))
+    start = time.time()
+    for i in range(100):
+        files_table.search_by_instruction(subsyncit.PUT_ON_SERVER)
+        files_table.count_with_instructions()
+    listing = (time.time() - start) / 100
+    for i in range(0, size, size // 10):
+        files_table.update({'I': None}, file_name_for(i))
+    return listing
+
+
+def time_listing_children(files_table, size):
+    directories = [parent_directory_for(random.randrange(size)) for i in range(100)]
+    start = time.time()
+    for directory in directories:
+        files_table.search_possible_children(directory)
+    return (time.time() - start) / 100
+
+
+def time_persisting_changes(files_table, size):
+    start = time.time()
+    for i in range(10):
+        for name in [file_name_for(random.randrange(size)) for j in range(100)]:
+            files_table.update({'RV': i}, name)
+        files_table.commit()
+    return (time.time() - start) / 10
+
+
+def time_syncing_1000_files(files_table, commit_every, merged):
+    # The writes that PUTs made: a row for the file (and for its directory, once per 100 files), the
+    # sha1s, size + timestamp and revision once the PUT is done, then clearing of the instruction.
+    start = time.time()
+    for i in range(1000):
+        file_name = "/synced" + str(i // 100) + "/file" + str(i)
+        if i % 100 == 0:
+            files_table.insert({'FN': "/synced" + str(i // 100) + "/", 'L': 2, 'RS': None, 'LS': None, 'ST': 0, 'I': None, 'RV': i})
+        files_table.insert({'FN': file_name, 'L': 2, 'RS': None, 'LS': None, 'ST': 0, 'I': subsyncit.PUT_ON_SERVER, 'RV': 0})
+        if merged:
+            files_table.update({'RV': i, 'RS': "f7ff9e8b7bb2e09b70935a5d785e0cc5d9d0abf0", 'LS': "f7ff9e8b7bb2e09b70935a5d785e0cc5d9d0abf0", 'ST': 1500000000.5, 'I': None}, file_name)
+        else:
+            files_table.update({'RV': i, 'RS': "f7ff9e8b7bb2e09b70935a5d785e0cc5d9d0abf0", 'LS': "f7ff9e8b7bb2e09b70935a5d785e0cc5d9d0abf0", 'ST': 1500000000.5}, file_name)
+            files_table.update({'I': None}, file_name)
+        if i % commit_every == commit_every - 1:
+            files_table.commit()
+    return time.time() - start
+
+
+def best_of_five(commit_every, merged):
+    # fsync times vary a lot from one commit to the next
+    timings = []
+    for i in range(5):
+        db_dir = tempfile.mkdtemp() + os.sep
+        try:
+            files_table = subsyncit.IndexedFilesTable(subsyncit.SqliteFilesTable(db_dir + "subsyncit.db"))
+            timings.append(time_syncing_1000_files(files_table, commit_every, merged))
+            files_table.close()
+        finally:
+            shutil.rmtree(db_dir)
+    return min(timings)
+
+
+def time_db_writes_for_1000_synced_files():
+    one_by_one = best_of_five(1, False)
+    batched = best_of_five(100, False)
+    merged = best_of_five(100, True)
+    print("DB time for 1000 synced files:")
+    print("  committed one by one              : " + subsyncit.english_duration(one_by_one))
+    print("  committed per 100                 : " + subsyncit.english_duration(batched))
+    print("  committed per 100, merged updates : " + subsyncit.english_duration(merged))
+
+
+def parent_directory_for(i):
+    return "/dir" + str(i // 100) + "/"
+
+
+def main(sizes):
+    for size in sizes:
+        db_dir = tempfile.mkdtemp() + os.sep
+        try:
+            sqlite_table = make_sqlite_table(db_dir, size)
+            sqlite_gets, sqlite_updates = time_gets_and_updates(sqlite_table, size)
+            sqlite_listing = time_listing_pending_work(sqlite_table, size)
+            sqlite_children = time_listing_children(sqlite_table, size)
+
+            start = time.time()
+            indexed_table = subsyncit.IndexedFilesTable(sqlite_table)
+            load = time.time() - start
+            indexed_gets, indexed_updates = time_gets_and_updates(indexed_table, size)
+            indexed_listing = time_listing_pending_work(indexed_table, size)
+            indexed_children = time_listing_children(indexed_table, size)
+            persisting = time_persisting_changes(indexed_table, size)
+            indexed_table.close()
+
+            tinydb_gets = time_tinydb_gets(size)
+
+            print(str(size) + " rows:")
+            print("  TinyDB scan      : get " + micros(tinydb_gets))
+            print("  SQLite only      : get " + micros(sqlite_gets) + ", update " + micros(sqlite_updates)
+                  + ", listing pending work " + micros(sqlite_listing) + ", listing children " + micros(sqlite_children))
+            print("  FN index in front: get " + micros(indexed_gets) + ", update " + micros(indexed_updates)
+                  + ", listing pending work " + micros(indexed_listing) + ", listing children " + micros(indexed_children)
+                  + " (loading the index took " + subsyncit.english_duration(load) + ")")
+            print("  persisting 100 changed rows: " + micros(persisting))
+            print("  get speedup: " + str(round(sqlite_gets / indexed_gets, 1)) + "x over SQLite, "
+                  + str(round(tinydb_gets / indexed_gets)) + "x over TinyDB")
+        finally:
+            shutil.rmtree(db_dir)
+    time_db_writes_for_1000_synced_files()
+
+
+if __name__ == "__main__":
+    main([int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else "10000,100000,1000000").split(",")])
@@ -0,0 +1,76 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Measures the memory that the files table's rows take when held in memory - as dicts (the way
+# TinyDB's cache held them) and as the compact rows of IndexedFilesTable - for 100k and 1M rows:
+#
+#   python3 tests/benchmark_files_table_memory.py [sizes, like 100000,1000000]
+
+import gc
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+
+
+def file_name_for(i):
+    return "/projects/project" + str(i // 10000) + "/src/module" + str(i // 100) + "/file" + str(i) + ".txt"
+
+
+def make_sqlite_table(db_dir, size):
+    files_table = subsyncit.SqliteFilesTable(db_dir + "subsyncit.db")
+    with files_table.transaction():
+        for i in range(size):
+            file_name = file_name_for(i)
+            sha1 = hashlib.sha1(file_name.encode("utf-8")).hexdigest()
+            files_table.insert({'FN': file_name, 'L': file_name.count(os.sep), 'RS': sha1, 'LS': sha1, 'ST': 1500000000.5 + i, 'I': None, 'RV': 1000 + i // 10})
+    return files_table
+
+
+def megabytes_held_by(make):
+    gc.collect()
+    tracemalloc.start()
+    held = make()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return round(current / 1024 / 1024, 1)
+
+
+def main(sizes):
+    for size in sizes:
+        db_dir = tempfile.mkdtemp() + os.sep
+        try:
+            sqlite_table = make_sqlite_table(db_dir, size)
+            as_dicts = megabytes_held_by(lambda: {str(ix + 1): row for ix, row in enumerate(sqlite_table.all())})
+            compact = megabytes_held_by(lambda: subsyncit.IndexedFilesTable(sqlite_table))
+            sqlite_table.close()
+            print(str(size) + " rows:")
+            print("  rows as dicts  : " + str(as_dicts) + " MB")
+            print("  compact rows   : " + str(compact) + " MB (" + str(round(as_dicts / compact, 1)) + "x smaller)")
+        finally:
+            shutil.rmtree(db_dir)
+
+
+if __name__ == "__main__":
+    main([int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else "100000,1000000").split(",")])
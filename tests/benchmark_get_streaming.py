@@ -0,0 +1,89 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Peak memory allocated, bytes read from files (rchar in /proc/self/io, which doesn't count socket
+# reads) and throughput of GET_file() for 64 MB and 512 MB files from a fake Subversion server on the
+# same host. Compared with how it was: 500 MB chunks, then the file read back to hash it. Linux only:
+#
+#   python3 tests/benchmark_get_streaming.py [sizes in MB, like 64,512]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from fake_svn_server import make_config, make_session, start_fake_svn_server
+
+MB = 1048576
+
+
+def bytes_read_so_far():
+    with open("/proc/self/io") as io:
+        for line in io:
+            if line.startswith("rchar:"):
+                return int(line.split()[1])
+
+
+def GET_as_it_was(config, requests_session, abs_local_file_path, file_name):
+    get = requests_session.get(config.args.svn_url + file_name, stream=True)
+    with open(abs_local_file_path, 'wb') as f:
+        for chunk in get.iter_content(chunk_size=500000000):
+            if chunk:
+                f.write(chunk)
+    return subsyncit.calculate_sha1_from_local_file(abs_local_file_path)
+
+
+def time_GET(config, state, requests_session, local_root, size_mb, as_it_was):
+    tracemalloc.start()
+    read_before = bytes_read_so_far()
+    start = time.time()
+    if as_it_was:
+        GET_as_it_was(config, requests_session, local_root + "/big.bin", "/big.bin")
+    else:
+        subsyncit.GET_file(config, state, {'FN': "/big.bin", 'LS': None}, requests_session)
+    duration = time.time() - start
+    bytes_read = bytes_read_so_far() - read_before
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    os.remove(local_root + "/big.bin")
+    return "peak allocated " + str(round(peak / MB, 1)) + " MB, read " + str(round(bytes_read / MB)) + " MB, " \
+           + str(round(size_mb / duration)) + " MB/sec"
+
+
+def main(sizes_mb):
+    local_root = tempfile.mkdtemp()
+    try:
+        for size_mb in sizes_mb:
+            server, svn_url = start_fake_svn_server(0)
+            server.repo.commit("bench/big.bin", os.urandom(size_mb * MB))
+            config = make_config(svn_url, local_root, local_root)
+            state = subsyncit.State(local_root, None)
+            requests_session = make_session(config)
+            print(str(size_mb) + " MB file:")
+            print("  hashed as written    : " + time_GET(config, state, requests_session, local_root, size_mb, False))
+            print("  500 MB chunks, reread: " + time_GET(config, state, requests_session, local_root, size_mb, True))
+            server.shutdown()
+    finally:
+        shutil.rmtree(local_root)
+
+
+if __name__ == "__main__":
+    main([int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else "64,512").split(",")])
@@ -0,0 +1,116 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Bytes read (rchar in /proc/self/io) when Subsyncit starts again over a tree of 1 GB files that are all
+# synced, and unchanged since: the full file system scan of the first poll, then the check for a clash
+# that's made before each file is GOT (as if they'd all changed on the server). The files are sparse,
+# so need no disk space. Compared with how that check was: each file hashed. Linux only:
+#
+#   python3 tests/benchmark_hash_cache.py [GB of files, like 100]
+
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from fake_svn_server import make_config
+
+GB = 1073741824
+
+
+def bytes_read_so_far():
+    with open("/proc/self/io") as io_counts:
+        for line in io_counts:
+            if line.startswith("rchar:"):
+                return int(line.split()[1])
+
+
+def make_tree(local_root, db_dir, gb):
+    # All synced
+    hasher = hashlib.sha1()
+    zeros = bytes(1048576)
+    for mb in range(1024):
+        hasher.update(zeros)
+    sha1 = hasher.hexdigest()
+    rows = []
+    for f in range(gb):
+        directory = "/d" + str(f // 10) + "/"
+        if f % 10 == 0:
+            os.makedirs(local_root + directory)
+        file_name = directory + "big" + str(f) + ".bin"
+        with open(local_root + file_name, "wb") as big_file:
+            big_file.truncate(GB)
+        rows.append({'FN': file_name, 'L': file_name.count(os.sep), 'RS': sha1, 'LS': sha1,
+                     'ST': subsyncit.stat_signature(os.stat(local_root + file_name)), 'I': None, 'RV': 1})
+    files_table = subsyncit.SqliteFilesTable(db_dir + "subsyncit.db")
+    with files_table.transaction():
+        for row in rows:
+            files_table.insert(row)
+    files_table.close()
+
+
+def reads(what):
+    # Less what reading /proc/self/io itself counts
+    read_before = bytes_read_so_far()
+    read_before = 2 * bytes_read_so_far() - read_before
+    start = time.time()
+    result = what()
+    duration = time.time() - start
+    return result, str(bytes_read_so_far() - read_before) + " bytes read, " + subsyncit.english_duration(duration)
+
+
+def main(gb):
+    local_root = tempfile.mkdtemp()
+    db_dir = tempfile.mkdtemp() + os.sep
+    try:
+        make_tree(local_root, db_dir, gb)
+        config = make_config(local_root=local_root, scan_budget_ms=60000, hash_workers=4)
+        # As Subsyncit starting again. The databases are read before counting starts.
+        state = subsyncit.State(db_dir, subsyncit.MyFilesTableTrace(subsyncit.IndexedFilesTable(subsyncit.SqliteFilesTable(db_dir + "subsyncit.db"))))
+        state.scanned_directories = subsyncit.ScannedDirectories(db_dir + "subsyncit.db")
+        rows = [row for row in state.files_table.all() if not row['FN'].endswith("/")]
+
+        def scans():
+            with redirect_stdout(io.StringIO()):
+                return subsyncit.scan_for_any_missed_adds_and_changes(config, state, subsyncit.ExcludedPatternNames()) \
+                       + subsyncit.scan_for_any_missed_deletes(config, state)
+
+        def clash_checks(local_sha1_of):
+            return sum(1 for row in rows if local_sha1_of(row, local_root + row['FN']) != row['LS'])
+
+        print(str(gb) + " GB in " + str(len(rows)) + " files:")
+        found, how = reads(scans)
+        print("  file system scan              : " + str(found) + " to PUT, " + how)
+        found, how = reads(lambda: clash_checks(subsyncit.local_sha1_of))
+        print("  clash checks                  : " + str(found) + " clashes, " + how)
+        found, how = reads(lambda: clash_checks(lambda row, abs_local_file_path: subsyncit.calculate_sha1_from_local_file(abs_local_file_path)))
+        print("  clash checks, hashing the file: " + str(found) + " clashes, " + how)
+        state.files_table.close()
+        state.scanned_directories.close()
+    finally:
+        shutil.rmtree(local_root)
+        shutil.rmtree(db_dir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
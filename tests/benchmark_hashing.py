@@ -0,0 +1,127 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Time taken by the file system scan to hash a tree of 64 MB files that are all synced, but were
+# restored from a backup since (so have different inodes), to tell that they don't need PUTting.
+# With one hash worker, then with one for each CPU core (if more than one). Compared with how it was: each file hashed on
+# the main thread, 64 KB at a time. The files are read from the page cache after the first time, so
+# it's the hashing that's timed, not the disk. The tree is made in a temp directory, so needs that
+# much space:
+#
+#   python3 tests/benchmark_hashing.py [number of files, like 32]
+
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from fake_svn_server import make_config
+
+MB = 1048576
+
+
+def make_tree(local_root, db_dir, files):
+    # All synced, but with the inodes they had before they were restored
+    rows = []
+    for f in range(files):
+        directory = "/d" + str(f // 10) + "/"
+        if f % 10 == 0:
+            os.makedirs(local_root + directory)
+        file_name = directory + "f" + str(f) + ".bin"
+        content = os.urandom(MB) * 64
+        with open(local_root + file_name, "wb") as a_file:
+            a_file.write(content)
+        osstat = os.stat(local_root + file_name)
+        signature = subsyncit.stat_signature(osstat)
+        sha1 = hashlib.sha1(content).hexdigest()
+        rows.append({'FN': file_name, 'L': file_name.count(os.sep), 'RS': sha1, 'LS': sha1,
+                     'ST': signature[:8] + b"restored" + signature[16:], 'I': None, 'RV': 1})
+    files_table = subsyncit.SqliteFilesTable(db_dir + "subsyncit.db")
+    with files_table.transaction():
+        for row in rows:
+            files_table.insert(row)
+    files_table.close()
+
+
+def sha1_as_it_was(file):
+    hasher = hashlib.sha1()
+    with open(file, 'rb') as a_file:
+        buf = a_file.read(65536)
+        while len(buf) > 0:
+            hasher.update(buf)
+            buf = a_file.read(65536)
+    return hasher.hexdigest()
+
+
+def scan_as_it_was(config, state):
+    found = 0
+    for row in state.files_table.all():
+        if not row['FN'].endswith("/") and sha1_as_it_was(config.args.absolute_local_root_path + row['FN']) != row['LS']:
+            found += 1
+    return found
+
+
+def scan(config, state):
+    state.scanned_directories = subsyncit.ScannedDirectories(state.db_dir + "subsyncit.db")
+    with redirect_stdout(io.StringIO()):
+        found = subsyncit.scan_for_any_missed_adds_and_changes(config, state, subsyncit.ExcludedPatternNames())
+    state.scanned_directories.close()
+    return found
+
+
+def time_scan(local_root, db_dir, files, hash_workers):
+    # From a copy of the files table, as the scan updates the rows
+    scan_db_dir = tempfile.mkdtemp() + os.sep
+    try:
+        shutil.copy(db_dir + "subsyncit.db", scan_db_dir + "subsyncit.db")
+        config = make_config(local_root=local_root, scan_budget_ms=600000, hash_workers=hash_workers)
+        state = subsyncit.State(scan_db_dir, subsyncit.MyFilesTableTrace(subsyncit.IndexedFilesTable(subsyncit.SqliteFilesTable(scan_db_dir + "subsyncit.db"))))
+        start = time.time()
+        found = scan_as_it_was(config, state) if hash_workers is None else scan(config, state)
+        duration = time.time() - start
+        state.files_table.close()
+    finally:
+        shutil.rmtree(scan_db_dir)
+    if found != 0:
+        raise AssertionError(str(found) + " to PUT, rather than none")
+    return subsyncit.english_duration(duration) + ", " + str(round(files * 64 * MB / 1000000000 / duration, 2)) + " GB/s"
+
+
+def main(files):
+    local_root = tempfile.mkdtemp()
+    db_dir = tempfile.mkdtemp() + os.sep
+    try:
+        make_tree(local_root, db_dir, files)
+        cores = os.cpu_count() or 1
+        print(str(files) + " files of 64 MB, " + str(cores) + " CPU cores:")
+        print("  as it was        : " + time_scan(local_root, db_dir, files, None))
+        print("  1 hash worker    : " + time_scan(local_root, db_dir, files, 1))
+        if cores > 1:
+            print("  " + (str(cores) + " hash workers").ljust(17) + ": " + time_scan(local_root, db_dir, files, cores))
+    finally:
+        shutil.rmtree(local_root)
+        shutil.rmtree(db_dir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 32)
@@ -0,0 +1,82 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Times the poll of an idle sync (the PROPFIND of the root) against a fake Subversion server over
+# TLS, with a new requests session each poll (as it used to be) and with one session kept between
+# polls. Needs the openssl command line tool for a self-signed certificate:
+#
+#   python3 tests/benchmark_http_session.py [polls, like 50]
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from fake_svn_server import make_config, start_fake_svn_server
+
+
+def make_certfile(cert_dir):
+    certfile = cert_dir + os.sep + "fake_svn_server.pem"
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+                    "-keyout", certfile, "-out", certfile], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile
+
+
+def time_polls(config, polls, keep_session):
+    timings = []
+    requests_session = subsyncit.make_requests_session(config, False)
+    for i in range(polls):
+        start = time.time()
+        if not keep_session:
+            requests_session.close()
+            requests_session = subsyncit.make_requests_session(config, False)
+        (rev, sha1, svn_baseline_rel_path) = subsyncit.svn_details(config, requests_session, "/")
+        if rev == 0:
+            raise AssertionError("The fake server isn't answering")
+        timings.append(time.time() - start)
+    requests_session.close()
+    return timings
+
+
+def main(polls):
+    cert_dir = tempfile.mkdtemp()
+    try:
+        server, svn_url = start_fake_svn_server(0, make_certfile(cert_dir))
+        config = make_config(svn_url, db_dir=cert_dir, http_max_connections_per_host=1)
+        subsyncit.requests.packages.urllib3.disable_warnings()
+        # Either of these would override the session's verify=False
+        os.environ.pop("REQUESTS_CA_BUNDLE", None)
+        os.environ.pop("CURL_CA_BUNDLE", None)
+
+        new_session_each_poll = time_polls(config, polls, False)
+        kept_session = time_polls(config, polls, True)
+        server.shutdown()
+
+        print("Idle poll (PROPFIND of the root) over TLS to a local server, median of " + str(polls) + ":")
+        print("  new session each poll: " + subsyncit.english_duration(statistics.median(new_session_each_poll)))
+        print("  session kept         : " + subsyncit.english_duration(statistics.median(kept_session)))
+    finally:
+        shutil.rmtree(cert_dir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
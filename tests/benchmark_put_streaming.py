@@ -0,0 +1,82 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Peak memory (max RSS) and throughput of PUT() for 1 MB, 1 GB and 10 GB files, to a fake Subversion
+# server on the same host. Each PUT runs in a process of its own, so that the peaks don't mix. The
+# files are sparse, so need no disk space. For comparison, the same upload with the whole file read
+# into memory first (as PUT() used to), skipped for files bigger than half of this machine's memory:
+#
+#   python3 tests/benchmark_put_streaming.py [sizes in MB, like 1,1024,10240]
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from fake_svn_server import make_config, start_fake_svn_server
+
+MB = 1048576
+
+
+def put_in_this_process(size_mb, whole_file_in_memory):
+    server, svn_url = start_fake_svn_server(0)
+    with tempfile.NamedTemporaryFile() as f:
+        f.truncate(size_mb * MB)
+        config = make_config(svn_url, http_max_connections_per_host=1)
+        requests_session = subsyncit.make_requests_session(config, True)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.time()
+        if whole_file_in_memory:
+            with open(f.name, "rb") as whole_file:
+                put = requests_session.put(svn_url + "/big.bin", data=whole_file.read())
+                if put.status_code != 201:
+                    raise AssertionError("PUT failed: " + str(put.status_code))
+        else:
+            subsyncit.PUT(config, requests_session, f.name, None, "/big.bin")
+        duration = time.time() - start
+    # ru_maxrss is in KB on Linux
+    print(str(rss_before // 1024) + " " + str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024) + " " + str(duration))
+
+
+def time_put(size_mb, whole_file_in_memory):
+    output = subprocess.run([sys.executable, __file__, "--child", str(size_mb), str(whole_file_in_memory)],
+                            check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout.splitlines()[-1].split()
+    rss_before, rss_peak, duration = int(output[0]), int(output[1]), float(output[2])
+    return "peak RSS " + str(rss_peak) + " MB (" + str(rss_before) + " MB before), " \
+           + str(round(size_mb / duration)) + " MB/sec"
+
+
+def main(sizes_mb):
+    memory_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // MB
+    for size_mb in sizes_mb:
+        print(str(size_mb) + " MB file:")
+        print("  streamed        : " + time_put(size_mb, False))
+        if size_mb < memory_mb / 2:
+            print("  read into memory: " + time_put(size_mb, True))
+        else:
+            print("  read into memory: skipped, this machine has " + str(memory_mb) + " MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        put_in_this_process(int(sys.argv[2]), sys.argv[3] == "True")
+    else:
+        main([int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else "1,1024,10240").split(",")])
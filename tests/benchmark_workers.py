@@ -0,0 +1,124 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Times PUTs() uploading 100 small files (in 10 directories) to a fake Subversion server that takes
+# 20 ms over each request (a 40 ms round trip), for each number of PUT workers, then GETs()
+# downloading them again for each number of GET workers:
+#
+#   python3 tests/benchmark_workers.py [numbers of workers, like 1,2,4,8,16]
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from fake_svn_server import make_config, make_session, start_fake_svn_server
+
+FILES = 100
+LATENCY = 0.02
+
+
+def make_config_state_and_session(svn_url, local_root, db_dir, workers):
+    config = make_config(svn_url, local_root, db_dir, put_workers=workers, get_workers=workers)
+    state = subsyncit.State(db_dir, subsyncit.MyFilesTableTrace(subsyncit.IndexedFilesTable(subsyncit.SqliteFilesTable(db_dir + "subsyncit.db"))))
+    return config, state, make_session(config)
+
+
+def file_name_for(i):
+    return "/dir" + str(i % 10) + "/file" + str(i) + ".txt"
+
+
+def time_PUTs(put_workers):
+    server, svn_url = start_fake_svn_server(LATENCY)
+    local_root = tempfile.mkdtemp()
+    db_dir = tempfile.mkdtemp() + os.sep
+    try:
+        config, state, requests_session = make_config_state_and_session(svn_url, local_root, db_dir, put_workers)
+        for i in range(FILES):
+            file_name = file_name_for(i)
+            os.makedirs(os.path.dirname(local_root + file_name), exist_ok=True)
+            with open(local_root + file_name, "w") as f:
+                f.write("contents of file " + str(i))
+            subsyncit.upsert_row_in_table(state.files_table, file_name, subsyncit.PUT_ON_SERVER)
+
+        start = time.time()
+        with redirect_stdout(io.StringIO()):
+            subsyncit.PUTs(config, state, requests_session)
+        duration = time.time() - start
+
+        if state.files_table.count_with_instructions() != 0 or len(server.repo.nodes) != FILES + 12:
+            raise AssertionError("Not everything was PUT")
+        state.files_table.close()
+        return duration
+    finally:
+        server.shutdown()
+        shutil.rmtree(local_root)
+        shutil.rmtree(db_dir)
+
+
+def time_GETs(get_workers):
+    server, svn_url = start_fake_svn_server(LATENCY)
+    local_root = tempfile.mkdtemp()
+    db_dir = tempfile.mkdtemp() + os.sep
+    try:
+        for i in range(10):
+            server.repo.commit("bench/dir" + str(i), None)
+        for i in range(FILES):
+            server.repo.commit("bench" + file_name_for(i), ("contents of file " + str(i)).encode("utf-8"))
+        config, state, requests_session = make_config_state_and_session(svn_url, local_root, db_dir, get_workers)
+        for i in range(10):
+            subsyncit.upsert_row_in_table(state.files_table, "/dir" + str(i) + "/", subsyncit.GET_FROM_SERVER)
+        for i in range(FILES):
+            subsyncit.upsert_row_in_table(state.files_table, file_name_for(i), subsyncit.GET_FROM_SERVER)
+
+        start = time.time()
+        with redirect_stdout(io.StringIO()):
+            subsyncit.GETs(config, state, requests_session)
+        duration = time.time() - start
+
+        if state.files_table.count_with_instructions() != 0 or not os.path.exists(local_root + file_name_for(FILES - 1)):
+            raise AssertionError("Not everything was GET")
+        state.files_table.close()
+        return duration
+    finally:
+        server.shutdown()
+        shutil.rmtree(local_root)
+        shutil.rmtree(db_dir)
+
+
+def print_timings(what, time_it, worker_counts):
+    print(what + " of " + str(FILES) + " small files, " + subsyncit.english_duration(LATENCY * 2) + " round trip:")
+    serial = None
+    for workers in worker_counts:
+        duration = time_it(workers)
+        serial = serial or duration
+        print("  " + str(workers).rjust(2) + " workers: " + subsyncit.english_duration(duration) + ", "
+              + str(round(FILES / duration, 1)) + " files/sec (" + str(round(serial / duration, 1)) + "x)")
+
+
+def main(worker_counts):
+    print_timings("PUTs", time_PUTs, worker_counts)
+    print_timings("GETs", time_GETs, worker_counts)
+
+
+if __name__ == "__main__":
+    main([int(n) for n in (sys.argv[1] if len(sys.argv) > 1 else "1,2,4,8,16").split(",")])
@@ -0,0 +1,130 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Time and peak memory allocated to turn a PROPFIND's multistatus (made up, as mod_dav_svn would send
+# it for a directory of that many files) into (path, rev, sha1) tuples: streamed through expat by
+# svn_entries(), against the whole body decoded and split into lines, with a regex per line, as
+# svn_dir_list() used to:
+#
+#   python3 tests/benchmark_xml_parsing.py [numbers of entries, like 1000,100000]
+
+import hashlib
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subsyncit
+from fake_svn_server import make_config
+
+MB = 1048576
+
+
+class StreamedResponse():
+
+    # Just enough of a requests response for the body to be streamed from memory, as if off the socket
+
+    def __init__(self, body):
+        self.body = body
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+def multistatus(entries):
+    lines = ['<?xml version="1.0" encoding="utf-8"?>',
+             '<D:multistatus xmlns:D="DAV:" xmlns:ns1="http://subversion.tigris.org/xmlns/dav/" xmlns:ns0="DAV:">']
+    for i in range(-1, entries):
+        lines += ['<D:response xmlns:lp1="DAV:" xmlns:lp3="http://subversion.tigris.org/xmlns/dav/">',
+                  '<D:href>/svn/testrepo/bench/' + ('' if i < 0 else 'file' + str(i) + '.txt') + '</D:href>',
+                  '<D:propstat>',
+                  '<D:prop>']
+        if i >= 0:
+            lines.append('<lp3:sha1-checksum>' + hashlib.sha1(str(i).encode("utf-8")).hexdigest() + '</lp3:sha1-checksum>')
+        lines += ['<lp1:version-name>' + str(i + 2) + '</lp1:version-name>',
+                  '<lp3:baseline-relative-path>bench' + ('' if i < 0 else '/file' + str(i) + '.txt') + '</lp3:baseline-relative-path>',
+                  '</D:prop>',
+                  '<D:status>HTTP/1.1 200 OK</D:status>',
+                  '</D:propstat>',
+                  '</D:response>']
+    lines.append('</D:multistatus>')
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def entries_as_it_was(config, body, prefix):
+    output = body.decode("utf-8")
+    entries = []; path = ""; rev = 0; sha1 = None
+    for line in output.splitlines():
+        if ":baseline-relative-path>" in line:
+            search = re.search("<lp[0-9]:baseline-relative-path>" + config.svn_baseline_rel_path + "(.*)</lp[0-9]:baseline-relative-path>", line)
+            rel_path = search.group(1)[1:] if search else ""
+            # Raw XML text here, so its entities were decoded by hand
+            path = "/" + rel_path.replace("&amp;", "&").replace("&quot;", "\"").replace("%3F", "?").replace("%26", "&")
+        if ":version-name" in line:
+            rev = int(line[line.index(">") + 1:line.index("<", 3)])
+        if ":sha1-checksum>" in line:
+            sha1 = line[line.index(">") + 1:line.index("<", 3)]
+        if "</D:response>" in line:
+            if sha1 is None and path != "/":
+                path += "/"
+            if path != "" and path != "/" and len(path) >= len(prefix):
+                entries.append((path, rev, sha1))
+            path = ""; rev = 0; sha1 = None
+    return entries
+
+
+def parse(config, body, streamed):
+    if streamed:
+        return sum(1 for entry in subsyncit.svn_entries(config, StreamedResponse(body), "/"))
+    return len(entries_as_it_was(config, body, "/"))
+
+
+def time_parse(config, body, streamed):
+    # Timed without tracemalloc, which slows expat's callbacks more than the rest, then measured with
+    start = time.time()
+    count = parse(config, body, streamed)
+    duration = time.time() - start
+    tracemalloc.start()
+    parse(config, body, streamed)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, "peak allocated " + str(round(peak / MB, 1)).rjust(5) + " MB, " + subsyncit.english_duration(duration) \
+           + ", " + str(round(count / duration)) + " entries/sec"
+
+
+def main(sizes):
+    config = make_config("http://127.0.0.1/svn/testrepo/bench")
+    config.svn_baseline_rel_path = "bench"
+    for entries in sizes:
+        body = multistatus(entries)
+        print(str(entries) + " entries (" + str(round(len(body) / MB, 1)) + " MB):")
+        streamed_count, streamed = time_parse(config, body, True)
+        whole_count, whole = time_parse(config, body, False)
+        if streamed_count != entries or whole_count != entries:
+            raise AssertionError("Expected " + str(entries) + " entries, got " + str(streamed_count) + " and " + str(whole_count))
+        print("  streamed through expat : " + streamed)
+        print("  split into lines, regex: " + whole)
+
+
+if __name__ == "__main__":
+    main([int(entries) for entries in (sys.argv[1] if len(sys.argv) > 1 else "1000,100000").split(",")])
@@ -0,0 +1,682 @@
+# Subsyncit - File sync backed by Subversion
+#
+#   Copyright (c) 2016 - 2017, Paul Hammant
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, version 3.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# An in-memory stand-in for Apache + mod_dav_svn, answering the requests Subsyncit makes the way
+# mod_dav_svn does (one XML element per line), with a fixed delay per request to stand in for the
+# round trip to a real server. For benchmarks that don't need Docker - not a Subversion server.
+# Commits are either autoversioning PUTs, or HTTPv2 ones (create-txn POST, svndiff PUTs, MERGE).
+# Update-reports (send-all, for one file) have deltas made with Subsyncit's own svndiff encoder.
+# Log-reports list the paths changed in each revision, and update-reports without send-all what's
+# different about a directory since a revision.
+
+import argparse
+import base64
+import hashlib
+import io
+import os
+import re
+import ssl
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+from xml.sax.saxutils import escape, unescape
+
+# The benchmarks that use this put the root of the repo on the path
+import subsyncit
+
+REPO_PATH = "/svn/testrepo/"
+KEEP_CONTENT_UP_TO = 16 * 1048576
+# What's in an HTTPv2 transaction for a path, if not a file's content
+MADE_DIRECTORY = "MKCOL"
+DELETED = "DELETE"
+
+
+class FakeSvnRepo(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.youngest_rev = 1
+        # path within the repo (no leading slash, dirs without a trailing one) -> [content, rev, sha1].
+        # Content and sha1 are None for a dir. Content is None for a file too big to keep.
+        self.nodes = {"": [None, 1, None]}
+        # HTTPv2 transaction name -> {path: content, MADE_DIRECTORY or DELETED} of what's in it so far
+        self.txns = {}
+        self.txn_count = 0
+        # path -> [(rev, content)] of the files whose content was kept, oldest first
+        self.history = {}
+        # Seconds each commit takes, to stand in for the fsyncs of a real one. Commits are one at a time.
+        self.commit_latency = 0
+        # [(rev, [(action, path, kind)])] of the paths changed in each revision, for log-reports. The
+        # action is "added", "modified" or "deleted", and the kind "file" or "dir".
+        self.log = []
+
+
+    def commit(self, path, content, sha1=None):
+        if content is not None:
+            sha1 = hashlib.sha1(content).hexdigest()
+        with self.lock:
+            time.sleep(self.commit_latency)
+            self.youngest_rev += 1
+            changed = [("modified" if path in self.nodes else "added", path, "dir" if sha1 is None else "file")]
+            self.nodes[path] = [content, self.youngest_rev, sha1]
+            if content is not None or sha1 is not None:
+                self.history.setdefault(path, []).append((self.youngest_rev, content))
+            self.changed(changed)
+            return self.youngest_rev
+
+
+    def commit_txn(self, txn):
+        # Everything in the transaction, in the order it was done, as one revision
+        with self.lock:
+            time.sleep(self.commit_latency)
+            self.youngest_rev += 1
+            changed = []
+            for path, content in txn.items():
+                if content is DELETED:
+                    changed.append(("deleted", path, "dir" if self.nodes[path][2] is None else "file"))
+                    for p in [p for p in self.nodes if p == path or p.startswith(path + "/")]:
+                        del self.nodes[p]
+                elif content is MADE_DIRECTORY:
+                    changed.append(("added", path, "dir"))
+                    self.nodes[path] = [None, self.youngest_rev, None]
+                else:
+                    changed.append(("modified" if path in self.nodes else "added", path, "file"))
+                    self.nodes[path] = [content, self.youngest_rev, hashlib.sha1(content).hexdigest()]
+                    self.history.setdefault(path, []).append((self.youngest_rev, content))
+            self.changed(changed)
+            return self.youngest_rev
+
+
+    def changed(self, changed):
+        # As a real one does, a directory's revision is the last one anything in it changed in
+        for (action, path, kind) in changed:
+            while path != "":
+                path = path.rpartition("/")[0]
+                if path in self.nodes:
+                    self.nodes[path][1] = self.youngest_rev
+        self.log.append((self.youngest_rev, changed))
+
+
+    def exists_in_txn(self, path, txn):
+        # As the transaction has it
+        if path in txn:
+            return txn[path] is not DELETED
+        if any(p for p, content in txn.items() if content is DELETED and path.startswith(p + "/")):
+            return False
+        return path in self.nodes
+
+
+    def content_at(self, path, rev):
+        # None if the file wasn't there then, or its content wasn't kept
+        content = None
+        for (changed_rev, changed_content) in self.history.get(path, []):
+            if changed_rev <= rev:
+                content = changed_content
+        return content
+
+
+    def has_parent_of(self, path):
+        return path.rpartition("/")[0] in self.nodes
+
+
+    def children(self, path):
+        prefix = path + "/" if path != "" else ""
+        return sorted(p for p in self.nodes if p.startswith(prefix) and p != path and "/" not in p[len(prefix):])
+
+
+def read_svndiff_int(delta, pos):
+    n = 0
+    while True:
+        byte = delta[pos]
+        pos += 1
+        n = (n << 7) | (byte & 0x7f)
+        if byte & 0x80 == 0:
+            return n, pos
+
+
+def apply_svndiff0(source, delta):
+    # As svn_txdelta_apply() does it: the source is read as a stream, so each window's source view has
+    # to carry on from (not skip past, or go back before) the views before it.
+    if delta[:4] != b"SVN\0":
+        raise ValueError("not svndiff0")
+    pos = 4
+    read_to = 0
+    view_offset = 0
+    view = b""
+    target = bytearray()
+    while pos < len(delta):
+        sview_offset, pos = read_svndiff_int(delta, pos)
+        sview_len, pos = read_svndiff_int(delta, pos)
+        tview_len, pos = read_svndiff_int(delta, pos)
+        ins_len, pos = read_svndiff_int(delta, pos)
+        new_len, pos = read_svndiff_int(delta, pos)
+        if sview_len > 0 and (sview_offset < view_offset or sview_offset + sview_len < view_offset + len(view)):
+            raise ValueError("svndiff has backwards-sliding source views")
+        if sview_offset != view_offset:
+            view = view[sview_offset - view_offset:] if view_offset + len(view) > sview_offset else b""
+            view_offset = sview_offset
+        if len(view) < sview_len:
+            more = source[read_to:read_to + sview_len - len(view)]
+            if len(more) < sview_len - len(view):
+                raise ValueError("Delta source ended unexpectedly")
+            read_to += len(more)
+            view += more
+        instructions = delta[pos:pos + ins_len]
+        new_data = delta[pos + ins_len:pos + ins_len + new_len]
+        pos += ins_len + new_len
+        window = bytearray()
+        new_pos = i = 0
+        while i < len(instructions):
+            action = instructions[i] >> 6
+            length = instructions[i] & 0x3f
+            i += 1
+            if length == 0:
+                length, i = read_svndiff_int(instructions, i)
+            if action == 2:
+                window += new_data[new_pos:new_pos + length]
+                new_pos += length
+                continue
+            offset, i = read_svndiff_int(instructions, i)
+            if action == 0:
+                if offset + length > sview_len:
+                    raise ValueError("copy from beyond the source view")
+                window += view[offset:offset + length]
+            else:
+                for n in range(length):
+                    window.append(window[offset + n])
+        if len(window) != tview_len:
+            raise ValueError("window is " + str(len(window)) + " bytes, not " + str(tview_len))
+        target += window
+    return bytes(target)
+
+
+def svndiff0_to_svndiff1(delta):
+    # The same windows, with their instructions and new data zlib'd, if that makes them smaller
+    def section(data):
+        compressed = zlib.compress(data, 5)
+        return subsyncit.svndiff_int(len(data)) + (compressed if len(compressed) < len(data) else data)
+    converted = bytearray(b"SVN\1")
+    pos = 4
+    while pos < len(delta):
+        header = []
+        for field in range(5):
+            n, pos = read_svndiff_int(delta, pos)
+            header.append(n)
+        instructions = section(delta[pos:pos + header[3]])
+        new_data = section(delta[pos + header[3]:pos + header[3] + header[4]])
+        pos += header[3] + header[4]
+        converted += b"".join(subsyncit.svndiff_int(n) for n in header[:3] + [len(instructions), len(new_data)]) + instructions + new_data
+    return bytes(converted)
+
+
+class FakeSvnRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def respond(self, status, body=b"", headers=None):
+        time.sleep(self.server.latency)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count_bytes_sent(len(body))
+
+
+    def request_body(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = bytearray()
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            while size > 0:
+                body += self.rfile.read(size)
+                self.rfile.readline()
+                size = int(self.rfile.readline().split(b";")[0], 16)
+            self.rfile.readline()
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.count_bytes_received(len(body))
+        return bytes(body)
+
+
+    def repo_path(self):
+        path = unquote(self.path)
+        rev = None
+        match = re.match(re.escape(REPO_PATH) + "!svn/rvr/([0-9]+)/(.*)", path)
+        if match:
+            rev = int(match.group(1))
+            path = match.group(2)
+        else:
+            path = path[len(REPO_PATH):]
+        return path.strip("/"), rev
+
+
+    def do_OPTIONS(self):
+        self.request_body()
+        self.respond(200, ('<?xml version="1.0" encoding="utf-8"?>\n'
+                           '<D:options-response xmlns:D="DAV:">\n'
+                           '<D:activity-collection-set><D:href>' + REPO_PATH + '!svn/act/</D:href></D:activity-collection-set></D:options-response>\n').encode("utf-8"),
+                     {"SVN-Youngest-Rev": str(self.server.repo.youngest_rev),
+                      "SVN-Me-Resource": REPO_PATH + "!svn/me",
+                      "SVN-Txn-Stub": REPO_PATH + "!svn/txn",
+                      "SVN-Txn-Root-Stub": REPO_PATH + "!svn/txr",
+                      "SVN-Rev-Root-Stub": REPO_PATH + "!svn/rvr"})
+
+
+    def do_POST(self):
+        body = self.request_body()
+        if unquote(self.path) != REPO_PATH + "!svn/me" or body.split() != [b"(", b"create-txn", b")"]:
+            self.respond(400)
+            return
+        with self.server.repo.lock:
+            self.server.repo.txn_count += 1
+            txn_name = str(self.server.repo.youngest_rev) + "-" + str(self.server.repo.txn_count)
+            self.server.repo.txns[txn_name] = {}
+        self.respond(201, headers={"SVN-Txn-Name": txn_name})
+
+
+    def do_MERGE(self):
+        body = self.request_body().decode("utf-8")
+        match = re.search("<D:href>" + re.escape(REPO_PATH) + "!svn/txn/([^<]+)</D:href>", body)
+        txn = self.server.repo.txns.pop(match.group(1), None) if match else None
+        if txn is None:
+            self.respond(404)
+            return
+        rev = self.server.repo.commit_txn(txn)
+        self.respond(200, ('<?xml version="1.0" encoding="utf-8"?>\n'
+                           '<D:merge-response xmlns:D="DAV:">\n'
+                           '<D:updated-set>\n'
+                           '<D:response>\n'
+                           '<D:href>' + REPO_PATH + '!svn/vcc/default</D:href>\n'
+                           '<D:propstat><D:prop>\n'
+                           '<D:resourcetype><D:baseline/></D:resourcetype>\n'
+                           '<D:version-name>' + str(rev) + '</D:version-name>\n'
+                           '</D:prop>\n'
+                           '<D:status>HTTP/1.1 200 OK</D:status>\n'
+                           '</D:propstat>\n'
+                           '</D:response>\n'
+                           '</D:updated-set>\n'
+                           '</D:merge-response>\n').encode("utf-8"))
+
+
+    def do_REPORT(self):
+        # Just enough of an update-report for one file, with send-all
+        body = self.request_body().decode("utf-8")
+        if "<S:log-report" in body:
+            self.log_report(body)
+            return
+        if 'send-all="false"' in body:
+            self.changes_report(body)
+            return
+        if unquote(self.path) != REPO_PATH + "!svn/vcc/default" or 'send-all="true"' not in body:
+            self.respond(400)
+            return
+        src_path = unquote(urlparse(re.search("<S:src-path>([^<]*)</S:src-path>", body).group(1)).path)[len(REPO_PATH):].strip("/")
+        target = re.search("<S:update-target>([^<]*)</S:update-target>", body).group(1)
+        to_rev = int(re.search("<S:target-revision>([0-9]+)</S:target-revision>", body).group(1))
+        from_rev = int(re.search('<S:entry rev="([0-9]+)"', body).group(1))
+        path = (src_path + "/" + target).strip("/")
+        base = self.server.repo.content_at(path, from_rev)
+        content = self.server.repo.content_at(path, to_rev)
+        if base is None or content is None:
+            self.respond(500)
+            return
+        lines = ['<?xml version="1.0" encoding="utf-8"?>',
+                 '<S:update-report xmlns:S="svn:" xmlns:V="http://subversion.tigris.org/xmlns/dav/" xmlns:D="DAV:" send-all="true">',
+                 '<S:target-revision rev="' + str(to_rev) + '"/>',
+                 '<S:open-directory rev="' + str(from_rev) + '">',
+                 '<S:open-file name="' + target + '" rev="' + str(from_rev) + '">']
+        if content != base:
+            delta = b"".join(subsyncit.svndiff0(io.BytesIO(base), io.BytesIO(content)))
+            if "svndiff1" in self.headers.get("Accept-Encoding", ""):
+                delta = svndiff0_to_svndiff1(delta)
+            encoded = base64.encodebytes(delta).decode("ascii")
+            lines.append('<S:txdelta>' + encoded + '</S:txdelta>')
+        lines += ['<S:prop><V:sha1-checksum>' + hashlib.sha1(content).hexdigest() + '</V:sha1-checksum></S:prop>',
+                  '</S:open-file>',
+                  '</S:open-directory>',
+                  '</S:update-report>']
+        self.respond(200, ("\n".join(lines) + "\n").encode("utf-8"))
+
+
+    def log_report(self, body):
+        # The paths changed in each revision that changed anything under the URL, with discover-changed-paths
+        path, rev = self.repo_path()
+        start_rev = int(re.search("<S:start-revision>([0-9]+)</S:start-revision>", body).group(1))
+        end_rev = int(re.search("<S:end-revision>([0-9]+)</S:end-revision>", body).group(1))
+        lines = ['<?xml version="1.0" encoding="utf-8"?>',
+                 '<S:log-report xmlns:S="svn:" xmlns:D="DAV:">']
+        log = [(changed_rev, changed) for (changed_rev, changed) in self.server.repo.log
+               if min(start_rev, end_rev) <= changed_rev <= max(start_rev, end_rev)
+               and any(p == path or p.startswith(path + "/") or path == "" for (action, p, kind) in changed)]
+        for (changed_rev, changed) in (log if start_rev <= end_rev else reversed(log)):
+            lines += ['<S:log-item>',
+                      '<D:version-name>' + str(changed_rev) + '</D:version-name>']
+            for (action, p, kind) in changed:
+                lines.append('<S:' + action + '-path node-kind="' + kind + '" text-mods="' + str(kind == "file").lower() + '" prop-mods="false">/'
+                             + escape(p) + '</S:' + action + '-path>')
+            lines.append('</S:log-item>')
+        lines.append('</S:log-report>')
+        self.respond(200, ("\n".join(lines) + "\n").encode("utf-8"))
+
+
+    def changes_report(self, body):
+        # An update-report without send-all, for a whole directory at from_rev (and the files in entries
+        # at theirs) up to the youngest revision: which paths were added, deleted or changed, nested in
+        # the directories they're in
+        src_path = unquote(urlparse(re.search("<S:src-path>([^<]*)</S:src-path>", body).group(1)).path)[len(REPO_PATH):].strip("/")
+        from_rev = int(re.search('<S:entry rev="([0-9]+)" depth="infinity"></S:entry>', body).group(1))
+        entries = {src_path + "/" + unescape(path): int(rev) for (rev, path) in re.findall('<S:entry rev="([0-9]+)" depth="infinity">([^<]+)</S:entry>', body)}
+        actions = {}
+        for (changed_rev, changed) in self.server.repo.log:
+            for (action, p, kind) in changed:
+                if changed_rev > entries.get(p, from_rev) and p.startswith(src_path + "/"):
+                    actions.setdefault(p, []).append((action, kind))
+        differences = {}
+        for p, done in actions.items():
+            kind = done[-1][1]
+            there_now = p in self.server.repo.nodes
+            there_before = done[0][0] != "added"
+            deleted = any(action == "deleted" for (action, k) in done)
+            differences[p] = []
+            if there_before and (deleted or not there_now):
+                differences[p].append("delete-entry")
+            if there_now and (not there_before or deleted):
+                differences[p].append("add-" + ("directory" if kind == "dir" else "file"))
+            elif there_now and kind == "file":
+                differences[p].append("open-file")
+        gone = [p for p, difference in differences.items() if difference == ["delete-entry"]]
+        children = {}
+        for p in differences:
+            if any(p.startswith(g + "/") for g in gone):
+                continue
+            while p != src_path:
+                parent = p.rpartition("/")[0]
+                children.setdefault(parent, set()).add(p)
+                p = parent
+        lines = ['<?xml version="1.0" encoding="utf-8"?>',
+                 '<S:update-report xmlns:S="svn:" xmlns:V="http://subversion.tigris.org/xmlns/dav/" xmlns:D="DAV:">',
+                 '<S:target-revision rev="' + str(self.server.repo.youngest_rev) + '"/>',
+                 '<S:open-directory rev="' + str(from_rev) + '">']
+
+        def add_lines(directory):
+            for p in sorted(children.get(directory, ())):
+                name = escape(p.rpartition("/")[2], {'"': "&quot;"})
+                difference = differences.get(p, [])
+                if "delete-entry" in difference:
+                    lines.append('<S:delete-entry name="' + name + '"/>')
+                if "add-file" in difference:
+                    lines.append('<S:add-file name="' + name + '"/>')
+                elif "open-file" in difference:
+                    lines.extend(['<S:open-file name="' + name + '" rev="' + str(from_rev) + '">', '<S:fetch-file/>', '</S:open-file>'])
+                elif "add-directory" in difference or p in children:
+                    element = "add-directory" if "add-directory" in difference else "open-directory"
+                    lines.append('<S:' + element + ' name="' + name + '">')
+                    add_lines(p)
+                    lines.append('</S:' + element + '>')
+
+        add_lines(src_path)
+        lines += ['</S:open-directory>', '</S:update-report>']
+        self.respond(200, ("\n".join(lines) + "\n").encode("utf-8"))
+
+
+    def txn_and_path(self):
+        # For a URL within an HTTPv2 transaction: the transaction (None if there isn't one by that name)
+        # and the path within the repo. None for both for a URL that's not within one.
+        match = re.match(re.escape(REPO_PATH) + "!svn/txr/([^/]+)/(.*)", unquote(self.path))
+        if match is None:
+            return None, None
+        return self.server.repo.txns.get(match.group(1)), match.group(2).strip("/")
+
+
+    def do_DELETE(self):
+        self.request_body()
+        if "!svn/txr/" in self.path:
+            txn, path = self.txn_and_path()
+            if txn is None or not self.server.repo.exists_in_txn(path, txn):
+                self.respond(404)
+                return
+            txn[path] = DELETED
+            self.respond(204)
+            return
+        if "!svn/txn/" in self.path:
+            match = re.match(re.escape(REPO_PATH) + "!svn/txn/(.+)", unquote(self.path))
+            if match is None or self.server.repo.txns.pop(match.group(1), None) is None:
+                self.respond(404)
+                return
+            self.respond(204)
+            return
+        # Autoversioning: a revision of its own
+        path, rev = self.repo_path()
+        if path not in self.server.repo.nodes:
+            self.respond(404)
+            return
+        self.server.repo.commit_txn({path: DELETED})
+        self.respond(204)
+
+
+    def PUT_into_txn(self):
+        # The file's content, or an svndiff against it as it is in the youngest revision
+        body = self.request_body()
+        txn, path = self.txn_and_path()
+        if txn is None:
+            self.respond(404)
+            return
+        node = self.server.repo.nodes.get(path)
+        if not self.server.repo.exists_in_txn(path.rpartition("/")[0], txn):
+            self.respond(409)
+            return
+        if node is not None and "X-SVN-Version-Name" in self.headers and int(self.headers["X-SVN-Version-Name"]) < node[1]:
+            # Out of date
+            self.respond(409)
+            return
+        if self.headers.get("Content-Type") != "application/vnd.svn-svndiff":
+            existed = self.server.repo.exists_in_txn(path, txn)
+            txn[path] = body
+            self.respond(204 if existed else 201)
+            return
+        if node is not None and node[0] is None:
+            # Too big to have been kept, so nothing to apply the delta to
+            self.respond(500)
+            return
+        try:
+            txn[path] = apply_svndiff0(node[0] if node is not None else b"", body)
+        except ValueError as e:
+            self.respond(400, str(e).encode("utf-8"))
+            return
+        self.respond(204 if node is not None else 201)
+
+
+    def do_PROPFIND(self):
+        self.request_body()
+        path, rev = self.repo_path()
+        node = self.server.repo.nodes.get(path)
+        if node is None:
+            self.respond(404)
+            return
+        paths = [path]
+        if self.headers.get("Depth") == "1":
+            paths += self.server.repo.children(path)
+        lines = ['<?xml version="1.0" encoding="utf-8"?>',
+                 '<D:multistatus xmlns:D="DAV:" xmlns:ns1="http://subversion.tigris.org/xmlns/dav/">']
+        for p in paths:
+            content, rev, sha1 = self.server.repo.nodes[p]
+            lines += ['<D:response xmlns:lp1="DAV:" xmlns:lp3="http://subversion.tigris.org/xmlns/dav/">',
+                      '<D:href>' + REPO_PATH + p + '</D:href>',
+                      '<D:propstat>',
+                      '<D:prop>']
+            if sha1 is not None:
+                lines.append('<lp3:sha1-checksum>' + sha1 + '</lp3:sha1-checksum>')
+            lines.append('<lp1:version-name>' + str(rev) + '</lp1:version-name>')
+            lines.append('<lp3:baseline-relative-path>' + escape(p, {'"': "&quot;"}) + '</lp3:baseline-relative-path>' if p != "" else '<lp3:baseline-relative-path/>')
+            lines += ['</D:prop>',
+                      '<D:status>HTTP/1.1 200 OK</D:status>',
+                      '</D:propstat>',
+                      '</D:response>']
+        lines.append('</D:multistatus>')
+        self.respond(207, ("\n".join(lines) + "\n").encode("utf-8"))
+
+
+    def do_MKCOL(self):
+        self.request_body()
+        if "!svn/txr/" in self.path:
+            txn, path = self.txn_and_path()
+            if txn is None or self.server.repo.exists_in_txn(path, txn):
+                self.respond(405 if txn is not None else 404)
+                return
+            if not self.server.repo.exists_in_txn(path.rpartition("/")[0], txn):
+                self.respond(409)
+                return
+            txn[path] = MADE_DIRECTORY
+            self.respond(201)
+            return
+        path, rev = self.repo_path()
+        if path in self.server.repo.nodes:
+            self.respond(405)
+            return
+        if not self.server.repo.has_parent_of(path):
+            self.respond(409)
+            return
+        self.server.repo.commit(path, None)
+        self.respond(201)
+
+
+    def do_PUT(self):
+        if "!svn/txr/" in self.path:
+            self.PUT_into_txn()
+            return
+        # Read a MB at a time, and only kept if small, so that a big PUT doesn't use a lot of memory
+        remaining = int(self.headers.get("Content-Length", 0))
+        hasher = hashlib.sha1()
+        chunks = []
+        kept = remaining <= KEEP_CONTENT_UP_TO
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1048576))
+            if len(chunk) == 0:
+                break
+            remaining -= len(chunk)
+            self.server.count_bytes_received(len(chunk))
+            hasher.update(chunk)
+            if kept:
+                chunks.append(chunk)
+        path, rev = self.repo_path()
+        existed = path in self.server.repo.nodes
+        if not self.server.repo.has_parent_of(path):
+            self.respond(409)
+            return
+        self.server.repo.commit(path, b"".join(chunks) if kept else None, hasher.hexdigest())
+        self.respond(204 if existed else 201)
+
+
+    def do_GET(self):
+        path, rev = self.repo_path()
+        node = self.server.repo.nodes.get(path)
+        if node is None or node[0] is None:
+            self.respond(404)
+            return
+        content = node[0]
+        match = re.match("bytes=([0-9]+)-$", self.headers.get("Range", ""))
+        if match:
+            offset = int(match.group(1))
+            if offset >= len(content):
+                self.respond(416)
+                return
+            self.respond(206, content[offset:], {"Content-Range": "bytes " + str(offset) + "-" + str(len(content) - 1) + "/" + str(len(content))})
+            return
+        self.respond(200, content)
+
+
+class FakeSvnServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    request_queue_size = 64
+    bytes_received = 0
+    bytes_sent = 0
+    responses = 0
+    bytes_lock = threading.Lock()
+
+
+    def count_bytes_received(self, count):
+        # Of request bodies, for benchmarks of how much is sent
+        with self.bytes_lock:
+            self.bytes_received += count
+
+
+    def count_bytes_sent(self, count):
+        # Of response bodies, for benchmarks of how much is received, and of the responses themselves
+        with self.bytes_lock:
+            self.bytes_sent += count
+            self.responses += 1
+
+
+def start_fake_svn_server(latency, certfile=None):
+    # Returns the server, running on a daemon thread, and the URL of an empty directory in its repo.
+    # HTTPS if given a PEM file with a certificate and its key.
+    server = FakeSvnServer(("127.0.0.1", 0), FakeSvnRequestHandler)
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    server.latency = latency
+    server.repo = FakeSvnRepo()
+    server.repo.commit("bench", None)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, scheme + "://127.0.0.1:" + str(server.server_port) + REPO_PATH + "bench"
+
+
+def make_config(svn_url=None, local_root=None, db_dir=None, **options):
+    # A subsyncit.Config as main() would make it (without a password, or a home directory), with
+    # every command line option at its default unless given here by its dest name (put_workers=4,
+    # say). With --delta-uploads or --delta-downloads, the copies are kept in the db dir.
+    args = dict(svn_url=svn_url, local_root_path=local_root, user=None, passwd="*NONE",
+                verify_ssl_cert=True, do_file_system_scan=True, do_fs_event_listener=True, sleep_secs=30,
+                put_workers=1, get_workers=1, download_buffer_kb=1024,
+                http_pool_size=1, http_max_connections_per_host=None, http_keep_alive_secs=60,
+                delta_uploads=False, delta_downloads=False,
+                batch_commits=False, commit_batch_files=1000, commit_batch_mb=100, pristines_max_mb=1024,
+                change_detection="directories", full_scan_mins=60, scan_budget_ms=1000, hash_workers=os.cpu_count() or 1)
+    for option in options:
+        if option not in args:
+            raise TypeError("no command line option with the dest " + option)
+    args.update(options)
+    if args['http_max_connections_per_host'] is None:
+        args['http_max_connections_per_host'] = max(10, args['put_workers'], args['get_workers'])
+    config = subsyncit.Config()
+    config.args = argparse.Namespace(absolute_local_root_path=local_root, **args)
+    config.auth = None
+    config.db_dir = db_dir
+    if args['delta_uploads'] or args['delta_downloads']:
+        config.pristines = subsyncit.PristineStore(os.path.join(db_dir, "pristines") + os.sep, args['pristines_max_mb'] * 1048576)
+    return config
+
+
+def make_session(config):
+    # A requests session for the config, and what loop() finds out from the server at the start
+    requests_session = subsyncit.make_requests_session(config, True)
+    (rev, sha1, config.svn_baseline_rel_path) = subsyncit.svn_details(config, requests_session, "/")
+    config.svn_repo_parent_path = subsyncit.get_svn_repo_parent_path(config, requests_session)
+    if config.args.delta_uploads or config.args.batch_commits:
+        config.svn_commit_stubs = subsyncit.get_svn_commit_stubs(config, requests_session)
+    return requests_session
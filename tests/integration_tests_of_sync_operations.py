@@ -20,10 +20,12 @@
 
 import argparse
 import copy
+import hashlib
 import json
 import os
 import re
 import shutil
+import sqlite3
 import sys
 import time
 import unittest
@@ -35,7 +37,6 @@ import sh
 from decorator import decorator
 from docker.errors import NotFound
 from os.path import dirname
-from tinydb import TinyDB
 
 
 class IntegrationTestsOfSyncOperations(unittest.TestCase):
@@ -212,6 +213,114 @@ class IntegrationTestsOfSyncOperations(unittest.TestCase):
         self.should_start_with(rows, 0, "01, /testfile.txt, 3f19e1ea9c19f0c6967723b453a423340cbd6e36, 3f19e1ea9c19f0c6967723b453a423340cbd6e36")
 
 
+    @timedtest
+    def test_a_changed_file_syncs_back_as_deltas(self):
+
+        self.start_subsyncit_one(extra_opt="--delta-uploads", extra_opt2="--delta-downloads")
+        self.start_subsyncit_two(extra_opt="--delta-uploads", extra_opt2="--delta-downloads")
+
+        time.sleep(2)
+
+        try:
+            test_file_in_a = self.test_sync_dir_one + "testfile.txt"
+            with open(test_file_in_a, "w", encoding="utf-8") as text_file:
+                text_file.write("Hello") # f7ff9e8b7bb2e09b70935a5d785e0cc5d9d0abf0
+
+            test_file_in_two = self.test_sync_dir_two + "testfile.txt"
+            self.wait_for_file_to_appear(test_file_in_two)
+            self.wait_for_file_contents_to_contain(test_file_in_two, "Hello")
+
+            # Two has a copy of what it got to make a delta against, and one a copy of what it sent to apply one to
+            time.sleep(1)
+            with open(test_file_in_two, "w", encoding="utf-8") as text_file:
+                text_file.write("Hello to you too") # 3f19e1ea9c19f0c6967723b453a423340cbd6e36
+
+            self.wait_for_file_contents_to_contain(test_file_in_a, "Hello to you too")
+
+        finally:
+            self.end_process_one_and_two()
+
+        self.assertNotIn("Subversion server is older than 1.7", self.process_output_two.getvalue())
+        self.assertNotIn("GETting it whole", self.process_output_one.getvalue())
+        rows = self.get_db_rows()
+        self.should_start_with(rows, 0, "01, /testfile.txt, 3f19e1ea9c19f0c6967723b453a423340cbd6e36, 3f19e1ea9c19f0c6967723b453a423340cbd6e36")
+
+
+    @timedtest
+    def test_files_in_directories_go_up_and_are_deleted_as_batch_commits(self):
+
+        dir = self.test_sync_dir_one
+
+        for sub_dir in ["bbb", "bbb/ccc"]:
+            os.mkdir(dir + sub_dir)
+            for i in range(5):
+                with open(dir + sub_dir + "/test" + str(i) + ".txt", "w") as text_file:
+                    text_file.write("testttt" + str(i))
+
+        self.process_one = self.start_subsyncit(self.svn_url, dir, self.process_output_one, extra_opt="--batch-commits")
+
+        try:
+            start = time.time()
+            while not (self.path_exists_on_svn_server("bbb/ccc/test4.txt") and self.path_exists_on_svn_server("bbb/test4.txt")):
+                if time.time() - start > 15:
+                    self.fail("files in bbb and bbb/ccc should be up on " + self.svn_url + " within 15 seconds")
+                time.sleep(1.5)
+
+            shutil.rmtree(dir + "bbb/ccc")
+            os.remove(dir + "bbb/test0.txt")
+
+            start = time.time()
+            while self.path_exists_on_svn_server("bbb/ccc") or self.path_exists_on_svn_server("bbb/test0.txt"):
+                if time.time() - start > 15:
+                    self.fail("bbb/ccc and bbb/test0.txt should be gone from " + self.svn_url + " within 15 seconds")
+                time.sleep(1.5)
+
+        finally:
+            self.end_process_one()
+
+        self.assertNotIn("Subversion server is older than 1.7", self.process_output_one.getvalue())
+        self.assertTrue(self.path_exists_on_svn_server("bbb/test1.txt"))
+
+
+    @timedtest
+    def test_changes_in_directories_sync_down_from_the_log(self):
+
+        self.changes_in_directories_sync_down("log-report")
+        self.assertIn("(from the log of revisions", self.process_output_one.getvalue())
+
+
+    @timedtest
+    def test_changes_in_directories_sync_down_from_an_update_report(self):
+
+        self.changes_in_directories_sync_down("update-report")
+        self.assertIn("(from an update-report from revision", self.process_output_one.getvalue())
+
+
+    def changes_in_directories_sync_down(self, change_detection):
+
+        self.start_subsyncit_one(extra_opt="--change-detection", extra_opt2=change_detection)
+        self.start_subsyncit_two()
+
+        time.sleep(2)
+
+        try:
+            os.makedirs(self.test_sync_dir_two + "ddd/eee")
+            with open(self.test_sync_dir_two + "ddd/eee/testfile.txt", "w", encoding="utf-8") as text_file:
+                text_file.write("Hello")
+            test_file_in_one = self.test_sync_dir_one + "ddd/eee/testfile.txt"
+            self.wait_for_file_contents_to_contain(test_file_in_one, "Hello")
+
+            with open(self.test_sync_dir_two + "ddd/eee/testfile.txt", "w", encoding="utf-8") as text_file:
+                text_file.write("Hello to you too")
+            self.wait_for_file_contents_to_contain(test_file_in_one, "Hello to you too")
+
+            os.remove(self.test_sync_dir_two + "ddd/eee/testfile.txt")
+            self.wait_for_file_to_disappear(test_file_in_one)
+
+        finally:
+            self.end_process_one_and_two()
+
+
 
     @timedtest
     def test_files_with_special_characters_make_it_to_svn_and_back(self):
@@ -710,15 +819,17 @@ class IntegrationTestsOfSyncOperations(unittest.TestCase):
             start = time.time()
             self.journal_to_one("--Restart Subsyncit--")
             self.process_one = self.start_subsyncit(self.svn_url, self.test_sync_dir_one, self.process_output_one)
-            self.wait_for_file_contents_to_be_sized_below(self.test_sync_dir_one + "testBigRandomFile", (sz * 99 / 100))
-            self.wait_for_file_contents_to_be_sized_above_or_eq_too(self.test_sync_dir_one + "testBigRandomFile", (sz / 10))
+            # The alternate version is downloaded alongside, and only replaces the first when it's all there
+            partial_file = self.test_sync_dir_one + ".testBigRandomFile.subsyncit-partial"
+            self.wait_for_file_contents_to_be_sized_above_or_eq_too(partial_file, (sz / 10))
             self.journal_to_one("--kill Subsyncit--")
             self.process_one.kill()
             self.journal_to_one("--killed after secs: " + str(round(time.time() - start, 1)))
 
-            aborted_get_size = os.stat(self.test_sync_dir_one + "testBigRandomFile").st_size
+            aborted_get_size = os.stat(partial_file).st_size
             print("\\  / YES, that 30 lines of a process being killed and the resulting stack trace is intentional at this stage in the integration test suite\n \\/")
             self.assertNotEquals(aborted_get_size, sz, "Aborted file size: " + str(aborted_get_size) + " should have been less that the ultimate size of the test file: " + str(sz))
+            self.assertEqual(self.sha1_of(self.test_sync_dir_one + "testBigRandomFile"), self.sha1_of(filename1))
 
             self.journal_to_one("-- DB ROWS START --")
             self.journal_to_one(self.get_db_rows_as_text())
@@ -726,13 +837,13 @@ class IntegrationTestsOfSyncOperations(unittest.TestCase):
 
             self.journal_to_one("--Restart Subsyncit--")
             self.process_one = self.start_subsyncit(self.svn_url, self.test_sync_dir_one, self.process_output_one)
-            self.wait_for_file_contents_to_be_sized_above_or_eq_too(self.test_sync_dir_one + "testBigRandomFile", sz)
+            # Carries on from where it got to
+            self.wait_for_file_to_disappear(partial_file)
         finally:
             self.end_process_one()
 
-
-        clash_file = glob2.glob(self.test_sync_dir_one + "*.clash_*")[0]
-        self.assertEqual(os.stat(clash_file).st_size, aborted_get_size)
+        self.assertEqual(self.sha1_of(self.test_sync_dir_one + "testBigRandomFile"), self.sha1_of(filename2))
+        self.assertEqual(glob2.glob(self.test_sync_dir_one + "*.clash_*"), [])
 
 
     @timedtest
@@ -1023,6 +1134,14 @@ class IntegrationTestsOfSyncOperations(unittest.TestCase):
             return "?"
 
 
+    def sha1_of(self, filename):
+        hasher = hashlib.sha1()
+        with open(filename, "rb") as f:
+            for buf in iter(lambda: f.read(1048576), b""):
+                hasher.update(buf)
+        return hasher.hexdigest()
+
+
     def make_a_big_random_file(self, filename, size):
         start = time.time()
         print("Making " + size + " MB random file " + filename + " (potentially time consuming, but once off) ... ")
@@ -1059,11 +1178,13 @@ class IntegrationTestsOfSyncOperations(unittest.TestCase):
         db_ = self.db_dir_one + os.sep + "subsyncit.db"
 
         time.sleep(2.5)
-        db = TinyDB(db_)
-        files_table = db.table('files')
+        db = sqlite3.connect(db_)
+        db.row_factory = sqlite3.Row
+        all_rows = db.execute("SELECT * FROM files").fetchall()
+        db.close()
 
         revisions = {}
-        for row in files_table.all():
+        for row in all_rows:
             revisions[row['RV']] = 0
 
         # Revisions are normalized down to 1,2,3,4 when they actually might be 12,13,18 in the repo
@@ -1072,7 +1193,7 @@ class IntegrationTestsOfSyncOperations(unittest.TestCase):
             revision_map[key] = ix + 1
 
         rv = ""
-        for row in files_table.all():
+        for row in all_rows:
             rv += str(revision_map[row['RV']]).zfill(2) + ", " + row['FN'] + ", " + str(row['RS'])+ ", " + str(row['LS']) + ", " + str(row['I'])  + "\n"
 
         return sorted(rv.splitlines())
@@ -1,10 +1,9 @@
+import sqlite3
 import sys
 
-from tinydb import TinyDB
-
 db_ = sys.argv[1] + "subsyncit.db"
 
-# Need to wait for the other process to release the TinyDB database file
+# Need to wait for the other process to release the database file
 # size = 0
 # while size < 350:
 #     size = os.stat(db_).st_size
@@ -14,11 +13,12 @@ db_ = sys.argv[1] + "subsyncit.db"
 #
 # time.sleep(.1)
 
-db = TinyDB(db_)
-files_table = db.table('files')
+db = sqlite3.connect(db_)
+db.row_factory = sqlite3.Row
+all_rows = db.execute("SELECT * FROM files").fetchall()
 
 revisions = {}
-for row in files_table.all():
+for row in all_rows:
     revisions[row['RV']] = 0
 
 # Revisions are normalized down to 1,2,3,4 when they actually might be 12,13,14 in the repo
@@ -30,8 +30,8 @@ for (key, value) in revision_map.items():
     print("k: " + str(key) + ", v: " + str(value))
 
 rv = ""
-for row in files_table.all():
-    # ts = str(round((row['ST'] - os.stat(sync_dir + row['RFN']).st_size - test_start) * 1000))
-    rv += str(revision_map[row['RV']]).zfill(2) + ", " + str(row['RV']) + ", " + row['RFN'] + ", " + str(row['RS'] )+ ", " + str(row['LS'])  + "\n"
+for row in all_rows:
+    # ts = str(round((row['ST'] - os.stat(sync_dir + row['FN']).st_size - test_start) * 1000))
+    rv += str(revision_map[row['RV']]).zfill(2) + ", " + str(row['RV']) + ", " + row['FN'] + ", " + str(row['RS'] )+ ", " + str(row['LS'])  + "\n"
 
 print("\n".join(sorted(rv.splitlines())))